@@ -0,0 +1,113 @@
+import os
+import asyncio
+import threading
+from dotenv import load_dotenv
+
+# ----------------------------------------------------
+# REGISTRO DE CLIENTES COMPARTIDOS (FIREBASE Y OPENAI)
+# Cada cliente se crea una sola vez por proceso, en el primer uso o en el
+# prewarm del lifespan. Importar este módulo (o cualquier router) no carga
+# firebase_admin ni openai: las importaciones pesadas van dentro de las funciones.
+# ----------------------------------------------------
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SERVICE_ACCOUNT_PATH = os.getenv("FIREBASE_CREDENTIALS", os.path.join(BASE_DIR, "serviceAccountKey.json"))
+# off: todo perezoso | init: crea los clientes al arrancar | connect: además abre conexiones
+PREWARM_CLIENTS = os.getenv("PREWARM_CLIENTS", "off").lower()
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "512"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_firebase_app = None
+_firestore = None
+_openai = None
+
+
+def firebase_app():
+    global _firebase_app
+    if _firebase_app is None:
+        with _lock:
+            if _firebase_app is None:
+                import firebase_admin
+                from firebase_admin import credentials
+
+                if firebase_admin._apps:
+                    _firebase_app = firebase_admin.get_app()
+                elif os.getenv("FIRESTORE_EMULATOR_HOST"):
+                    from google.auth.credentials import AnonymousCredentials
+
+                    class EmulatorCredential(credentials.Base):
+                        # Los emuladores de Firebase no validan credenciales
+                        def get_credential(self):
+                            return AnonymousCredentials()
+
+                    _firebase_app = firebase_admin.initialize_app(
+                        EmulatorCredential(), {"projectId": os.getenv("GCLOUD_PROJECT", "demo-certificaai")})
+                else:
+                    _firebase_app = firebase_admin.initialize_app(credentials.Certificate(SERVICE_ACCOUNT_PATH))
+                print("✅ Firebase inicializado.")
+    return _firebase_app
+
+
+def firestore_db():
+    global _firestore
+    if _firestore is None:
+        app = firebase_app()
+        with _lock:
+            if _firestore is None:
+                from firebase_admin import firestore
+                _firestore = firestore.client(app)
+    return _firestore
+
+
+def admin_auth():
+    """Módulo firebase_admin.auth con la app ya inicializada."""
+    firebase_app()
+    from firebase_admin import auth
+    return auth
+
+
+def openai():
+    global _openai
+    if _openai is None:
+        with _lock:
+            if _openai is None:
+                import httpx
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+                http_client = DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                        keepalive_expiry=30,
+                    ),
+                    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=10),
+                )
+                _openai = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+    return _openai
+
+
+async def prewarm(mode: str = PREWARM_CLIENTS):
+    """Crea los clientes (y con mode=connect abre la primera conexión) sin bloquear el arranque."""
+    if mode not in ("init", "connect"):
+        return
+    try:
+        await asyncio.to_thread(firestore_db)
+        await asyncio.to_thread(admin_auth)
+        client = await asyncio.to_thread(openai)
+        if mode == "connect":
+            # Petición barata que deja abierta la conexión TLS en el pool
+            await client.models.list(timeout=10)
+        print(f"✅ Clientes precalentados ({mode}).")
+    except Exception as e:
+        print(f"❌ Error precalentando clientes (se crearán en el primer uso): {e}")
+
+
+async def close():
+    global _openai
+    if _openai is not None:
+        await _openai.close()
+        _openai = None
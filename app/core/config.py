@@ -20,4 +20,33 @@ MODULES_CONFIG = {
         JSON OUTPUT: {score, feedback, logic_errors}
         """
     }
-}
\ No newline at end of file
+}
+
+# Reglas de equivalencia para la corrección local de MCQ (mismas que en los system_prompt)
+ANSWER_NORMALIZATION = {
+    # Variaciones regionales británico/americano: se aceptan ambas
+    "spelling_variants": {
+        "centre": "center",
+        "theatre": "theater",
+        "metre": "meter",
+        "litre": "liter",
+        "colour": "color",
+        "favourite": "favorite",
+        "neighbour": "neighbor",
+        "organise": "organize",
+        "realise": "realize",
+        "travelling": "traveling",
+        "cancelled": "canceled",
+        "programme": "program",
+        "grey": "gray",
+    },
+    # Si la respuesta es un número, acepta '7' o 'seven'
+    "numbers": {
+        "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+        "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+        "ten": "10", "eleven": "11", "twelve": "12", "thirteen": "13",
+        "fourteen": "14", "fifteen": "15", "sixteen": "16", "seventeen": "17",
+        "eighteen": "18", "nineteen": "19", "twenty": "20", "thirty": "30",
+        "forty": "40", "fifty": "50", "hundred": "100",
+    },
+}
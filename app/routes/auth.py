@@ -1,35 +1,96 @@
-import random
-from fastapi import APIRouter, HTTPException, status
+import os
+import ipaddress
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from fastapi import APIRouter, HTTPException, Request, status
 from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.services.mail_queue import mail_queue
+from app.services.otp import otp_service, RateLimited, OTP_TTL_SECONDS
 
 router = APIRouter(prefix="/api/v1/auth", tags=["auth"])
 
-# Base de datos temporal en memoria (en producción usarías Redis)
-otp_storage = {}
+# Proxies (IPs o CIDR separados por comas) de los que se acepta X-Forwarded-For
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+
+class OTPRequest(BaseModel):
+    email: str
+
+
+class OTPVerify(BaseModel):
+    email: str
+    code: str
+
+
+def _trusted(host: str | None) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except (TypeError, ValueError):
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str | None:
+    peer = request.client.host if request.client else None
+    if not _trusted(peer):
+        return peer  # Conexión directa: la cabecera la pondría el propio cliente
+    # Detrás de proxies de confianza: la primera IP por la derecha que no es un proxy
+    hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def otp_email(email: str, code: str, sender: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = f"CertificaAI Support <{sender}>"
+    msg['To'] = email
+    msg['Subject'] = "🔐 Tu código de verificación - CertificaAI"
+    html = f"""
+    <div style="font-family: sans-serif; background-color: #020617; color: #ffffff; padding: 40px; border-radius: 20px; border: 1px solid #1e293b;">
+        <h2 style="color: #06b6d4;">Tu código de verificación</h2>
+        <p style="font-size: 28px; letter-spacing: 6px; color: #06b6d4;"><strong>{code}</strong></p>
+        <p style="font-size: 11px; color: #64748b;">* Caduca en {OTP_TTL_SECONDS // 60} minutos. Si no lo pediste, ignora este correo.</p>
+    </div>
+    """
+    msg.attach(MIMEText(html, 'html'))
+    return msg
+
 
 @router.post("/send-otp")
-async def send_otp(request: OTPRequest):
-
-    code = str(random.randint(10000000, 99999999))
-    
-    
-    otp_storage[request.email] = code
-    
-    
-    print(f"DEBUG: Enviando código {code} al correo {request.email}")
-    
+async def send_otp(request: OTPRequest, http_request: Request):
+    sender = os.getenv("MAIL_FROM") or os.getenv("SMTP_USER")
+    if not sender:
+        print("❌ Error: SMTP_USER (o MAIL_FROM) no configurado en .env")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Envío de correo no configurado")
+    try:
+        code = await otp_service.issue(request.email, client_ip(http_request))
+    except RateLimited as e:
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    # El worker de la cola lo entrega; el código nunca se escribe en los logs
+    mail_queue.enqueue(otp_email(request.email.strip(), code, sender))
+    print(f"📨 Código OTP encolado para: {request.email}")
+
     return {"message": "Código enviado con éxito"}
 
 @router.post("/verify-otp")
 async def verify_otp(request: OTPVerify):
-    saved_code = otp_storage.get(request.email)
-    
-    if saved_code and saved_code == request.code:
-        # Borramos el código para que no se use dos veces
-        del otp_storage[request.email]
+    if await otp_service.verify(request.email, request.code):
         return {"message": "Verificación exitosa"}
-    
+
     raise HTTPException(
         status_code=status.HTTP_400_BAD_REQUEST,
         detail="Código incorrecto o expirado, bro"
-    )
\ No newline at end of file
+    )
@@ -1,11 +1,18 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
-from app.core.firebase_config import db # Nuestra conexión a Firestore
+from app.core import clients
+from app.services import analytics
+from app.services.write_behind import WriteBehindBuffer, InvalidDocument
 
 # 1. DEFINIR EL ROUTER (Esto es lo que te daba el error)
 router = APIRouter()
 
+# Los resultados se anotan en un journal local y se suben a Firestore por lotes;
+# tras confirmar cada lote se suma en los rollups de analítica (si falla, el backfill lo corrige)
+results_buffer = WriteBehindBuffer(clients.firestore_db, "exam_results", after_commit=analytics.add_exam_results)
+
 # 2. DEFINIR EL MODELO DE DATOS (Para que FastAPI sepa qué recibir)
 class ExamSubmission(BaseModel):
     user_id: str
@@ -27,9 +34,8 @@ async def submit_exam(data: ExamSubmission):
     try:
         # 1. Obtenemos el análisis
         analysis = analyze_exam(data.module, data.content)
-        
-        # 2. Guardamos en Firebase Firestore
-        doc_ref = db.collection("exam_results").document()
+
+        # 2. Lo anotamos en el journal; el worker lo confirma en Firestore en el siguiente lote
         exam_data = {
             "user_id": data.user_id,
             "module": data.module,
@@ -37,12 +43,15 @@ async def submit_exam(data: ExamSubmission):
             "analysis": analysis,
             "timestamp": datetime.now()
         }
-        doc_ref.set(exam_data)
-        
+        firebase_id = await asyncio.to_thread(results_buffer.submit, exam_data)
+
         return {
-            "status": "success", 
-            "firebase_id": doc_ref.id, 
+            "status": "success",
+            "firebase_id": firebase_id,
             "results": analysis
         }
+    except InvalidDocument as e:
+        # Se rechaza antes de anotarlo: Firestore nunca lo aceptaría
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from app.core.firebase_config import db
+from datetime import datetime
+from app.core import clients
 
 # ESTO ES LO QUE FALTA
 router = APIRouter()
@@ -17,7 +18,7 @@ class UserRegister(BaseModel):
 async def register_user(user: UserRegister):
     try:
         # Aquí puedes guardar el perfil extendido en Firestore si quieres
-        doc_ref = db.collection("users").document(user.uid)
+        doc_ref = clients.firestore_db().collection("users").document(user.uid)
         doc_ref.set({
             "full_name": user.full_name,
             "email": user.email,
@@ -0,0 +1,97 @@
+import os
+
+from app.services.scoring import normalize_answer
+
+# ----------------------------------------------------
+# ALINEACIÓN LOCAL PARA SPEAKING
+# Distancia de edición por palabras entre la frase objetivo y la transcripción:
+# WER, precisión y diff palabra a palabra, sin llamar al modelo.
+# No está vectorizada: es Python puro, intento a intento (numpy no es
+# dependencia). Cada intento cuesta O(palabras_objetivo × palabras_transcritas)
+# en tiempo y memoria, por eso la petición limita la longitud de los textos y
+# el número de intentos, y el lote se puntúa en un hilo.
+# ----------------------------------------------------
+
+MAX_TEXT_CHARS = int(os.getenv("SPEAKING_MAX_TEXT_CHARS", "1000"))
+MAX_ATTEMPTS = int(os.getenv("SPEAKING_MAX_ATTEMPTS", "20"))
+
+
+def tokenize(text: str) -> list:
+    # Misma normalización que la corrección de MCQ (7/seven, centre/center...)
+    return normalize_answer(text).split()
+
+
+def align(target: list, spoken: list) -> list:
+    n, m = len(target), len(spoken)
+    # dist[i][j] = coste de alinear target[:i] con spoken[:j]
+    dist = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        dist[i][0] = i
+    for j in range(1, m + 1):
+        dist[0][j] = j
+    for i in range(1, n + 1):
+        row, prev = dist[i], dist[i - 1]
+        word = target[i - 1]
+        for j in range(1, m + 1):
+            row[j] = min(
+                prev[j - 1] + (word != spoken[j - 1]),
+                prev[j] + 1,
+                row[j - 1] + 1,
+            )
+
+    ops = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and dist[i][j] == dist[i - 1][j - 1] + (target[i - 1] != spoken[j - 1]):
+            op = "match" if target[i - 1] == spoken[j - 1] else "substitution"
+            ops.append({"op": op, "target": target[i - 1], "spoken": spoken[j - 1]})
+            i, j = i - 1, j - 1
+        elif i > 0 and dist[i][j] == dist[i - 1][j] + 1:
+            ops.append({"op": "deletion", "target": target[i - 1], "spoken": None})
+            i -= 1
+        else:
+            ops.append({"op": "insertion", "target": None, "spoken": spoken[j - 1]})
+            j -= 1
+    ops.reverse()
+    return ops
+
+
+def score_attempt(target: str, transcript: str) -> dict:
+    target_words, spoken_words = tokenize(target), tokenize(transcript)
+    ops = align(target_words, spoken_words)
+    errors = sum(op["op"] != "match" for op in ops)
+    wer = errors / len(target_words) if target_words else float(bool(spoken_words))
+    return {
+        "target": target,
+        "transcript": transcript,
+        "wer": round(wer, 4),
+        "accuracy": round(max(0.0, 1.0 - wer) * 100),
+        "diff": ops,
+    }
+
+
+def score_batch(pairs: list) -> list:
+    return [score_attempt(target, transcript) for target, transcript in pairs]
+
+
+def estimated_band(score: float) -> str:
+    # Aproximación de banda IELTS a partir de la precisión media
+    for threshold, band in ((95, "8.5"), (90, "8.0"), (85, "7.5"), (80, "7.0"), (72, "6.5"),
+                            (65, "6.0"), (55, "5.5"), (45, "5.0"), (35, "4.5")):
+        if score >= threshold:
+            return band
+    return "4.0"
+
+
+def summarize(results: list) -> dict:
+    overall = round(sum(r["accuracy"] for r in results) / len(results)) if results else 0
+    missed = {}
+    for r in results:
+        for op in r["diff"]:
+            if op["op"] in ("substitution", "deletion"):
+                missed[op["target"]] = missed.get(op["target"], 0) + 1
+    hardest = sorted(missed, key=missed.get, reverse=True)[:5]
+    feedback = f"Precisión media de pronunciación: {overall}%."
+    if hardest:
+        feedback += f" Palabras a practicar: {', '.join(hardest)}."
+    return {"overall_score": overall, "estimated_band": estimated_band(overall), "general_feedback": feedback}
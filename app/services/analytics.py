@@ -0,0 +1,290 @@
+import os
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from app.services.progress import SKILLS, COLLECTION as PROGRESS_COLLECTION
+from app.services.question_bank import LEVELS, POOLED_TYPES
+
+# ----------------------------------------------------
+# ANALÍTICA DE COHORTE (ROLLUPS INCREMENTALES)
+# Cada nota de progreso y cada resultado de examen suman en documentos de
+# rollup de analytics_rollups, con un contador repartido en ANALYTICS_SHARDS
+# shards por bucket de tiempo ("all" y uno por día, "day-AAAA-MM-DD"):
+#   progress.<nivel>.<habilidad> = {sum, attempts}
+#   exams.<módulo>               = {count, score_sum, passed} (tras guardar cada lote;
+#                                  módulos fuera de POOLED_TYPES se agrupan en "other")
+#   weakest.<nivel>.<habilidad>  = alumnos cuya habilidad más floja es esa (solo "all")
+# El panel lee solo esos shards (lecturas fijas, no crece con los alumnos) y el
+# backfill los reconstruye recorriendo user_progress y exam_results por páginas.
+# Los rollups de exámenes son "al menos una vez": si un lote de resultados se
+# vuelve a confirmar (error transitorio durante la bisección del write-behind o
+# caída antes del checkpoint), sus exámenes se suman dos veces hasta el
+# siguiente backfill. Los resultados en sí son idempotentes (ids fijos).
+# ----------------------------------------------------
+
+COLLECTION = "analytics_rollups"
+EXAM_RESULTS_COLLECTION = "exam_results"
+SHARDS = int(os.getenv("ANALYTICS_SHARDS", "8"))
+BACKFILL_PAGE_SIZE = int(os.getenv("ANALYTICS_BACKFILL_PAGE_SIZE", "500"))
+BACKFILL_TIMEOUT = float(os.getenv("ANALYTICS_BACKFILL_TIMEOUT", "3600"))
+CACHE_SECONDS = float(os.getenv("ANALYTICS_CACHE_SECONDS", "60"))
+MAX_TREND_DAYS = 90
+BATCH_LIMIT = 500  # Escrituras por WriteBatch
+
+
+def day_bucket(when: datetime | None = None) -> str:
+    when = when or datetime.now(timezone.utc)
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc)
+    return f"day-{when:%Y-%m-%d}"
+
+
+def _shard(db, bucket: str, shard: int | None = None):
+    # Shard aleatorio: escrituras concurrentes se reparten entre documentos
+    shard = random.randrange(SHARDS) if shard is None else shard
+    return db.collection(COLLECTION).document(f"{bucket}_{shard}")
+
+
+def _add(target: dict, path: tuple, value: float):
+    for key in path[:-1]:
+        target = target.setdefault(key, {})
+    target[path[-1]] = target.get(path[-1], 0) + value
+
+
+def _merge_sum(target: dict, source: dict):
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge_sum(target.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            target[key] = target.get(key, 0) + value
+
+
+def _increments(totals: dict) -> dict:
+    # set(merge=True) no interpreta rutas con puntos: se envían mapas anidados
+    from firebase_admin import firestore
+    return {k: _increments(v) if isinstance(v, dict) else firestore.Increment(v) for k, v in totals.items()}
+
+
+def weakest_skill(level_stats: dict | None) -> str | None:
+    """Habilidad con menor media entre las que tienen intentos (empate: orden de SKILLS)."""
+    averages = {
+        skill: stats["sum"] / stats["attempts"]
+        for skill in SKILLS
+        if (stats := (level_stats or {}).get(skill)) and stats.get("attempts")
+    }
+    return min(averages, key=averages.get) if averages else None
+
+
+def _score(value) -> float:
+    # Una nota mal formada cuenta como 0 en lugar de tumbar el lote entero
+    try:
+        score = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return score if math.isfinite(score) else 0.0
+
+
+def _exam_totals(records) -> dict:
+    totals = {}
+    for data in records:
+        analysis = data.get("analysis")
+        analysis = analysis if isinstance(analysis, dict) else {}
+        # module lo manda el cliente: cada valor nuevo sería un campo más en todos los shards
+        module = data.get("module") if data.get("module") in POOLED_TYPES else "other"
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, str):
+            try:
+                timestamp = datetime.fromisoformat(timestamp)
+            except ValueError:
+                timestamp = None
+        day = totals.setdefault(day_bucket(timestamp if isinstance(timestamp, datetime) else None), {})
+        _add(day, ("exams", module, "count"), 1)
+        _add(day, ("exams", module, "score_sum"), _score(analysis.get("score")))
+        _add(day, ("exams", module, "passed"), 1 if analysis.get("passed") else 0)
+    return totals
+
+
+# ---------------- Escritura incremental ----------------
+
+def add_exam_results(db, records: list):
+    """Suma un lote de resultados ya guardados a los rollups en un WriteBatch propio (un set por bucket)."""
+    by_day = _exam_totals(records)
+    if not by_day:
+        return
+    writes = db.batch()
+    overall = {}
+    for day, totals in by_day.items():
+        _merge_sum(overall, totals)
+        writes.set(_shard(db, day), _increments(totals), merge=True)
+    writes.set(_shard(db, "all"), _increments(overall), merge=True)
+    writes.commit()
+
+
+def record_progress(db, user_id: str, level: str, skill: str, score: float):
+    """Suma la nota a los rollups y mueve la distribución de habilidad más floja si cambia."""
+    from firebase_admin import firestore
+
+    totals = {"progress": {level: {skill: {"sum": score, "attempts": 1}}}}
+    user_ref = db.collection(PROGRESS_COLLECTION).document(user_id)
+    all_ref, day_ref = _shard(db, "all"), _shard(db, day_bucket())
+
+    @firestore.transactional
+    def apply(transaction):
+        snapshot = user_ref.get(field_paths=[f"stats_{level}", "analytics_weakest"], transaction=transaction)
+        data = snapshot.to_dict() or {}
+        previous = (data.get("analytics_weakest") or {}).get(level)
+        current = weakest_skill(data.get(f"stats_{level}"))
+        overall = dict(totals)
+        if current != previous:
+            moved = {current: 1} if current else {}
+            if previous:
+                moved[previous] = moved.get(previous, 0) - 1
+            overall["weakest"] = {level: moved}
+            transaction.update(user_ref, {f"analytics_weakest.{level}": current})
+        transaction.set(all_ref, _increments(overall), merge=True)
+        transaction.set(day_ref, _increments(totals), merge=True)
+
+    apply(db.transaction())
+
+
+# ---------------- Lectura ----------------
+
+def _average(total: float, count: float) -> float:
+    return round(total / count, 1) if count else 0
+
+
+def summary(db, days: int = 30) -> dict:
+    """Panel de cohorte a partir de los shards de "all" y de los últimos `days` días."""
+    today = datetime.now(timezone.utc)
+    buckets = ["all"] + [day_bucket(today - timedelta(days=offset)) for offset in range(days - 1, -1, -1)]
+    refs = [_shard(db, bucket, shard) for bucket in buckets for shard in range(SHARDS)]
+    totals = {bucket: {} for bucket in buckets}
+    for snapshot in db.get_all(refs):
+        if snapshot.exists:
+            _merge_sum(totals[snapshot.id.rsplit("_", 1)[0]], snapshot.to_dict() or {})
+
+    overall = totals["all"]
+    trend = []
+    for bucket in buckets[1:]:
+        day = totals[bucket]
+        attempts = sum(s.get("attempts", 0) for lvl in day.get("progress", {}).values() for s in lvl.values())
+        score_sum = sum(s.get("sum", 0) for lvl in day.get("progress", {}).values() for s in lvl.values())
+        exams = day.get("exams", {}).values()
+        exam_count = sum(e.get("count", 0) for e in exams)
+        trend.append({
+            "date": bucket[len("day-"):],
+            "attempts": attempts,
+            "average": _average(score_sum, attempts),
+            "exams": exam_count,
+            "exam_average": _average(sum(e.get("score_sum", 0) for e in exams), exam_count),
+        })
+
+    return {
+        "skills": {
+            level: {
+                skill: {"attempts": stats.get("attempts", 0), "average": _average(stats.get("sum", 0), stats.get("attempts", 0))}
+                for skill, stats in overall.get("progress", {}).get(level, {}).items()
+            }
+            for level in LEVELS if level in overall.get("progress", {})
+        },
+        "weakest_skill": {
+            level: {skill: count for skill, count in counts.items() if count > 0}
+            for level, counts in overall.get("weakest", {}).items()
+        },
+        "exams": {
+            module: {"count": e.get("count", 0), "average": _average(e.get("score_sum", 0), e.get("count", 0)),
+                     "pass_rate": _average(100 * e.get("passed", 0), e.get("count", 0))}
+            for module, e in overall.get("exams", {}).items()
+        },
+        "trend": trend,
+        "reads": len(refs),
+    }
+
+
+# ---------------- Backfill ----------------
+
+class _Batcher:
+    """WriteBatch que se confirma solo al llegar a BATCH_LIMIT escrituras."""
+
+    def __init__(self, db):
+        self.db = db
+        self.writes = db.batch()
+        self.pending = 0
+        self.committed = 0
+
+    def set(self, ref, data: dict, **kwargs):
+        self.writes.set(ref, data, **kwargs)
+        self._count()
+
+    def update(self, ref, data: dict):
+        self.writes.update(ref, data)
+        self._count()
+
+    def _count(self):
+        self.pending += 1
+        if self.pending >= BATCH_LIMIT:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.writes.commit()
+            self.committed += self.pending
+            self.writes = self.db.batch()
+            self.pending = 0
+
+
+def _pages(db, collection: str, fields: list, page_size: int):
+    query = db.collection(collection).select(fields).order_by("__name__").limit(page_size)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+def backfill(db, page_size: int = BACKFILL_PAGE_SIZE) -> dict:
+    """Reconstruye los rollups desde cero. Las sumas por día de progreso no se pueden
+    recuperar (user_progress solo guarda agregados) y se dejan como están."""
+    overall, days = {}, {}
+    batcher = _Batcher(db)
+    students = results = 0
+
+    for snapshot in _pages(db, PROGRESS_COLLECTION, [f"stats_{lvl}" for lvl in LEVELS] + ["analytics_weakest"], page_size):
+        data = snapshot.to_dict() or {}
+        students += 1
+        weakest = {}
+        for level in LEVELS:
+            level_stats = data.get(f"stats_{level}") or {}
+            for skill in SKILLS:
+                stats = level_stats.get(skill) or {}
+                if stats.get("attempts"):
+                    _add(overall, ("progress", level, skill, "sum"), stats.get("sum", 0))
+                    _add(overall, ("progress", level, skill, "attempts"), stats["attempts"])
+            skill = weakest_skill(level_stats)
+            if skill:
+                weakest[level] = skill
+                _add(overall, ("weakest", level, skill), 1)
+        # Se guarda la habilidad más floja para que las notas nuevas muevan bien la distribución
+        if weakest != (data.get("analytics_weakest") or {}):
+            batcher.update(snapshot.reference, {"analytics_weakest": weakest})
+
+    for snapshot in _pages(db, EXAM_RESULTS_COLLECTION, ["module", "analysis", "timestamp"], page_size):
+        results += 1
+        for day, totals in _exam_totals([snapshot.to_dict() or {}]).items():
+            _merge_sum(days.setdefault(day, {}), totals)
+            _merge_sum(overall, totals)
+
+    # El total va al shard 0 y el resto se vacía; merge=[campos] reemplaza esos mapas enteros
+    fields = ["progress", "weakest", "exams"]
+    for shard in range(SHARDS):
+        batcher.set(_shard(db, "all", shard), {f: overall.get(f, {}) if shard == 0 else {} for f in fields}, merge=fields)
+    for day, totals in days.items():
+        for shard in range(SHARDS):
+            batcher.set(_shard(db, day, shard), {"exams": totals["exams"] if shard == 0 else {}}, merge=["exams"])
+    batcher.flush()
+
+    print(f"✅ Rollups reconstruidos: {students} alumnos, {results} resultados, {len(days)} días")
+    return {"students": students, "exam_results": results, "days": len(days), "writes": batcher.committed}
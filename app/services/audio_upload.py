@@ -0,0 +1,244 @@
+import os
+import sys
+import math
+import wave
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from array import array
+
+# ----------------------------------------------------
+# PIPELINE DE SUBIDA DE AUDIO (SPEAKING)
+# El audio se vuelca a un archivo temporal por chunks mientras llega (memoria
+# constante), se limitan tamaño y duración antes de llamar a Whisper, y las
+# grabaciones largas se parten en silencios y se transcriben en paralelo.
+# WAV se procesa con la librería estándar; otros formatos (webm, ogg, mp3)
+# usan ffprobe/ffmpeg si están instalados. Sin ellos (despliegue sin ffmpeg) se
+# aceptan hasta AUDIO_MAX_UNPROBED_BYTES y se transcriben enteros, sin partir.
+# ----------------------------------------------------
+
+MAX_UPLOAD_BYTES = int(os.getenv("AUDIO_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_DURATION_SECONDS = float(os.getenv("AUDIO_MAX_DURATION_SECONDS", "600"))
+CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "60"))
+# Tope para grabaciones cuya duración no se puede medir: el límite de subida de Whisper
+MAX_UNPROBED_BYTES = int(os.getenv("AUDIO_MAX_UNPROBED_BYTES", str(25 * 1024 * 1024)))
+READ_CHUNK_BYTES = 64 * 1024
+
+SILENCE_WINDOW_SECONDS = 0.03
+SILENCE_DB = -35.0
+
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+
+
+class AudioRejected(Exception):
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class SpooledAudio:
+
+    def __init__(self, path: str, size: int, sha256: str, suffix: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.suffix = suffix
+
+    def cleanup(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_upload(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledAudio:
+    suffix = os.path.splitext(upload.filename or "")[1] or ".webm"
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await upload.read(READ_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AudioRejected(413, f"El audio supera el máximo de {max_bytes} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    if size == 0:
+        os.remove(path)
+        raise AudioRejected(400, "Audio vacío")
+    return SpooledAudio(path, size, digest.hexdigest(), suffix)
+
+
+# ---------------- Duración ----------------
+
+async def probe_duration(audio: SpooledAudio) -> float | None:
+    if audio.suffix.lower() == ".wav":
+        return await asyncio.to_thread(_wav_duration, audio.path)
+    if FFPROBE is None:
+        return None
+    proc = await asyncio.create_subprocess_exec(
+        FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audio.path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    out, _ = await proc.communicate()
+    try:
+        return float(out.strip())
+    except ValueError:
+        return None
+
+
+def _wav_duration(path: str) -> float | None:
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError):
+        return None
+
+
+async def check_duration(audio: SpooledAudio, max_seconds: float = MAX_DURATION_SECONDS) -> float | None:
+    """Duración en segundos, o None si el servidor no puede medirla (sin ffprobe): entonces
+    solo se limita por tamaño y la grabación se transcribe entera."""
+    if audio.suffix.lower() != ".wav" and FFPROBE is None:
+        if audio.size > MAX_UNPROBED_BYTES:
+            raise AudioRejected(413, f"El audio supera el máximo de {MAX_UNPROBED_BYTES} bytes")
+        return None
+    duration = await probe_duration(audio)
+    if duration is None:
+        raise AudioRejected(400, "No se pudo leer la duración del audio")
+    if duration > max_seconds:
+        raise AudioRejected(413, f"El audio dura {duration:.0f}s; el máximo es {max_seconds:.0f}s")
+    return duration
+
+
+# ---------------- Corte en silencios ----------------
+
+def _pick_cuts(silences: list, duration: float, target: float) -> list:
+    # Elige, para cada ~target segundos, el silencio más cercano como punto de corte
+    cuts = []
+    last = 0.0
+    while duration - last > target * 1.5:
+        goal = last + target
+        candidates = [t for t in silences if last + target / 2 < t < last + target * 1.5]
+        cut = min(candidates, key=lambda t: abs(t - goal)) if candidates else goal
+        cuts.append(cut)
+        last = cut
+    return cuts
+
+
+def _wav_silences(path: str) -> tuple:
+    with wave.open(path, "rb") as w:
+        rate, width, channels = w.getframerate(), w.getsampwidth(), w.getnchannels()
+        duration = w.getnframes() / float(rate)
+        if width != 2:
+            return [], duration
+        window = max(int(rate * SILENCE_WINDOW_SECONDS), 1)
+        threshold = 32768 * 10 ** (SILENCE_DB / 20)
+        silences = []
+        position = 0
+        while frames := w.readframes(window):
+            frame_count = len(frames) // (width * channels)
+            samples = array("h", frames)
+            if sys.byteorder == "big":
+                samples.byteswap()
+            samples = samples[::4]  # Submuestreo: basta para medir energía
+            rms = math.sqrt(sum(s * s for s in samples) / len(samples)) if samples else 0
+            if rms < threshold:
+                silences.append((position + window / 2) / rate)
+            position += frame_count
+    return silences, duration
+
+
+def _wav_cut(path: str, start: float, end: float) -> str:
+    fd, out_path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    with wave.open(path, "rb") as src, wave.open(out_path, "wb") as dst:
+        rate = src.getframerate()
+        dst.setparams(src.getparams())
+        src.setpos(int(start * rate))
+        dst.writeframes(src.readframes(int((end - start) * rate)))
+    return out_path
+
+
+async def _ffmpeg_silences(path: str) -> list:
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG, "-hide_banner", "-nostats", "-i", path,
+        "-af", f"silencedetect=noise={SILENCE_DB}dB:d=0.3", "-f", "null", "-",
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    _, err = await proc.communicate()
+    silences = []
+    start = None
+    for line in err.decode("utf-8", "ignore").splitlines():
+        if "silence_start:" in line:
+            start = float(line.split("silence_start:")[1].split()[0])
+        elif "silence_end:" in line and start is not None:
+            end = float(line.split("silence_end:")[1].split()[0])
+            silences.append((start + end) / 2)
+            start = None
+    return silences
+
+
+async def _ffmpeg_cut(path: str, start: float, end: float) -> str:
+    fd, out_path = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG, "-y", "-v", "error", "-ss", f"{start:.3f}", "-to", f"{end:.3f}", "-i", path,
+        "-ac", "1", "-ar", "16000", "-b:a", "48k", out_path,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    if await proc.wait() != 0:
+        os.remove(out_path)
+        raise RuntimeError("ffmpeg no pudo cortar el audio")
+    return out_path
+
+
+async def split_on_silence(audio: SpooledAudio, duration: float | None, target: float = CHUNK_SECONDS) -> list:
+    """Devuelve [(offset_segundos, path)]. Si no hace falta partir, un solo trozo con el original."""
+    if duration is None or duration <= target * 1.5:
+        return [(0.0, audio.path)]
+    if audio.suffix.lower() == ".wav":
+        silences, duration = await asyncio.to_thread(_wav_silences, audio.path)
+        cut = lambda s, e: asyncio.to_thread(_wav_cut, audio.path, s, e)
+    elif FFMPEG is not None:
+        silences = await _ffmpeg_silences(audio.path)
+        cut = lambda s, e: _ffmpeg_cut(audio.path, s, e)
+    else:
+        return [(0.0, audio.path)]
+
+    bounds = [0.0, *_pick_cuts(silences, duration, target), duration]
+    paths = await asyncio.gather(*(cut(s, e) for s, e in zip(bounds, bounds[1:])))
+    return list(zip(bounds, paths))
+
+
+async def transcribe_spooled(audio: SpooledAudio, duration: float | None, transcribe) -> dict:
+    """transcribe(file) -> {"text", "segments"}; une los trozos con timestamps absolutos."""
+    pieces = await split_on_silence(audio, duration)
+
+    async def run(offset: float, path: str) -> dict:
+        with open(path, "rb") as f:
+            result = await transcribe(f)
+        segments = [
+            {"start": round(seg["start"] + offset, 2), "end": round(seg["end"] + offset, 2), "text": seg["text"]}
+            for seg in result.get("segments", [])
+        ]
+        return {"text": result["text"].strip(), "segments": segments}
+
+    try:
+        results = await asyncio.gather(*(run(offset, path) for offset, path in pieces))
+    finally:
+        for _, path in pieces:
+            if path != audio.path:
+                os.remove(path)
+
+    return {
+        "text": " ".join(r["text"] for r in results if r["text"]),
+        "segments": [seg for r in results for seg in r["segments"]],
+    }
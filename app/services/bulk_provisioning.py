@@ -0,0 +1,151 @@
+import io
+import os
+import csv
+import json
+import uuid
+import asyncio
+import hashlib
+from functools import lru_cache
+
+from app.core import clients
+
+# ----------------------------------------------------
+# ALTA MASIVA DE ALUMNOS
+# Firebase Auth import_users por lotes (contraseñas con PBKDF2-SHA256),
+# user_progress con WriteBatch de Firestore (máx. 500 escrituras por commit)
+# y progreso fila por fila en NDJSON. import_users no comprueba emails
+# duplicados: se filtran los repetidos en la carga y los que ya existen en Auth.
+# ----------------------------------------------------
+
+CHUNK_SIZE = 500  # Límite de escrituras por WriteBatch (import_users admite hasta 1000)
+LOOKUP_SIZE = 100  # Identificadores por llamada a get_users
+PBKDF2_ROUNDS = int(os.getenv("BULK_PBKDF2_ROUNDS", "20000"))
+
+
+@lru_cache(maxsize=1)
+def _hash_alg():
+    return clients.admin_auth().UserImportHash.pbkdf2_sha256(rounds=PBKDF2_ROUNDS)
+
+
+def parse_rows(body: bytes, content_type: str) -> list:
+    """Acepta CSV (email,password,full_name,role) o JSON: lista o {"users": [...]}."""
+    if "csv" in content_type:
+        text = body.decode("utf-8-sig")
+        return list(csv.DictReader(io.StringIO(text)))
+    data = json.loads(body or b"[]")
+    if isinstance(data, dict):
+        data = data.get("users", [])
+    if not isinstance(data, list):
+        raise ValueError("Se esperaba una lista de usuarios")
+    return data
+
+
+def _hash_password(password: str) -> tuple:
+    salt = os.urandom(16)
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ROUNDS), salt
+
+
+def _existing_emails(emails: list) -> set:
+    admin_auth = clients.admin_auth()
+    found = set()
+    for start in range(0, len(emails), LOOKUP_SIZE):
+        identifiers = [admin_auth.EmailIdentifier(email) for email in emails[start:start + LOOKUP_SIZE]]
+        found.update(user.email.lower() for user in admin_auth.get_users(identifiers).users if user.email)
+    return found
+
+
+def _import_chunk(users: list) -> dict:
+    # users: [(uid, UserCreateRequest)]; devuelve {índice_en_chunk: motivo} de los fallos
+    admin_auth = clients.admin_auth()
+    records = []
+    for uid, req in users:
+        password_hash, salt = _hash_password(req.password)
+        records.append(admin_auth.ImportUserRecord(
+            uid=uid,
+            email=req.email,
+            display_name=req.full_name,
+            password_hash=password_hash,
+            password_salt=salt,
+        ))
+    result = admin_auth.import_users(records, hash_alg=_hash_alg())
+    return {err.index: err.reason for err in result.errors}
+
+
+def _commit_progress(db, users: list, progress_data):
+    batch = db.batch()
+    for uid, req in users:
+        batch.set(db.collection("user_progress").document(uid), progress_data(req))
+    batch.commit()
+
+
+async def provision_users(rows: list, db, model, progress_data, on_created):
+    """Generador NDJSON: una línea por fila y un resumen final.
+
+    model: modelo Pydantic de cada fila; progress_data(req) -> documento inicial
+    de user_progress; on_created(req) se llama por cada alumno creado (correo).
+    """
+    created = failed = 0
+    valid = []
+    seen = {}  # email -> primera fila que lo usa
+    for row_number, row in enumerate(rows):
+        try:
+            req = model(**row)
+        except Exception as e:
+            failed += 1
+            yield _line({"row": row_number, "status": "error", "detail": str(e)})
+            continue
+        email = req.email.strip().lower()
+        if email in seen:
+            failed += 1
+            yield _line({"row": row_number, "email": req.email, "status": "error",
+                         "detail": f"Email repetido en la carga (fila {seen[email]})"})
+            continue
+        seen[email] = row_number
+        valid.append((row_number, req))
+
+    for start in range(0, len(valid), CHUNK_SIZE):
+        chunk = valid[start:start + CHUNK_SIZE]
+        try:
+            # El SDK de Firebase es bloqueante: lo sacamos del event loop
+            existing = await asyncio.to_thread(_existing_emails, [req.email.strip() for _, req in chunk])
+            for row_number, req in chunk:
+                if req.email.strip().lower() in existing:
+                    failed += 1
+                    yield _line({"row": row_number, "email": req.email, "status": "error",
+                                 "detail": "El email ya está registrado"})
+            chunk = [(row_number, req) for row_number, req in chunk if req.email.strip().lower() not in existing]
+            if not chunk:
+                continue
+            users = [(uuid.uuid4().hex[:28], req) for _, req in chunk]
+            errors = await asyncio.to_thread(_import_chunk, users)
+        except Exception as e:
+            failed += len(chunk)
+            for row_number, req in chunk:
+                yield _line({"row": row_number, "email": req.email, "status": "error", "detail": str(e)})
+            continue
+
+        imported = [(user, row_number) for i, (user, (row_number, _)) in enumerate(zip(users, chunk)) if i not in errors]
+        try:
+            await asyncio.to_thread(_commit_progress, db, [user for user, _ in imported], progress_data)
+        except Exception as e:
+            # Los usuarios ya existen en Auth; se informa para reintentar solo el progreso
+            failed += len(imported)
+            for (uid, req), row_number in imported:
+                yield _line({"row": row_number, "email": req.email, "uid": uid, "status": "error",
+                             "detail": f"user_progress no guardado: {e}"})
+            imported = []
+
+        for i, (row_number, req) in enumerate(chunk):
+            if i in errors:
+                failed += 1
+                yield _line({"row": row_number, "email": req.email, "status": "error", "detail": errors[i]})
+        for (uid, req), row_number in imported:
+            created += 1
+            on_created(req)
+            yield _line({"row": row_number, "email": req.email, "uid": uid, "status": "created"})
+
+    yield _line({"status": "done", "created": created, "failed": failed, "total": len(rows)})
+
+
+def _line(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
@@ -0,0 +1,99 @@
+import os
+import json
+import zlib
+import base64
+import secrets
+
+from app.services.kv_store import KVStore, create_store
+
+# ----------------------------------------------------
+# SESIONES DE EXAMEN
+# Al generar un módulo con preguntas se abre una sesión en el KV store
+# compartido (cualquier worker puede corregirla) con la clave de respuestas.
+# El alumno recibe las preguntas sin correctAnswer y para corregir solo manda
+# session_id + answers. Cada sesión se corrige una sola vez (se consume al
+# corregir, para que no se pueda sondear la clave) y caduca sola por TTL.
+# ----------------------------------------------------
+
+SESSION_TYPES = ("reading", "listening", "grammar")
+EXAM_SESSION_TTL_SECONDS = int(os.getenv("EXAM_SESSION_TTL_SECONDS", str(3 * 3600)))
+# A partir de este tamaño el JSON se guarda comprimido
+COMPRESS_BYTES = int(os.getenv("EXAM_SESSION_COMPRESS_BYTES", "1024"))
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+def _encode(data: dict) -> str:
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    if len(raw) < COMPRESS_BYTES:
+        return "j" + raw
+    return "z" + base64.b64encode(zlib.compress(raw.encode(), 6)).decode()
+
+
+def _decode(value: str) -> dict:
+    if value[0] == "z":
+        return json.loads(zlib.decompress(base64.b64decode(value[1:])))
+    return json.loads(value[1:])
+
+
+def _public_question(question):
+    return {k: v for k, v in question.items() if k != "correctAnswer"} if isinstance(question, dict) else question
+
+
+def public_item(item: dict) -> dict:
+    # Lo que ve el alumno: el módulo completo salvo las respuestas correctas
+    return {**item, "questions": [_public_question(q) for q in item.get("questions") or []]}
+
+
+def public_event(event: str, data: dict) -> dict:
+    """Eventos parciales del stream (field/item) sin la clave de respuestas."""
+    if data.get("key") != "questions":
+        return data
+    if event == "item":
+        return {**data, "value": _public_question(data["value"])}
+    value = data["value"]
+    return {**data, "value": [_public_question(q) for q in value] if isinstance(value, list) else value}
+
+
+class ExamSessionService:
+
+    def __init__(self, store: KVStore):
+        self.store = store
+
+    async def open(self, type_: str, level: str, item: dict, user_id: str | None = None) -> dict:
+        """Guarda la clave del módulo y devuelve el item para el alumno con su session_id."""
+        if type_ not in SESSION_TYPES or not item.get("questions"):
+            return item
+        session_id = secrets.token_urlsafe(16)
+        # Forma compacta: [pregunta, opciones, respuesta]; el passage sigue en el banco (item_id)
+        session = {
+            "type": type_,
+            "level": level,
+            "user_id": user_id,
+            "item_id": item.get("item_id"),
+            "q": [
+                [q.get("question"), q.get("options") or [], q.get("correctAnswer")] if isinstance(q, dict) else [q, [], None]
+                for q in item["questions"]
+            ],
+        }
+        await self.store.set(f"exam:session:{session_id}", _encode(session), EXAM_SESSION_TTL_SECONDS)
+        return {**public_item(item), "session_id": session_id}
+
+    async def take(self, session_id: str) -> dict:
+        """Devuelve la sesión y la consume: una segunda corrección da SessionNotFound."""
+        value = await self.store.pop(f"exam:session:{session_id}")
+        if value is None:
+            raise SessionNotFound("Sesión de examen caducada, inexistente o ya corregida")
+        session = _decode(value)
+        questions = []
+        for question, options, answer in session.pop("q"):
+            entry = {"question": question, "options": options}
+            if answer is not None:
+                entry["correctAnswer"] = answer
+            questions.append(entry)
+        return {**session, "questions": questions}
+
+
+exam_sessions = ExamSessionService(create_store())
@@ -0,0 +1,420 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import hashlib
+import socket
+import ipaddress
+import itertools
+import threading
+from urllib.parse import urlsplit
+
+# ----------------------------------------------------
+# TRABAJOS DE CALIFICACIÓN ASÍNCRONOS
+# El envío devuelve un job_id al instante; un pool acotado de workers con
+# prioridades procesa la cola y, si está llena, se rechaza con 503 (backpressure).
+# El estado se guarda en un store intercambiable (SQLite compartido entre
+# workers o memoria) y el resultado se consulta por polling, SSE o webhook.
+# Envíos repetidos de la misma petición reutilizan el trabajo en curso.
+# ----------------------------------------------------
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "500"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "120"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "86400"))
+# Un trabajo 'queued'/'running' sin cambios en este tiempo es de un proceso caído
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "600"))
+# Mientras corre, el trabajo renueva su updated_at para no parecer abandonado
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_STALE_SECONDS / 4)))
+JOB_WEBHOOK_SECRET = os.getenv("JOB_WEBHOOK_SECRET", "")
+WEBHOOK_ATTEMPTS = int(os.getenv("JOB_WEBHOOK_ATTEMPTS", "4"))
+# Si se define, solo se admiten webhooks a estos hosts (y sus subdominios)
+# Solo para desarrollo local: permite webhooks a IPs privadas/loopback
+WEBHOOK_ALLOW_PRIVATE = os.getenv("JOB_WEBHOOK_ALLOW_PRIVATE", "false").lower() == "true"
+WEBHOOK_ALLOWED_HOSTS = [h.strip().lower() for h in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+
+ACTIVE = ("queued", "running")
+FINISHED = ("succeeded", "failed")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class InvalidWebhook(ValueError):
+    pass
+
+
+async def check_webhook_url(url: str):
+    """Evita SSRF: http(s), host permitido y que no resuelva a IPs privadas, locales o de metadatos."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise InvalidWebhook("webhook_url debe ser una URL http(s)")
+    if WEBHOOK_ALLOWED_HOSTS and not any(host == h or host.endswith("." + h) for h in WEBHOOK_ALLOWED_HOSTS):
+        raise InvalidWebhook(f"Host de webhook no permitido: {host}")
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port or 443, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise InvalidWebhook(f"No se pudo resolver el host del webhook: {host}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if (not address.is_global or address.is_multicast) and not WEBHOOK_ALLOW_PRIVATE:
+            raise InvalidWebhook(f"El webhook apunta a una dirección no pública ({address})")
+
+
+class JobStore:
+    """Interfaz del almacén de trabajos. Los métodos son síncronos y rápidos."""
+
+    def create(self, job: dict):
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields):
+        raise NotImplementedError
+
+    def claim(self, job_id: str) -> bool:
+        """Pasa el trabajo de 'queued' a 'running'; False si otro worker se adelantó."""
+        raise NotImplementedError
+
+    def find_active(self, key: str) -> dict | None:
+        """Trabajo en cola o en curso con la misma petición canónica."""
+        raise NotImplementedError
+
+    def stale(self, older_than: float) -> list:
+        raise NotImplementedError
+
+    def purge(self, finished_before: float) -> int:
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def claim(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return False
+            job.update(status="running", updated_at=time.time())
+            return True
+
+    def find_active(self, key):
+        with self._lock:
+            for job in self._jobs.values():
+                if job["key"] == key and job["status"] in ACTIVE:
+                    return dict(job)
+        return None
+
+    def stale(self, older_than):
+        with self._lock:
+            return [dict(j) for j in self._jobs.values() if j["status"] in ACTIVE and j["updated_at"] < older_than]
+
+    def purge(self, finished_before):
+        with self._lock:
+            old = [i for i, j in self._jobs.items() if j["status"] in FINISHED and j["updated_at"] < finished_before]
+            for job_id in old:
+                del self._jobs[job_id]
+        return len(old)
+
+
+class SQLiteJobStore(JobStore):
+
+    COLUMNS = ("id", "key", "type", "payload", "status", "priority", "result", "error",
+               "webhook_url", "created_at", "updated_at")
+    JSON_COLUMNS = ("payload", "result")
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                result TEXT,
+                error TEXT,
+                webhook_url TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status);
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated_at);
+        """)
+
+    def _row(self, row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        for column in self.JSON_COLUMNS:
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        return job
+
+    def create(self, job):
+        values = [json.dumps(job.get(c)) if c in self.JSON_COLUMNS and job.get(c) is not None else job.get(c)
+                  for c in self.COLUMNS]
+        with self._lock:
+            self._conn.execute(f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                               values)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        names = list(fields)
+        values = [json.dumps(fields[n]) if n in self.JSON_COLUMNS and fields[n] is not None else fields[n] for n in names]
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(f'{n} = ?' for n in names)} WHERE id = ?",
+                               (*values, job_id))
+
+    def claim(self, job_id):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id))
+        return cursor.rowcount == 1
+
+    def find_active(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE key = ? AND status IN ('queued', 'running') LIMIT 1",
+                (key,)).fetchone()
+        return self._row(row)
+
+    def stale(self, older_than):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status IN ('queued', 'running') AND updated_at < ?",
+                (older_than,)).fetchall()
+        return [self._row(r) for r in rows]
+
+    def purge(self, finished_before):
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?", (finished_before,))
+        return cursor.rowcount
+
+
+def create_store() -> JobStore:
+    backend = os.getenv("JOB_STORE_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        return SQLiteJobStore(os.getenv("JOB_STORE_PATH", "jobs.db"))
+    return MemoryJobStore()
+
+
+def public_view(job: dict) -> dict:
+    view = {"job_id": job["id"], "type": job["type"], "status": job["status"],
+            "created_at": job["created_at"], "updated_at": job["updated_at"]}
+    if job["status"] == "succeeded":
+        view["result"] = job["result"]
+    elif job["status"] == "failed":
+        view["error"] = job["error"]
+    return view
+
+
+class JobQueue:
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, max_queue: int = JOB_MAX_QUEUE):
+        self.store = store
+        self.workers = workers
+        self.max_queue = max_queue
+        self._handlers = {}   # tipo -> (modelo Pydantic, coroutine handler, timeout)
+        self._queue = None
+        self._tasks = []
+        self._seq = itertools.count()
+        self._events = {}     # job_id -> asyncio.Event (trabajos de este proceso)
+        self._running = 0
+        self._http = None
+
+    def register(self, job_type: str, model, handler, timeout: float = JOB_TIMEOUT):
+        self._handlers[job_type] = (model, handler, timeout)
+
+    # ---------------- Envío ----------------
+
+    # sqlite3 bloquea (hasta 10 s de busy timeout con contención entre workers):
+    # desde el event loop el store se usa siempre a través de un hilo
+
+    async def _store(self, method: str, *args, **kwargs):
+        return await asyncio.to_thread(getattr(self.store, method), *args, **kwargs)
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self._store("get", job_id)
+
+    async def submit(self, job_type: str, req, key: str, priority: int = 5, webhook_url: str | None = None) -> dict:
+        existing = await self._store("find_active", key)
+        if existing is not None:
+            # Reintento del front: mismo trabajo, sin duplicar la carga; su webhook se suma al existente
+            hooks = (existing["webhook_url"] or "").split()
+            if webhook_url and webhook_url not in hooks:
+                await self._store("update", existing["id"], webhook_url=" ".join(hooks + [webhook_url]))
+                existing = await self.get(existing["id"])
+                if existing["status"] in FINISHED:
+                    asyncio.create_task(self._deliver(existing, [webhook_url]))
+            return existing
+        if self._queue is None or self._queue.qsize() >= self.max_queue:
+            raise QueueFull()
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "key": key, "type": job_type, "payload": req.model_dump(mode="json"),
+               "status": "queued", "priority": priority, "result": None, "error": None,
+               "webhook_url": webhook_url, "created_at": now, "updated_at": now}
+        await self._store("create", job)
+        self._enqueue(job)
+        return job
+
+    def _enqueue(self, job: dict):
+        self._events[job["id"]] = asyncio.Event()
+        self._queue.put_nowait((job["priority"], next(self._seq), job["id"]))
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize() if self._queue else 0, "running": self._running,
+                "workers": self.workers, "max_queue": self.max_queue}
+
+    # ---------------- Ciclo de vida ----------------
+
+    def start(self):
+        self._queue = asyncio.PriorityQueue()
+        # Trabajos que quedaron a medias en un proceso caído vuelven a la cola
+        for job in self.store.stale(time.time() - JOB_STALE_SECONDS):
+            self.store.update(job["id"], status="queued")
+            self._enqueue(job)
+        self.store.purge(time.time() - JOB_RESULT_TTL)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    # ---------------- Workers ----------------
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._running += 1
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                # Un fallo del store no debe matar al worker
+                print(f"❌ Error procesando el trabajo {job_id}: {e}")
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        if not await self._store("claim", job_id):
+            return
+        job = await self.get(job_id)
+        try:
+            if job["type"] not in self._handlers:
+                raise ValueError(f"Tipo de trabajo desconocido: {job['type']}")
+            model, handler, timeout = self._handlers[job["type"]]
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                result = await asyncio.wait_for(handler(model(**job["payload"])), timeout)
+            finally:
+                heartbeat.cancel()
+            await self._store("update", job_id, status="succeeded", result=result)
+        except Exception as e:
+            print(f"❌ Error en el trabajo {job['type']} {job_id}: {e}")
+            await self._store("update", job_id, status="failed", error=str(e) or type(e).__name__)
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+        job = await self.get(job_id)
+        if job["webhook_url"]:
+            asyncio.create_task(self._deliver(job, job["webhook_url"].split()))
+
+    async def _heartbeat(self, job_id: str):
+        # Trabajos largos (p. ej. el backfill) superan JOB_STALE_SECONDS: sin esto otro
+        # proceso que arranque los daría por caídos y los volvería a encolar
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await self._store("update", job_id)
+            except Exception as e:
+                print(f"❌ Error renovando el trabajo {job_id}: {e}")
+
+    # ---------------- Entrega ----------------
+
+    async def wait(self, job_id: str, timeout: float) -> dict | None:
+        """Espera a que el trabajo termine; si lo procesa otro worker, se consulta el store."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            event = self._events.get(job_id)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), min(remaining, 15))
+                else:
+                    await asyncio.sleep(min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, job: dict, urls: list):
+        for url in urls:
+            await self._deliver_webhook(job, url)
+
+    async def _deliver_webhook(self, job: dict, url: str):
+        import httpx
+
+        try:
+            # Se vuelve a comprobar al entregar: el DNS pudo cambiar desde el envío
+            await check_webhook_url(url)
+        except InvalidWebhook as e:
+            print(f"❌ Webhook del trabajo {job['id']} descartado: {e}")
+            return
+
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10)
+        body = json.dumps(public_view(job), ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if JOB_WEBHOOK_SECRET:
+            signature = hmac.new(JOB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Signature-SHA256"] = signature
+        for attempt in range(WEBHOOK_ATTEMPTS):
+            try:
+                response = await self._http.post(url, content=body, headers=headers)
+                if response.status_code < 500:
+                    return
+            except httpx.HTTPError as e:
+                print(f"❌ Webhook del trabajo {job['id']} falló (intento {attempt + 1}): {e}")
+            await asyncio.sleep(2 ** attempt)
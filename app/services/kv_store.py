@@ -0,0 +1,284 @@
+import os
+import time
+import math
+import sqlite3
+import asyncio
+import threading
+
+# ----------------------------------------------------
+# ALMACÉN CLAVE-VALOR CON TTL (COMPARTIDO ENTRE WORKERS)
+# Backends intercambiables: SQLite (por defecto; varios workers en el mismo
+# host), Redis (varios hosts; acepta un cliente falso compatible, p. ej.
+# fakeredis) y memoria (rueda de expiración; solo sirve con un único proceso).
+# Incluye un token bucket atómico para rate limiting.
+# ----------------------------------------------------
+
+KV_BACKEND = os.getenv("KV_BACKEND", "sqlite").lower()
+KV_SQLITE_PATH = os.getenv("KV_SQLITE_PATH", "kv_store.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Workers de uvicorn (uvicorn también lo usa como valor por defecto de --workers)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+class KVStore:
+    """Interfaz común; todas las operaciones son atómicas por clave."""
+
+    async def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def pop(self, key: str) -> str | None:
+        """Lee y borra la clave en una sola operación: solo un llamante obtiene el valor."""
+        raise NotImplementedError
+
+    async def incr(self, key: str, ttl: float) -> int:
+        """Incrementa un contador; el TTL se fija al crearlo y no se renueva."""
+        raise NotImplementedError
+
+    async def take_token(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Consume un token del bucket. Devuelve 0 si se concedió o los segundos hasta el próximo token."""
+        raise NotImplementedError
+
+
+def _bucket_step(tokens: float, updated: float, now: float, capacity: int, rate: float) -> tuple:
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+# ---------------- Memoria ----------------
+
+class MemoryKVStore(KVStore):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}    # key -> (valor, expira_en)
+        self._wheel = {}   # segundo -> claves que expiran en ese segundo
+        self._swept_until = math.floor(time.time())
+
+    def _sweep(self, now: float):
+        # Solo se recorren los huecos de la rueda ya vencidos: coste O(claves expiradas)
+        current = math.floor(now)
+        for second in range(self._swept_until, current):
+            for key in self._wheel.pop(second, ()):
+                entry = self._data.get(key)
+                if entry is not None and entry[1] <= now:
+                    del self._data[key]
+        self._swept_until = max(self._swept_until, current)
+
+    def _put(self, key: str, value, expires_at: float):
+        self._data[key] = (value, expires_at)
+        self._wheel.setdefault(math.floor(expires_at), set()).add(key)
+
+    def _live(self, key: str, now: float):
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry
+
+    async def get(self, key):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self._live(key, now)
+        return entry[0] if entry else None
+
+    async def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            self._put(key, value, now + ttl)
+
+    async def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    async def pop(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    async def incr(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self._live(key, now)
+            value = (int(entry[0]) if entry else 0) + 1
+            self._put(key, str(value), entry[1] if entry else now + ttl)
+        return value
+
+    async def take_token(self, key, capacity, refill_per_second):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self._live(key, now)
+            tokens, updated = entry[0] if entry else (capacity, now)
+            tokens, wait = _bucket_step(tokens, updated, now, capacity, refill_per_second)
+            self._put(key, (tokens, now), now + capacity / refill_per_second)
+        return wait
+
+
+# ---------------- SQLite ----------------
+
+class SQLiteKVStore(KVStore):
+
+    SWEEP_INTERVAL = 30
+
+    def __init__(self, path: str = KV_SQLITE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at)")
+        self._last_sweep = 0.0
+
+    def _maybe_sweep(self, now: float):
+        # Borrado por rango sobre el índice de expiración
+        if now - self._last_sweep > self.SWEEP_INTERVAL:
+            self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+            self._last_sweep = now
+
+    def _transaction(self, fn):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(now)
+                self._maybe_sweep(now)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # sqlite3 bloquea (BEGIN IMMEDIATE espera hasta 10 s con contención entre
+    # workers): cada operación se ejecuta en un hilo para no parar el event loop
+
+    def _get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _delete(self, keys):
+        with self._lock:
+            self._conn.executemany("DELETE FROM kv WHERE key = ?", [(k,) for k in keys])
+
+    async def get(self, key):
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key, value, ttl):
+        await asyncio.to_thread(self._transaction, lambda now: self._conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl)))
+
+    async def delete(self, *keys):
+        await asyncio.to_thread(self._delete, keys)
+
+    async def pop(self, key):
+        def op(now):
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            return row[0] if row else None
+        return await asyncio.to_thread(self._transaction, op)
+
+    async def incr(self, key, ttl):
+        def op(now):
+            row = self._conn.execute("SELECT value, expires_at FROM kv WHERE key = ? AND expires_at > ?",
+                                     (key, now)).fetchone()
+            value = (int(row[0]) if row else 0) + 1
+            self._conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                               (key, str(value), row[1] if row else now + ttl))
+            return value
+        return await asyncio.to_thread(self._transaction, op)
+
+    async def take_token(self, key, capacity, refill_per_second):
+        def op(now):
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            tokens, updated = map(float, row[0].split(":")) if row else (capacity, now)
+            tokens, wait = _bucket_step(tokens, updated, now, capacity, refill_per_second)
+            self._conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                               (key, f"{tokens}:{now}", now + capacity / refill_per_second))
+            return wait
+        return await asyncio.to_thread(self._transaction, op)
+
+
+# ---------------- Redis ----------------
+
+# Token bucket atómico en el servidor: KEYS[1]; ARGV = capacidad, tokens/s, ahora
+_TOKEN_BUCKET_LUA = """
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(data[1]) or capacity
+local updated = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisKVStore(KVStore):
+
+    def __init__(self, client=None, url: str = REDIS_URL):
+        if client is None:
+            import redis.asyncio as redis  # Dependencia opcional: solo con KV_BACKEND=redis
+            client = redis.from_url(url, decode_responses=True)
+        self._redis = client
+
+    async def get(self, key):
+        value = await self._redis.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def set(self, key, value, ttl):
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys):
+        if keys:
+            await self._redis.delete(*keys)
+
+    async def pop(self, key):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.get(key)
+            pipe.delete(key)
+            value, _ = await pipe.execute()
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def incr(self, key, ttl):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.pexpire(key, int(ttl * 1000), nx=True)
+            value, _ = await pipe.execute()
+        return int(value)
+
+    async def take_token(self, key, capacity, refill_per_second):
+        wait = await self._redis.eval(_TOKEN_BUCKET_LUA, 1, key, capacity, refill_per_second, time.time())
+        return float(wait.decode() if isinstance(wait, bytes) else wait)
+
+
+def create_store(backend: str = KV_BACKEND) -> KVStore:
+    if backend == "redis":
+        return RedisKVStore()
+    if backend == "sqlite":
+        return SQLiteKVStore()
+    return MemoryKVStore()
+
+
+def require_shared(store: KVStore, what: str):
+    """Falla al arrancar si `what` quedaría en la memoria de un solo worker con varios workers."""
+    if isinstance(store, MemoryKVStore) and WEB_CONCURRENCY > 1:
+        raise RuntimeError(f"{what} necesitan un KV compartido con {WEB_CONCURRENCY} workers: "
+                           "usa KV_BACKEND=sqlite o redis")
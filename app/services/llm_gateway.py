@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import asyncio
+
+from app.core import clients
+from app.services import metrics
+from app.services import resilience
+
+# ----------------------------------------------------
+# GATEWAY ASÍNCRONO HACIA OPENAI
+# Un solo cliente con pool de conexiones compartido por todas las rutas
+# (creado en app.core.clients), timeout por llamada y un tope de peticiones
+# simultáneas hacia el proveedor.
+# ----------------------------------------------------
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "256"))
+DEFAULT_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+AUDIO_TIMEOUT = float(os.getenv("OPENAI_AUDIO_TIMEOUT", "120"))
+FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4o-mini")
+
+# Niveles de modelo por tarea (nombre de la plantilla de prompts): el primero es el
+# preferido y los siguientes el fallback si su circuito está abierto o agota reintentos.
+# grade_writing nunca baja de modelo. Se puede sobrescribir con LLM_MODEL_TIERS (JSON).
+MODEL_TIERS = {
+    "default": [DEFAULT_MODEL],
+    "grade_writing": [DEFAULT_MODEL],
+    "generate_report": [DEFAULT_MODEL, FALLBACK_MODEL],
+    "generate_grammar": [DEFAULT_MODEL, FALLBACK_MODEL],
+    "skill_feedback": [DEFAULT_MODEL, FALLBACK_MODEL],
+    "pronunciation_tip": [DEFAULT_MODEL, FALLBACK_MODEL],
+}
+MODEL_TIERS.update(json.loads(os.getenv("LLM_MODEL_TIERS", "{}")))
+
+_semaphore = None
+
+
+def get_client():
+    return clients.openai()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Se crea perezosamente para que quede ligado al event loop de uvicorn
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
+
+def _chat_client():
+    # Sin reintentos del SDK en chat: los gestiona resilience (con hedging y fallback)
+    return get_client().with_options(max_retries=0)
+
+
+def models_for(task: str | None) -> list:
+    return MODEL_TIERS.get(task or "default", MODEL_TIERS["default"])
+
+
+async def _chat_once(model: str, messages: list, timeout: float) -> dict:
+    async with _get_semaphore():
+        started, ok, usage = time.perf_counter(), False, None
+        try:
+            response = await _chat_client().chat.completions.create(
+                model=model,
+                response_format={"type": "json_object"},
+                messages=messages,
+                timeout=timeout,
+            )
+            ok, usage = True, response.usage
+        finally:
+            metrics.record_llm_call("chat", model, time.perf_counter() - started, ok=ok, usage=usage)
+    return json.loads(response.choices[0].message.content)
+
+
+async def chat_json(messages: list, model: str | None = None, timeout: float = DEFAULT_TIMEOUT,
+                    task: str | None = None) -> dict:
+    models = [model] if model else models_for(task)
+    return await resilience.call(lambda m: _chat_once(m, messages, timeout), models)
+
+
+async def chat_json_stream(messages: list, model: str | None = None, timeout: float = DEFAULT_TIMEOUT,
+                           task: str | None = None):
+    # Igual que chat_json pero entrega los fragmentos de texto según llegan. Sin hedging; los
+    # reintentos y el cambio de modelo solo son posibles antes del primer fragmento.
+    last_error = None
+    for model in [model] if model else models_for(task):
+        circuit = resilience.breaker(model)
+        for retry in range(resilience.RETRIES + 1):
+            if not circuit.allow():
+                break
+            emitted = False
+            try:
+                async for delta in _chat_stream_once(model, messages, timeout):
+                    emitted = True
+                    yield delta
+                circuit.record_success()
+                return
+            except Exception as e:
+                if not resilience.is_retryable(e):
+                    circuit.record_success()  # El proveedor respondió: el error es de la petición
+                    raise
+                circuit.record_failure()
+                if emitted:
+                    raise
+                last_error = e
+            except BaseException:
+                circuit.abandon()  # Cancelada o el consumidor cerró el stream
+                raise
+            if retry < resilience.RETRIES:
+                await asyncio.sleep(resilience.backoff(retry))
+    raise last_error or resilience.CircuitOpen("Sin modelos disponibles")
+
+
+async def _chat_stream_once(model: str, messages: list, timeout: float):
+    async with _get_semaphore():
+        started, ok, usage = time.perf_counter(), False, None
+        try:
+            stream = await _chat_client().chat.completions.create(
+                model=model,
+                response_format={"type": "json_object"},
+                messages=messages,
+                timeout=timeout,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            ok = True
+        finally:
+            metrics.record_llm_call("chat_stream", model, time.perf_counter() - started, ok=ok, usage=usage)
+
+
+async def transcribe(file, model: str = "whisper-1", language: str = "en", timeout: float = AUDIO_TIMEOUT) -> dict:
+    # verbose_json trae los segmentos con timestamps para poder unir trozos
+    async with _get_semaphore():
+        started, ok, duration = time.perf_counter(), False, 0.0
+        try:
+            transcript = await get_client().audio.transcriptions.create(
+                model=model, file=file, language=language, response_format="verbose_json", timeout=timeout
+            )
+            ok, duration = True, getattr(transcript, "duration", 0.0) or 0.0
+        finally:
+            metrics.record_llm_call("transcription", model, time.perf_counter() - started, ok=ok,
+                                    audio_seconds=float(duration))
+    segments = [
+        {"start": seg.start, "end": seg.end, "text": seg.text} for seg in (getattr(transcript, "segments", None) or [])
+    ]
+    return {"text": transcript.text, "segments": segments}
+
+
+async def speech_stream(text: str, voice: str = "nova", model: str = "tts-1-hd", speed: float = 1.02,
+                        chunk_size: int = 16384, timeout: float = AUDIO_TIMEOUT):
+    # Devuelve el MP3 por chunks según llega, sin cargarlo entero en memoria
+    async with _get_semaphore():
+        started, ok = time.perf_counter(), False
+        try:
+            async with get_client().audio.speech.with_streaming_response.create(
+                model=model, voice=voice, input=text, speed=speed, timeout=timeout
+            ) as response:
+                async for chunk in response.iter_bytes(chunk_size):
+                    yield chunk
+            ok = True
+        finally:
+            metrics.record_llm_call("speech", model, time.perf_counter() - started, ok=ok,
+                                    characters=len(text) if ok else 0)
+
+
+async def close():
+    await clients.close()
@@ -0,0 +1,173 @@
+import os
+import time
+import sqlite3
+import smtplib
+import threading
+from email import message_from_string
+from email.message import Message
+
+# ----------------------------------------------------
+# COLA DE CORREO SALIENTE
+# Los correos se guardan en un outbox SQLite (sobrevive a reinicios) y un
+# worker en segundo plano los envía reutilizando una sola conexión SMTP
+# autenticada, por lotes y con reintentos con backoff exponencial. Con varios
+# workers de uvicorn sobre el mismo outbox cada fila se reclama antes de enviarse.
+# ----------------------------------------------------
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+MAIL_QUEUE_PATH = os.getenv("MAIL_QUEUE_PATH", "mail_outbox.db")
+BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE = float(os.getenv("MAIL_BACKOFF_BASE", "15"))
+BACKOFF_MAX = float(os.getenv("MAIL_BACKOFF_MAX", "3600"))
+# Un correo reclamado por un worker que no lo confirma en este tiempo vuelve a la cola
+SENDING_LEASE = float(os.getenv("MAIL_SENDING_LEASE", "300"))
+# La conexión se cierra si pasa este tiempo sin enviar nada
+IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "60"))
+
+
+class MailQueue:
+
+    def __init__(self, path: str = MAIL_QUEUE_PATH, host: str = SMTP_HOST, port: int = SMTP_PORT,
+                 user: str | None = None, password: str | None = None, starttls: bool = SMTP_STARTTLS):
+        self.host = host
+        self.port = port
+        self.user = user if user is not None else os.getenv("SMTP_USER")
+        self.password = password if password is not None else os.getenv("SMTP_PASS")
+        self.starttls = starttls
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._smtp = None
+        self._last_used = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS mail_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                to_addr TEXT NOT NULL,
+                message TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                last_error TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mail_outbox_due ON mail_outbox (status, next_attempt_at)")
+
+    # ---------------- API pública ----------------
+
+    def enqueue(self, msg: Message) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO mail_outbox (to_addr, message, next_attempt_at) VALUES (?, ?, ?)",
+                (msg["To"], msg.as_string(), time.time()),
+            )
+        self._wake.set()
+        return cursor.lastrowid
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close_smtp()
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM mail_outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    # ---------------- Worker ----------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            sent = self.process_due()
+            if sent == 0:
+                if self._smtp is not None and time.monotonic() - self._last_used > IDLE_TIMEOUT:
+                    self._close_smtp()
+                self._wake.wait(timeout=min(self._seconds_to_next(), IDLE_TIMEOUT))
+                self._wake.clear()
+
+    def _seconds_to_next(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM mail_outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()
+        if row[0] is None:
+            return IDLE_TIMEOUT
+        return max(row[0] - time.time(), 0.05)
+
+    def process_due(self) -> int:
+        """Envía un lote de correos pendientes; devuelve cuántos se intentaron."""
+        now = time.time()
+        with self._lock:
+            # Reclamo atómico: otro proceso no verá estas filas hasta que caduque el lease
+            batch = self._conn.execute(
+                "UPDATE mail_outbox SET status = 'sending', next_attempt_at = ? WHERE id IN ("
+                "SELECT id FROM mail_outbox WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?) RETURNING id, to_addr, message, attempts",
+                (now + SENDING_LEASE, now, BATCH_SIZE),
+            ).fetchall()
+        for mail_id, to_addr, raw, attempts in batch:
+            try:
+                self._connection().send_message(message_from_string(raw))
+                self._last_used = time.monotonic()
+                with self._lock:
+                    # Se borra al enviarse: el cuerpo puede llevar credenciales
+                    self._conn.execute("DELETE FROM mail_outbox WHERE id = ?", (mail_id,))
+                print(f"✅ Correo enviado exitosamente a: {to_addr}")
+            except Exception as e:
+                self._close_smtp()
+                self._retry_later(mail_id, attempts + 1, e)
+        return len(batch)
+
+    def _retry_later(self, mail_id: int, attempts: int, error: Exception):
+        status = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+        delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE mail_outbox SET attempts = ?, status = ?, next_attempt_at = ?, last_error = ?, "
+                # Un fallo definitivo no conserva el cuerpo: lleva la contraseña temporal
+                "message = CASE WHEN ? = 'failed' THEN '' ELSE message END WHERE id = ?",
+                (attempts, status, time.time() + delay, str(error), status, mail_id),
+            )
+        print(f"❌ Error enviando correo #{mail_id} (intento {attempts}, {status}): {error}")
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                self._smtp.noop()
+                return self._smtp
+            except (smtplib.SMTPException, OSError):
+                self._close_smtp()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if self.starttls:
+            smtp.starttls()
+        if self.user and self.password:
+            smtp.login(self.user, self.password)
+        self._smtp = smtp
+        return smtp
+
+    def _close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+# Outbox compartido: create-user y send-otp solo encolan y responden
+mail_queue = MailQueue()
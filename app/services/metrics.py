@@ -0,0 +1,293 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+
+from app.services.question_bank import POOLED_TYPES, LEVELS
+
+# ----------------------------------------------------
+# MÉTRICAS (FORMATO PROMETHEUS) E INSTRUMENTACIÓN DE LLAMADAS A OPENAI
+# Latencia por ruta (con type/level del módulo), tiempo upstream vs. local,
+# tokens, segundos de audio, coste estimado y tasas de acierto de las cachés.
+# Se expone en /metrics sin depender de prometheus_client.
+# ----------------------------------------------------
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+# USD por unidad: tokens (por 1M), audio de Whisper (por minuto), TTS (por 1M caracteres)
+PRICES = {
+    "gpt-4o": {"prompt": 2.50, "cached_prompt": 1.25, "completion": 10.00},
+    "gpt-4o-mini": {"prompt": 0.15, "cached_prompt": 0.075, "completion": 0.60},
+    "whisper-1": {"audio_minute": 0.006},
+    "tts-1": {"characters": 15.00},
+    "tts-1-hd": {"characters": 30.00},
+}
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "10"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_request_ctx = contextvars.ContextVar("request_metrics", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, labels, buckets
+        self._series = {}  # key -> [cuentas por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    le = _labels(self.label_names, key, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total:g}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+REQUEST_LABELS = ("route", "method", "status", "module_type", "level")
+
+request_seconds = Histogram("http_request_duration_seconds", "Latencia total de la petición", REQUEST_LABELS)
+request_upstream_seconds = Histogram(
+    "http_request_upstream_seconds", "Tiempo acumulado en llamadas a OpenAI por petición", ("route", "module_type", "level"))
+request_local_seconds = Histogram(
+    "http_request_local_seconds", "Tiempo de la petición fuera de OpenAI", ("route", "module_type", "level"))
+llm_call_seconds = Histogram("llm_call_duration_seconds", "Latencia de cada llamada a OpenAI", ("route", "kind", "model", "outcome"))
+llm_tokens = Counter("llm_tokens_total", "Tokens consumidos", ("route", "model", "direction"))
+llm_audio_seconds = Counter("llm_audio_seconds_total", "Segundos de audio transcritos", ("route", "model"))
+llm_tts_characters = Counter("llm_tts_characters_total", "Caracteres sintetizados con TTS", ("route", "model"))
+llm_cost = Counter("llm_cost_usd_total", "Coste estimado en USD", ("route", "model"))
+llm_resilience_events = Counter(
+    "llm_resilience_events_total", "Reintentos, hedges, fallbacks y aperturas de circuito", ("model", "event"))
+prompt_tokens = Counter("prompt_tokens_total", "Tokens de entrada estimados al compilar cada prompt", ("template",))
+# Estimación: se compara con los mismos datos interpolados como repr, no con el prompt antiguo de cada ruta
+prompt_tokens_saved = Counter(
+    "prompt_tokens_saved_estimate_total", "Estimación de tokens ahorrados frente a interpolar los datos como repr",
+    ("template",))
+# No son tokens cacheados: OpenAI solo cachea prompts de >= 1024 tokens; los aciertos van en llm_tokens_total
+prompt_static_prefix_tokens = Counter(
+    "prompt_static_prefix_tokens_total", "Tokens del prefijo fijo de instrucciones (igual en cada llamada)",
+    ("template",))
+prompt_truncations = Counter("prompt_truncations_total", "Textos recortados por presupuesto de tokens", ("template",))
+event_loop_lag = Histogram("event_loop_lag_seconds", "Retraso del event loop respecto al intervalo esperado",
+                           buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+_METRICS = [request_seconds, request_upstream_seconds, request_local_seconds, llm_call_seconds,
+            llm_tokens, llm_audio_seconds, llm_tts_characters, llm_cost, llm_resilience_events, prompt_tokens, prompt_tokens_saved,
+            prompt_static_prefix_tokens, prompt_truncations, event_loop_lag]
+_collectors = []
+
+
+def register_collector(collect):
+    """collect() -> {nombre_cache: {"hits", "misses", ...}}; se lee en cada scrape."""
+    _collectors.append(collect)
+
+
+# ---------------- Contexto por petición ----------------
+
+def label_request(module_type: str | None = None, level: str | None = None):
+    # Los valores vienen del cliente: fuera de los conocidos se agrupan en "other"
+    # para no crear series sin límite
+    ctx = _request_ctx.get()
+    if ctx is not None:
+        if module_type:
+            ctx["module_type"] = module_type if module_type in POOLED_TYPES else "other"
+        if level:
+            ctx["level"] = level if level in LEVELS else "other"
+
+
+def _current_route() -> str:
+    ctx = _request_ctx.get()
+    if ctx is None:
+        return "background"
+    # Plantilla de la ruta (p. ej. /jobs/{id}); el router la deja en el scope
+    scope = ctx["scope"]
+    return getattr(scope.get("route"), "path", scope["path"])
+
+
+# ---------------- Llamadas a OpenAI ----------------
+
+def record_llm_call(kind: str, model: str, seconds: float, ok: bool = True, usage=None,
+                    audio_seconds: float = 0.0, characters: int = 0):
+    route = _current_route()
+    ctx = _request_ctx.get()
+    if ctx is not None:
+        ctx["upstream"] += seconds
+    llm_call_seconds.observe(seconds, route=route, kind=kind, model=model, outcome="ok" if ok else "error")
+
+    prices = PRICES.get(model, {})
+    cost = 0.0
+    if usage is not None:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        # Tokens servidos desde la caché de prefijos de OpenAI (se cobran a mitad de precio)
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+        llm_tokens.inc(prompt_tokens, route=route, model=model, direction="prompt")
+        llm_tokens.inc(cached_tokens, route=route, model=model, direction="cached_prompt")
+        llm_tokens.inc(completion_tokens, route=route, model=model, direction="completion")
+        cost += (prompt_tokens - cached_tokens) / 1e6 * prices.get("prompt", 0)
+        cost += cached_tokens / 1e6 * prices.get("cached_prompt", prices.get("prompt", 0))
+        cost += completion_tokens / 1e6 * prices.get("completion", 0)
+    if audio_seconds:
+        llm_audio_seconds.inc(audio_seconds, route=route, model=model)
+        cost += audio_seconds / 60 * prices.get("audio_minute", 0)
+    if characters:
+        llm_tts_characters.inc(characters, route=route, model=model)
+        cost += characters / 1e6 * prices.get("characters", 0)
+    if cost:
+        llm_cost.inc(cost, route=route, model=model)
+
+
+def record_prompt(template: str, sent: int, baseline: int, static_prefix: int, truncations: int = 0):
+    prompt_tokens.inc(sent, template=template)
+    prompt_tokens_saved.inc(max(baseline - sent, 0), template=template)
+    prompt_static_prefix_tokens.inc(static_prefix, template=template)
+    if truncations:
+        prompt_truncations.inc(truncations, template=template)
+
+
+async def monitor_event_loop(interval: float = 0.25):
+    # Si algo bloquea el loop, el sleep vuelve tarde: ese retraso es el lag
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(time.perf_counter() - started - interval, 0.0))
+
+
+# ---------------- Middleware ASGI ----------------
+
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        ctx = {"scope": scope, "module_type": "", "level": "", "upstream": 0.0, "status": 500}
+        token = _request_ctx.set(ctx)
+        profiler = _start_profiler()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                ctx["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_ctx.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route is None:
+                route = "unmatched"  # Evita una serie por cada URL desconocida
+            labels = {"route": route, "module_type": ctx["module_type"], "level": ctx["level"]}
+            request_seconds.observe(elapsed, method=scope["method"], status=ctx["status"], **labels)
+            request_upstream_seconds.observe(ctx["upstream"], **labels)
+            # Con llamadas en paralelo el upstream acumulado puede superar al total
+            request_local_seconds.observe(max(elapsed - ctx["upstream"], 0.0), **labels)
+            _stop_profiler(profiler, elapsed, route)
+
+
+# ---------------- Profiler de muestreo opcional ----------------
+
+def _start_profiler():
+    # Requiere pyinstrument; solo se activa con PROFILE_SAMPLE_RATE > 0
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def _stop_profiler(profiler, elapsed: float, route: str):
+    if profiler is None:
+        return
+    profiler.stop()
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = route.strip("/").replace("/", "_") or "root"
+        path = os.path.join(PROFILE_DIR, f"{int(time.time())}_{name}.html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+        print(f"🐢 Petición lenta ({elapsed:.1f}s) en {route}; perfil guardado en {path}")
+
+
+# ---------------- Exposición ----------------
+
+def render() -> str:
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+
+    caches = {}
+    for collect in _collectors:
+        caches.update(collect())
+    for name, kind in (("cache_hits_total", "hits"), ("cache_misses_total", "misses")):
+        lines.append(f"# TYPE {name} counter")
+        for cache, stats in sorted(caches.items()):
+            lines.append(f'{name}{{cache="{_escape(cache)}"}} {stats.get(kind, 0)}')
+    lines.append("# TYPE cache_hit_ratio gauge")
+    for cache, stats in sorted(caches.items()):
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        ratio = stats.get("hits", 0) / lookups if lookups else 0.0
+        lines.append(f'cache_hit_ratio{{cache="{_escape(cache)}"}} {ratio:g}')
+    return "\n".join(lines) + "\n"
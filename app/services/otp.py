@@ -0,0 +1,76 @@
+import os
+import hmac
+import hashlib
+import secrets
+
+from app.services.kv_store import KVStore, create_store
+
+# ----------------------------------------------------
+# CÓDIGOS OTP
+# Los códigos viven en el KV store compartido (cualquier worker puede
+# verificarlos), caducan solos y solo se guarda su hash. Envíos limitados por
+# email y por IP con token bucket; verificaciones limitadas por intentos.
+# ----------------------------------------------------
+
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "600"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_EMAIL_BURST = int(os.getenv("OTP_EMAIL_BURST", "3"))
+OTP_EMAIL_PER_HOUR = float(os.getenv("OTP_EMAIL_PER_HOUR", "10"))
+OTP_IP_BURST = int(os.getenv("OTP_IP_BURST", "20"))
+OTP_IP_PER_HOUR = float(os.getenv("OTP_IP_PER_HOUR", "120"))
+OTP_SECRET = os.getenv("OTP_SECRET", "")
+
+
+class RateLimited(Exception):
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Demasiadas solicitudes; reintenta en {int(retry_after) + 1}s")
+        self.retry_after = int(retry_after) + 1
+
+
+class OTPService:
+
+    def __init__(self, store: KVStore):
+        self.store = store
+
+    @staticmethod
+    def _digest(email: str, code: str) -> str:
+        return hmac.new(OTP_SECRET.encode(), f"{email}:{code}".encode(), hashlib.sha256).hexdigest()
+
+    async def issue(self, email: str, ip: str | None = None) -> str:
+        email = email.strip().lower()
+        limits = [(f"otp:rl:email:{email}", OTP_EMAIL_BURST, OTP_EMAIL_PER_HOUR / 3600)]
+        if ip:
+            limits.append((f"otp:rl:ip:{ip}", OTP_IP_BURST, OTP_IP_PER_HOUR / 3600))
+        for key, burst, rate in limits:
+            wait = await self.store.take_token(key, burst, rate)
+            if wait:
+                raise RateLimited(wait)
+
+        code = f"{secrets.randbelow(90000000) + 10000000}"
+        # Un código nuevo invalida el anterior y reinicia los intentos
+        await self.store.set(f"otp:code:{email}", self._digest(email, code), OTP_TTL_SECONDS)
+        await self.store.delete(f"otp:attempts:{email}")
+        return code
+
+    async def verify(self, email: str, code: str) -> bool:
+        email = email.strip().lower()
+        key = f"otp:code:{email}"
+        attempts_key = f"otp:attempts:{email}"
+        attempts = await self.store.incr(attempts_key, OTP_TTL_SECONDS)
+        if attempts > OTP_MAX_ATTEMPTS:
+            # Agotados los intentos el código deja de servir: hay que pedir otro
+            await self.store.delete(key)
+            return False
+
+        saved = await self.store.get(key)
+        if saved is None or not hmac.compare_digest(saved, self._digest(email, code.strip())):
+            return False
+        # El código se consume con pop: de dos verificaciones correctas simultáneas solo gana una
+        if await self.store.pop(key) != saved:
+            return False
+        await self.store.delete(attempts_key)
+        return True
+
+
+otp_service = OTPService(create_store())
@@ -0,0 +1,82 @@
+from app.services.question_bank import LEVELS
+
+# ----------------------------------------------------
+# PROGRESO DEL ALUMNO (USER_PROGRESS)
+# Cada nota se aplica con transformaciones de campo (Increment/Maximum) en una
+# sola escritura, sin leer el documento. Junto a modules_<nivel> se mantienen
+# agregados por habilidad, por nivel y globales:
+#   stats_<nivel>.<habilidad> / stats_<nivel>.overall / stats_overall
+#     = {sum, attempts, best, last, updated_at}
+# El dashboard lee solo esos mapas con una máscara de campos; la media es sum/attempts.
+# ----------------------------------------------------
+
+SKILLS = ("reading", "listening", "writing", "speaking")
+COLLECTION = "user_progress"
+
+
+class ProgressNotFound(Exception):
+    pass
+
+
+def _aggregate_transforms(prefix: str, score: float) -> dict:
+    from firebase_admin import firestore
+    return {
+        f"{prefix}.sum": firestore.Increment(score),
+        f"{prefix}.attempts": firestore.Increment(1),
+        f"{prefix}.best": firestore.Maximum(score),
+        f"{prefix}.last": score,
+        f"{prefix}.updated_at": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def record_score(db, user_id: str, level: str, skill: str, score: float):
+    """Aplica una nota de forma atómica; escrituras concurrentes no se pisan."""
+    from firebase_admin import firestore
+    from google.api_core.exceptions import NotFound
+
+    updates = {
+        # Compatibilidad con el front actual, que lee modules_<nivel>.<habilidad>
+        f"modules_{level}.{skill}": score,
+        "lastUpdated": firestore.SERVER_TIMESTAMP,
+    }
+    updates.update(_aggregate_transforms(f"stats_{level}.{skill}", score))
+    updates.update(_aggregate_transforms(f"stats_{level}.overall", score))
+    updates.update(_aggregate_transforms("stats_overall", score))
+    try:
+        db.collection(COLLECTION).document(user_id).update(updates)
+    except NotFound:
+        raise ProgressNotFound(user_id)
+
+
+def _summary(stats: dict | None) -> dict:
+    stats = stats or {}
+    attempts = stats.get("attempts", 0)
+    return {
+        "attempts": attempts,
+        "best": stats.get("best", 0),
+        "last": stats.get("last", 0),
+        "average": round(stats.get("sum", 0) / attempts, 1) if attempts else 0,
+        "updated_at": stats.get("updated_at"),
+    }
+
+
+def dashboard(db, user_id: str, level: str | None = None) -> dict:
+    """Proyección compacta: agregados globales y por nivel; detalle por habilidad solo del nivel pedido."""
+    field_paths = ["currentLevel", "stats_overall"] + [f"stats_{lvl}.overall" for lvl in LEVELS]
+    if level:
+        field_paths += [f"stats_{level}.{skill}" for skill in SKILLS]
+    snapshot = db.collection(COLLECTION).document(user_id).get(field_paths=field_paths)
+    if not snapshot.exists:
+        raise ProgressNotFound(user_id)
+
+    data = snapshot.to_dict() or {}
+    result = {
+        "user_id": user_id,
+        "current_level": data.get("currentLevel"),
+        "overall": _summary(data.get("stats_overall")),
+        "levels": {lvl: _summary((data.get(f"stats_{lvl}") or {}).get("overall")) for lvl in LEVELS},
+    }
+    if level:
+        level_stats = data.get(f"stats_{level}") or {}
+        result["skills"] = {skill: _summary(level_stats.get(skill)) for skill in SKILLS}
+    return result
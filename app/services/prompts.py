@@ -0,0 +1,221 @@
+import re
+import json
+import textwrap
+import itertools
+from functools import lru_cache, cached_property
+
+from app.core.config import MODULES_CONFIG
+from app.services import metrics
+
+# ----------------------------------------------------
+# COMPILADOR DE PROMPTS
+# Las instrucciones fijas del examinador van siempre primero y sin datos
+# variables (prefijo estable); los datos de la petición van al final como JSON
+# compacto. OpenAI solo cachea prompts de 1024 tokens o más y estos prefijos
+# son más cortos: los aciertos reales de caché se ven en
+# llm_tokens_total{direction="cached_prompt"}. Antes de enviar se cuentan los
+# tokens (tiktoken; si no está o no puede descargar su vocabulario, una
+# estimación) y se aplica el presupuesto de cada plantilla recortando los
+# textos más largos.
+# ----------------------------------------------------
+
+TRUNCATION_MARK = " […] "
+
+
+# ---------------- Conteo de tokens ----------------
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # La primera vez tiktoken descarga el vocabulario (o lo lee de TIKTOKEN_CACHE_DIR):
+    # se carga en segundo plano al arrancar (prewarm) y no al importar
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")  # Tokenizer de gpt-4o / gpt-4o-mini
+    except Exception as e:
+        print(f"❌ tiktoken no disponible, se estimarán los tokens: {e}")
+        return None
+
+
+def prewarm():
+    _encoding()
+
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Estimación sin tokenizer: palabras largas ocupan varios tokens, cada signo uno
+    return sum(1 + len(piece) // 8 for piece in _WORDS.findall(text))
+
+
+def _compact(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+# ---------------- Presupuesto ----------------
+
+def _longest_string(data, path=()):
+    best = (0, None)
+    if isinstance(data, str):
+        return len(data), path
+    items = data.items() if isinstance(data, dict) else enumerate(data) if isinstance(data, list) else ()
+    for key, value in items:
+        candidate = _longest_string(value, path + (key,))
+        if candidate[0] > best[0]:
+            best = candidate
+    return best
+
+
+def _truncate(text: str, tokens: int) -> str:
+    # Se conservan principio y final: en un essay o un passage ambos aportan contexto
+    keep = max(int(len(text) * tokens / max(count_tokens(text), 1)), 40)
+    head = keep * 2 // 3
+    return text[:head] + TRUNCATION_MARK + text[-(keep - head):]
+
+
+def fit_budget(data: dict, budget: int, fixed_tokens: int) -> tuple:
+    """Recorta los textos más largos de data hasta que el total quepa; devuelve (data, recortes)."""
+    data = json.loads(_compact(data))
+    truncations = 0
+    for _ in range(8):
+        excess = fixed_tokens + count_tokens(_compact(data)) - budget
+        if excess <= 0:
+            break
+        length, path = _longest_string(data)
+        if not path or length < 200:
+            break  # Nada razonable que recortar: se envía tal cual
+        parent = data
+        for key in path[:-1]:
+            parent = parent[key]
+        text = parent[path[-1]]
+        parent[path[-1]] = _truncate(text, max(count_tokens(text) - excess, count_tokens(text) // 4))
+        truncations += 1
+    return data, truncations
+
+
+# ---------------- Plantillas ----------------
+
+class PromptTemplate:
+
+    def __init__(self, name: str, system: str, instructions: str, budget: int):
+        self.name = name
+        self.budget = budget
+        self.prefix = textwrap.dedent(system).strip() + "\n\n" + textwrap.dedent(instructions).strip()
+
+    @cached_property
+    def prefix_tokens(self) -> int:
+        return count_tokens(self.prefix)
+
+    def messages(self, **data) -> list:
+        payload, truncations = fit_budget(data, self.budget, self.prefix_tokens)
+        user = _compact(payload)
+        sent = self.prefix_tokens + count_tokens(user)
+        # Referencia aproximada (no el prompt antiguo): mismas instrucciones con los datos como repr de Python
+        baseline = self.prefix_tokens + count_tokens(" ".join(f"{k}: {v!r}" for k, v in data.items()))
+        metrics.record_prompt(self.name, sent=sent, baseline=baseline, static_prefix=self.prefix_tokens,
+                              truncations=truncations)
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "user", "content": user},
+        ]
+
+
+_EXAMINER = "You are a senior IELTS Certified Examiner. You only output valid JSON."
+_MCQ_SHAPE = "{'questions': [{'question': '...', 'options': ['...', '...', '...', '...'], 'correctAnswer': '...'}]}"
+
+GENERATION = {
+    "reading": PromptTemplate("generate_reading", _EXAMINER, f"""
+        Generate an IELTS academic reading passage and 5 questions for the CEFR level given in the user message.
+        JSON: {{'title': '...', 'passage': '...', 'questions': [{{'question': '...', 'options': [], 'correctAnswer': '...'}}]}}
+        """, budget=400),
+    "listening": PromptTemplate("generate_listening", _EXAMINER, """
+        Generate a transcript of an IELTS listening section and 5 questions for the CEFR level given in the user message.
+        JSON: {'passage': '...', 'questions': [{'question': '...', 'options': [], 'correctAnswer': '...'}]}
+        """, budget=400),
+    "writing": PromptTemplate("generate_writing", _EXAMINER, """
+        Generate an IELTS Task 2 prompt for the CEFR level given in the user message.
+        JSON: {'title': 'Writing Task 2', 'prompt': '...'}
+        """, budget=400),
+    "speaking": PromptTemplate("generate_speaking", _EXAMINER, """
+        Generate 5 short pronunciation sentences for the CEFR level given in the user message.
+        JSON: {'prompts': ['...', '...', '...', '...', '...']}
+        """, budget=400),
+    "grammar": PromptTemplate("generate_grammar", _EXAMINER, f"""
+        Generate 5 grammar MCQs for the CEFR level given in the user message.
+        Each question MUST include a '___' (three underscores) where the answer goes.
+        IMPORTANT: In the 'options' array, provide ONLY the words, NO letters like 'A)' or 'B)'.
+        Return EXACT JSON: {_MCQ_SHAPE}
+        """, budget=400),
+}
+GENERATION_FALLBACK = PromptTemplate("generate_general", _EXAMINER, """
+    Generate general English exercises for the CEFR level given in the user message.
+    """, budget=400)
+
+GRADE_WRITING = PromptTemplate("grade_writing", "You are a professional IELTS Writing Examiner.", """
+    Grade the student's response to the task for the CEFR level given in the user message.
+    The user message is JSON: {"level", "task_prompt", "content"}.
+    Return ONLY JSON:
+    {"score": int, "feedback": "Professional feedback including band score and tips"}
+    """, budget=3000)
+
+REPORT = PromptTemplate("generate_report", "You are a professional IELTS Career Coach and Psychometrician.", """
+    Analyze the student's scores. The user message is JSON: {"level", "scores", "weakest_skill"}.
+    Return EXACTLY this JSON:
+    {
+        "ai_advice": "A powerful, personalized one-sentence strategic advice focusing on their profile.",
+        "steps": [
+            "Actionable step to improve the weakest skill specifically",
+            "A habit-based step to maintain their strongest skills",
+            "A technical tip for the exam at their level"
+        ]
+    }
+    """, budget=500)
+
+PRONUNCIATION_TIP = PromptTemplate("pronunciation_tip", "Expert IELTS Speaking Examiner.", """
+    Compare what the student said with the target sentence.
+    The user message is JSON: {"target", "transcript", "errors"} where errors is the word-level diff.
+    Return JSON: {"pronunciation_tips": "one or two short, concrete tips"}
+    """, budget=600)
+
+_SKILL_GRADING = """
+    Grade this test. The user message is JSON: {"level", "type", "items"}; each item has
+    the question (with its correct answer) and the student's answer.
+    Compare them and calculate a score from 0 to 100.
+    Return JSON: {"score": int, "feedback": "Detailed feedback"}
+    """
+_SKILL_FEEDBACK = """
+    The user message is JSON: {"level", "correct", "total", "missed"} with the questions the student got wrong.
+    Explain briefly why each answer is wrong. Return JSON: {"feedback": "..."}
+    """
+
+
+@lru_cache(maxsize=None)
+def _skill_template(kind: str, module_type: str) -> PromptTemplate:
+    # Prefijo = system_prompt del módulo (MODULES_CONFIG) + instrucciones fijas
+    system = MODULES_CONFIG[module_type]["system_prompt"] if module_type in MODULES_CONFIG else "IELTS Examiner."
+    if kind == "grade":
+        return PromptTemplate("grade_skill", system, _SKILL_GRADING, budget=4000)
+    return PromptTemplate("skill_feedback", system, _SKILL_FEEDBACK, budget=2000)
+
+
+def generation_messages(module_type: str, level: str) -> list:
+    return GENERATION.get(module_type, GENERATION_FALLBACK).messages(level=level)
+
+
+def _module_key(module_type: str) -> str:
+    # El tipo viene del cliente: los desconocidos comparten una sola entrada de la caché
+    module_type = module_type.lower()
+    return module_type if module_type in MODULES_CONFIG else "other"
+
+
+def skill_grading_messages(req) -> list:
+    items = [{"question": q, "answer": a} for q, a in itertools.zip_longest(req.questions, req.answers)]
+    return _skill_template("grade", _module_key(req.type)).messages(level=req.level, type=req.type, items=items)
+
+
+def skill_feedback_messages(req, result: dict, missed: list) -> list:
+    return _skill_template("feedback", _module_key(req.type)).messages(
+        level=req.level, correct=result["correct"], total=result["total"], missed=missed)
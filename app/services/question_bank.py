@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+
+# ----------------------------------------------------
+# BANCO DE PREGUNTAS PRE-GENERADAS
+# Las preguntas se sirven desde un pool por (type, level). Cuando el pool baja
+# del watermark, workers en segundo plano lo rellenan con GPT-4o.
+# Cada alumno nunca recibe dos veces el mismo item.
+# ----------------------------------------------------
+
+POOLED_TYPES = ("reading", "listening", "writing", "speaking", "grammar")
+LEVELS = ("A1", "A2", "B1", "B2", "C1", "C2")
+
+LOW_WATERMARK = int(os.getenv("QUESTION_BANK_LOW_WATERMARK", "5"))
+HIGH_WATERMARK = int(os.getenv("QUESTION_BANK_HIGH_WATERMARK", "15"))
+# Un item se retira del pool tras servirse a este número de alumnos
+MAX_SERVES = int(os.getenv("QUESTION_BANK_MAX_SERVES", "25"))
+REFILL_CONCURRENCY = int(os.getenv("QUESTION_BANK_REFILL_CONCURRENCY", "4"))
+
+
+def is_pooled(type_: str, level: str) -> bool:
+    # Solo pares conocidos: un nivel inventado no puede abrir pools ni rellenos nuevos
+    return type_ in POOLED_TYPES and level in LEVELS
+
+
+class QuestionStore:
+    """Interfaz del almacén del pool. Los métodos son síncronos y rápidos."""
+
+    def add(self, type_: str, level: str, item: dict) -> str:
+        raise NotImplementedError
+
+    def take(self, type_: str, level: str, user_id: str | None):
+        """Devuelve (item_id, item) no visto por el alumno y lo marca como servido, o None."""
+        raise NotImplementedError
+
+    def mark_served(self, item_id: str, user_id: str | None):
+        raise NotImplementedError
+
+    def available(self, type_: str, level: str) -> int:
+        raise NotImplementedError
+
+
+class MemoryQuestionStore(QuestionStore):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}    # (type, level) -> OrderedDict(item_id -> item)
+        self._serves = {}   # item_id -> veces servido
+        self._seen = {}     # user_id -> set(item_id)
+        self._keys = {}     # item_id -> (type, level)
+
+    def add(self, type_, level, item):
+        item_id = uuid.uuid4().hex
+        with self._lock:
+            self._pools.setdefault((type_, level), OrderedDict())[item_id] = item
+            self._serves[item_id] = 0
+            self._keys[item_id] = (type_, level)
+        return item_id
+
+    def take(self, type_, level, user_id):
+        with self._lock:
+            pool = self._pools.get((type_, level))
+            if not pool:
+                return None
+            seen = self._seen.get(user_id, ()) if user_id else ()
+            for item_id, item in pool.items():
+                if item_id not in seen:
+                    self._mark(item_id, user_id)
+                    return item_id, item
+        return None
+
+    def mark_served(self, item_id, user_id):
+        with self._lock:
+            self._mark(item_id, user_id)
+
+    def _mark(self, item_id, user_id):
+        if user_id:
+            self._seen.setdefault(user_id, set()).add(item_id)
+        self._serves[item_id] = self._serves.get(item_id, 0) + 1
+        if self._serves[item_id] >= MAX_SERVES:
+            pool = self._pools.get(self._keys.get(item_id))
+            if pool is not None:
+                pool.pop(item_id, None)
+        else:
+            # Rotamos el item al final para repartir el pool entre alumnos
+            pool = self._pools.get(self._keys.get(item_id))
+            if pool is not None and item_id in pool:
+                pool.move_to_end(item_id)
+
+    def available(self, type_, level):
+        with self._lock:
+            return len(self._pools.get((type_, level), ()))
+
+
+class SQLiteQuestionStore(QuestionStore):
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS qb_items (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                level TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                serves INTEGER NOT NULL DEFAULT 0,
+                active INTEGER NOT NULL DEFAULT 1,
+                last_served REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS qb_items_pool ON qb_items (type, level, active, last_served);
+            CREATE TABLE IF NOT EXISTS qb_served (
+                user_id TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                PRIMARY KEY (user_id, item_id)
+            );
+        """)
+
+    def add(self, type_, level, item):
+        item_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO qb_items (id, type, level, payload) VALUES (?, ?, ?, ?)",
+                (item_id, type_, level, json.dumps(item, ensure_ascii=False)),
+            )
+        return item_id
+
+    def take(self, type_, level, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT id, payload FROM qb_items
+                WHERE type = ? AND level = ? AND active = 1
+                  AND id NOT IN (SELECT item_id FROM qb_served WHERE user_id = ?)
+                ORDER BY last_served LIMIT 1
+                """,
+                (type_, level, user_id or ""),
+            ).fetchone()
+            if row is None:
+                return None
+            self._mark(row[0], user_id)
+        return row[0], json.loads(row[1])
+
+    def mark_served(self, item_id, user_id):
+        with self._lock:
+            self._mark(item_id, user_id)
+
+    def _mark(self, item_id, user_id):
+        self._conn.execute("BEGIN")
+        try:
+            if user_id:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO qb_served (user_id, item_id) VALUES (?, ?)", (user_id, item_id)
+                )
+            self._conn.execute(
+                "UPDATE qb_items SET serves = serves + 1, last_served = ?, active = (serves + 1 < ?) WHERE id = ?",
+                (time.time(), MAX_SERVES, item_id),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def available(self, type_, level):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM qb_items WHERE type = ? AND level = ? AND active = 1", (type_, level)
+            ).fetchone()[0]
+
+
+class QuestionBank:
+
+    def __init__(self, store: QuestionStore, generator):
+        # generator: corrutina (type, level) -> dict con el contenido del módulo
+        self.store = store
+        self.generator = generator
+        self._refilling = set()
+        self._tasks = set()
+        self._refill_semaphore = None
+
+    async def get(self, type_: str, level: str, user_id: str | None = None) -> dict:
+        item = self.take(type_, level, user_id)
+        if item is not None:
+            return item
+        # Pool vacío (o el alumno ya lo vio todo): generamos en línea y lo guardamos
+        item = await self.generator(type_, level)
+        return self.remember(type_, level, item, user_id)
+
+    def take(self, type_: str, level: str, user_id: str | None = None) -> dict | None:
+        if not is_pooled(type_, level):
+            return None
+        taken = self.store.take(type_, level, user_id)
+        self.schedule_refill(type_, level)
+        if taken is None:
+            return None
+        item_id, item = taken
+        return {**item, "item_id": item_id}
+
+    def remember(self, type_: str, level: str, item: dict, user_id: str | None = None) -> dict:
+        # Guarda un item generado fuera del pool y lo marca como visto por el alumno
+        if not is_pooled(type_, level):
+            return item
+        item_id = self.store.add(type_, level, item)
+        self.store.mark_served(item_id, user_id)
+        return {**item, "item_id": item_id}
+
+    def schedule_refill(self, type_: str, level: str):
+        key = (type_, level)
+        if not is_pooled(type_, level) or key in self._refilling or self.store.available(type_, level) >= LOW_WATERMARK:
+            return
+        self._refilling.add(key)
+        task = asyncio.create_task(self._refill(type_, level))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self, type_: str, level: str):
+        if self._refill_semaphore is None:
+            self._refill_semaphore = asyncio.Semaphore(REFILL_CONCURRENCY)
+
+        async def one():
+            async with self._refill_semaphore:
+                item = await self.generator(type_, level)
+            self.store.add(type_, level, item)
+
+        try:
+            missing = HIGH_WATERMARK - self.store.available(type_, level)
+            results = await asyncio.gather(*(one() for _ in range(max(missing, 0))), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                print(f"❌ Error rellenando el banco {type_}/{level}: {errors[0]}")
+        finally:
+            self._refilling.discard((type_, level))
+
+    def prewarm(self, types=POOLED_TYPES, levels=LEVELS):
+        for type_ in types:
+            for level in levels:
+                self.schedule_refill(type_, level)
+
+
+def create_store() -> QuestionStore:
+    backend = os.getenv("QUESTION_BANK_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteQuestionStore(os.getenv("QUESTION_BANK_PATH", "question_bank.db"))
+    return MemoryQuestionStore()
@@ -0,0 +1,224 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+from app.services import metrics
+
+# ----------------------------------------------------
+# RESILIENCIA DE LAS LLAMADAS A OPENAI
+# - Hedging: si la respuesta tarda más que el p95 reciente del modelo, se lanza
+#   una copia y gana la primera (con un tope de copias para no duplicar coste).
+# - Reintentos con backoff exponencial y jitter completo ante errores transitorios.
+# - Circuit breaker por modelo: tras varios fallos seguidos deja de llamarlo
+#   durante un tiempo y se pasa al siguiente nivel de modelo configurado.
+# ----------------------------------------------------
+
+RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "true").lower() == "true"
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "15"))
+HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))  # Máx. 10% de llamadas duplicadas
+HEDGE_WINDOW = float(os.getenv("LLM_HEDGE_WINDOW", "60"))  # ...medido sobre los últimos N segundos
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429}
+RETRYABLE_ERRORS = ("APITimeoutError", "APIConnectionError", "TimeoutError", "ConnectError", "ReadTimeout")
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    # Se clasifica por status/nombre para no importar openai aquí
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return isinstance(error, asyncio.TimeoutError) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def backoff(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class LatencyTracker:
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            if len(self._samples) < 20:
+                return HEDGE_DEFAULT_DELAY
+            ordered = sorted(self._samples)
+        return max(ordered[int(0.95 * (len(ordered) - 1))], HEDGE_MIN_DELAY)
+
+
+class HedgeBudget:
+    """Proporción de llamadas duplicadas en una ventana deslizante: tras una racha sana no
+    se acumula crédito para lanzar una ráfaga de copias justo cuando el proveedor va lento."""
+
+    def __init__(self, ratio: float = HEDGE_MAX_RATIO, window: float = HEDGE_WINDOW):
+        self.ratio = ratio
+        self.window = window
+        self._calls = deque()   # instantes de llamadas
+        self._hedges = deque()  # instantes de copias
+
+    def _prune(self, now: float):
+        for events in (self._calls, self._hedges):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_call(self):
+        now = time.monotonic()
+        self._prune(now)
+        self._calls.append(now)
+
+    def try_hedge(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        if len(self._hedges) + 1 > self.ratio * len(self._calls):
+            return False
+        self._hedges.append(now)
+        return True
+
+
+class CircuitBreaker:
+    """closed → open tras BREAKER_FAILURES fallos seguidos → half_open (una prueba) tras BREAKER_RESET s.
+    Una prueba que se cancela o no termina en BREAKER_RESET s deja paso a otra."""
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and (not self._probing or time.monotonic() - self._probe_started >= self.reset_after):
+                self._probing = True
+                self._probe_started = time.monotonic()
+                return True
+            return False
+
+    def abandon(self):
+        """La llamada terminó sin resultado (cancelada): si era la prueba, se libera."""
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            if self.state != "closed":
+                print(f"✅ Circuito de {self.name} cerrado de nuevo")
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    print(f"❌ Circuito de {self.name} abierto durante {self.reset_after:.0f}s")
+                    metrics.llm_resilience_events.inc(model=self.name, event="circuit_open")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+_breakers = {}
+_latency = {}
+_hedge_budget = HedgeBudget()
+
+
+def breaker(model: str) -> CircuitBreaker:
+    if model not in _breakers:
+        _breakers[model] = CircuitBreaker(model)
+    return _breakers[model]
+
+
+def latency(model: str) -> LatencyTracker:
+    if model not in _latency:
+        _latency[model] = LatencyTracker()
+    return _latency[model]
+
+
+def circuit_states() -> dict:
+    return {model: b.state for model, b in _breakers.items()}
+
+
+async def _hedged(call, model: str, hedge: bool):
+    """Ejecuta call(); si no ha terminado tras el p95 del modelo, lanza una copia y usa la primera respuesta válida."""
+    _hedge_budget.record_call()
+    started = time.perf_counter()
+    first = asyncio.ensure_future(call())
+    tasks = {first}
+    try:
+        if hedge and HEDGE_ENABLED:
+            done, _ = await asyncio.wait(tasks, timeout=latency(model).hedge_delay())
+            if not done and _hedge_budget.try_hedge():
+                metrics.llm_resilience_events.inc(model=model, event="hedge")
+                tasks.add(asyncio.ensure_future(call()))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    latency(model).observe(time.perf_counter() - started)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call(attempt, models: list, hedge: bool = True):
+    """attempt(model) -> coroutine. Recorre los niveles de modelo con reintentos, hedging y breaker."""
+    last_error = None
+    for index, model in enumerate(models):
+        circuit = breaker(model)
+        for retry in range(RETRIES + 1):
+            if not circuit.allow():
+                last_error = last_error or CircuitOpen(f"Circuito abierto para {model}")
+                break
+            try:
+                result = await _hedged(lambda: attempt(model), model, hedge)
+                circuit.record_success()
+                if index > 0:
+                    metrics.llm_resilience_events.inc(model=model, event="fallback")
+                return result
+            except asyncio.CancelledError:
+                circuit.abandon()  # Cliente desconectado o timeout del trabajo: no cuenta como fallo
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    circuit.record_success()  # El proveedor respondió: el error es de la petición
+                    raise
+                circuit.record_failure()
+                last_error = e
+                if retry < RETRIES:
+                    metrics.llm_resilience_events.inc(model=model, event="retry")
+                    await asyncio.sleep(backoff(retry))
+    raise last_error or CircuitOpen("Sin modelos disponibles")
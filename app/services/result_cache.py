@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+from pydantic import BaseModel
+
+# ----------------------------------------------------
+# COALESCING + CACHÉ DE RESULTADOS PARA LAS RUTAS DE CALIFICACIÓN
+# Peticiones idénticas simultáneas (doble envío, reintentos del front)
+# comparten una sola llamada a GPT-4o, y el resultado queda en una caché
+# TTL/LRU indexada por el hash canónico del modelo Pydantic.
+# ----------------------------------------------------
+
+DEFAULT_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+DEFAULT_MAXSIZE = int(os.getenv("RESULT_CACHE_MAXSIZE", "2048"))
+
+_registry = {}
+
+
+def canonical_key(req: BaseModel) -> str:
+    raw = json.dumps(req.model_dump(mode="json"), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{type(req).__name__}:{raw}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_MAXSIZE, ttl: float = DEFAULT_TTL):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expira_en, resultado)
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        _registry[name] = self
+
+    def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get_or_compute(self, req: BaseModel, compute):
+        """compute: función sin argumentos que devuelve la corrutina de la llamada real."""
+        return await self.get_or_compute_key(canonical_key(req), compute)
+
+    async def get_or_compute_key(self, key: str, compute):
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: si un cliente se desconecta no cancela la llamada de los demás
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, compute):
+        result = await compute()
+        self.set(key, result)
+        return result
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,69 @@
+import re
+from functools import lru_cache
+
+from app.core.config import ANSWER_NORMALIZATION
+
+# ----------------------------------------------------
+# CORRECCIÓN LOCAL DE MCQ (READING, LISTENING, GRAMMAR)
+# Las respuestas correctas las generó el propio servidor, así que comparar
+# no necesita a GPT-4o: se normaliza y se compara en local.
+# ----------------------------------------------------
+
+_WORD_MAP = {**ANSWER_NORMALIZATION["spelling_variants"], **ANSWER_NORMALIZATION["numbers"]}
+_OPTION_PREFIX = re.compile(r"^\s*(?:\(?[a-dA-D][\)\.:]\s+)")
+_NON_WORD = re.compile(r"[^\w\s]")
+_LETTERS = "ABCD"
+
+
+@lru_cache(maxsize=8192)
+def normalize_answer(value: str) -> str:
+    text = _OPTION_PREFIX.sub("", value).lower()
+    text = _NON_WORD.sub(" ", text)
+    return " ".join(_WORD_MAP.get(word, word) for word in text.split())
+
+
+def _resolve(value, options: list) -> str:
+    # Acepta texto, índice de la opción o letra ('A'..'D') cuando hay opciones
+    if isinstance(value, dict):
+        value = value.get("answer", value.get("value", ""))
+    if isinstance(value, bool) or value is None:
+        return ""
+    if isinstance(value, int):
+        return str(options[value]) if 0 <= value < len(options) else str(value)
+    value = str(value)
+    stripped = value.strip().rstrip(").:").upper()
+    # Ojo con respuestas que son palabras de una letra ('a' como artículo)
+    if options and len(stripped) == 1 and stripped in _LETTERS[:len(options)] \
+            and value.strip().lower() not in (str(o).strip().lower() for o in options):
+        return str(options[_LETTERS.index(stripped)])
+    return value
+
+
+def is_gradable(questions: list) -> bool:
+    return bool(questions) and all(isinstance(q, dict) and "correctAnswer" in q for q in questions)
+
+
+def score_mcq(questions: list, answers: list) -> dict:
+    options = [q.get("options") or [] for q in questions]
+    expected = [normalize_answer(_resolve(q["correctAnswer"], opts)) for q, opts in zip(questions, options)]
+    padded = list(answers[:len(questions)]) + [None] * (len(questions) - len(answers))
+    given = [normalize_answer(_resolve(a, opts)) for a, opts in zip(padded, options)]
+    results = [bool(g) and g == e for g, e in zip(given, expected)]
+
+    correct = sum(results)
+    total = len(questions)
+    return {
+        "score": round(100 * correct / total) if total else 0,
+        "correct": correct,
+        "total": total,
+        "results": results,
+        "feedback": f"{correct}/{total} respuestas correctas.",
+    }
+
+
+def missed_questions(questions: list, answers: list, results: list) -> list:
+    padded = list(answers[:len(questions)]) + [None] * (len(questions) - len(answers))
+    return [
+        {"question": q.get("question"), "correctAnswer": q.get("correctAnswer"), "userAnswer": a}
+        for q, a, ok in zip(questions, padded, results) if not ok
+    ]
@@ -0,0 +1,151 @@
+import json
+import inspect
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+# ----------------------------------------------------
+# RESPUESTAS EN STREAMING (SSE) PARA GENERACIONES LARGAS
+# Se reenvían los tokens según llegan y se parsea el JSON parcial para emitir
+# cada campo de primer nivel (title, passage...) y cada elemento de los arrays
+# (questions) en cuanto se cierran. Un evento final 'done' lleva el objeto validado.
+# ----------------------------------------------------
+
+
+def wants_stream(request: Request, stream: bool = False) -> bool:
+    return stream or "text/event-stream" in request.headers.get("accept", "")
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events) -> StreamingResponse:
+    # X-Accel-Buffering evita que nginx acumule el stream antes de enviarlo
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def single_event(event: str, data):
+    yield sse_event(event, data)
+
+
+class PartialJSONParser:
+    """Parser incremental de un objeto JSON; feed() devuelve los eventos completados."""
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._string_start = None
+        self._key = None
+        self._value_start = None
+        self._item_start = None
+        self._item_index = 0
+
+    def _in_array_field(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1] == "["
+
+    def _start_value(self, i: int):
+        depth = len(self._stack)
+        if depth == 1 and not self._expect_key and self._value_start is None:
+            self._value_start = i
+        elif self._in_array_field() and self._item_start is None:
+            self._item_start = i
+
+    def _close_item(self, i: int, events: list):
+        if self._item_start is not None:
+            value = json.loads(self.buffer[self._item_start:i])
+            events.append(("item", {"key": self._key, "index": self._item_index, "value": value}))
+            self._item_index += 1
+            self._item_start = None
+
+    def _close_field(self, i: int, events: list):
+        if self._value_start is not None:
+            value = json.loads(self.buffer[self._value_start:i])
+            events.append(("field", {"key": self._key, "value": value}))
+            self._value_start = None
+            self._item_index = 0
+
+    def feed(self, text: str) -> list:
+        events = []
+        self.buffer += text
+        for i in range(self._pos, len(self.buffer)):
+            ch = self.buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._expect_key:
+                        self._key = json.loads(self.buffer[self._string_start:i + 1])
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._start_value(i)
+            elif ch in "{[":
+                if self._stack:
+                    self._start_value(i)
+                self._stack.append(ch)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif ch in "}]":
+                if self._in_array_field():
+                    self._close_item(i, events)
+                self._stack.pop()
+                if not self._stack:
+                    self._close_field(i, events)
+            elif ch == ",":
+                if len(self._stack) == 1:
+                    self._close_field(i, events)
+                    self._expect_key = True
+                elif self._in_array_field():
+                    self._close_item(i, events)
+            elif ch == ":":
+                if len(self._stack) == 1:
+                    self._expect_key = False
+            elif not ch.isspace() and self._stack:
+                # Números, true/false/null
+                self._start_value(i)
+        self._pos = len(self.buffer)
+        return events
+
+
+async def stream_json_events(deltas, required: tuple = (), on_complete=None, tokens: bool = True, redact=None):
+    """Convierte los deltas del modelo en eventos SSE: token, field, item y done/error.
+
+    tokens=False no reenvía el texto crudo y redact(event, data) filtra los field/item,
+    para contenido que no debe llegar entero al cliente (p. ej. la clave de respuestas).
+    """
+    parser = PartialJSONParser()
+    try:
+        async for delta in deltas:
+            if tokens:
+                yield sse_event("token", delta)
+            for event, data in parser.feed(delta):
+                yield sse_event(event, redact(event, data) if redact else data)
+
+        result = json.loads(parser.buffer)
+        if not isinstance(result, dict):
+            raise ValueError("La respuesta del modelo no es un objeto JSON")
+        missing = [k for k in required if k not in result]
+        if missing:
+            raise ValueError(f"Respuesta incompleta del modelo, faltan: {missing}")
+        if on_complete is not None:
+            completed = on_complete(result)
+            if inspect.isawaitable(completed):
+                completed = await completed
+            result = completed or result
+        yield sse_event("done", result)
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# ----------------------------------------------------
+# CACHÉ DE AUDIO TTS DIRECCIONADA POR CONTENIDO
+# Clave = sha256(text, voice, model, speed). Los aciertos se sirven desde
+# disco (sendfile + Range); los fallos se transmiten al cliente por chunks
+# mientras se escriben en la caché. Expulsión LRU acotada por tamaño.
+# El directorio se comparte entre workers: el disco es la fuente de verdad
+# (un archivo escrito por otro worker es un acierto) y el índice en memoria se
+# resincroniza con él para que el límite de tamaño sea del directorio entero.
+# ----------------------------------------------------
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "certificaai_tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Un .part más antiguo que esto es de una escritura interrumpida (no de un worker vivo)
+STALE_PART_SECONDS = float(os.getenv("TTS_CACHE_STALE_PART_SECONDS", "3600"))
+# Cada cuánto, como mucho, se vuelve a leer el directorio al publicar
+RESCAN_SECONDS = float(os.getenv("TTS_CACHE_RESCAN_SECONDS", "30"))
+
+
+def cache_key(text: str, voice: str, model: str, speed: float) -> str:
+    raw = json.dumps([text, voice, model, round(float(speed), 3)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> tamaño, en orden de uso (LRU al principio)
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self._scanned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _load_index(self):
+        # Con self._lock tomado: reconstruye el índice desde el disco en orden de mtime (LRU)
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith(".mp3"):
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+                elif name.endswith(".part") and now - stat.st_mtime > STALE_PART_SECONDS:
+                    # Restos de una escritura interrumpida; los recientes son de otros workers
+                    os.remove(path)
+            except FileNotFoundError:
+                continue  # Publicado o expulsado por otro worker mientras se listaba
+        self._index.clear()
+        self._size = 0
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+        self._scanned_at = time.monotonic()
+
+    def lookup(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            os.utime(path)  # El mtime persiste el orden LRU entre reinicios y entre workers
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._index.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            # Puede haberlo escrito otro worker: se incorpora al índice como recién usado
+            self._size += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self.hits += 1
+        return path
+
+    async def fill(self, key: str, chunks):
+        """Reenvía los chunks del proveedor y los guarda; solo publica el archivo si llega completo."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        complete = False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                self._publish(key, tmp_path)
+            else:
+                os.remove(tmp_path)
+
+    def _publish(self, key: str, tmp_path: str):
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            if time.monotonic() - self._scanned_at > RESCAN_SECONDS:
+                # Incluye lo que han escrito los demás workers: el límite es del directorio
+                self._load_index()
+            else:
+                try:
+                    size = os.path.getsize(self._path(key))
+                except FileNotFoundError:
+                    return  # Ya lo expulsó otro worker
+                self._size += size - self._index.pop(key, 0)
+                self._index[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._index), "bytes": self._size, "hits": self.hits, "misses": self.misses}
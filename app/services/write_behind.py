@@ -0,0 +1,307 @@
+import os
+import json
+import uuid
+import zlib
+import fcntl
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# ----------------------------------------------------
+# ESCRITURA DIFERIDA (WRITE-BEHIND) A FIRESTORE
+# Cada documento se añade primero a un journal local append-only (fsync) y la
+# ruta responde; un worker agrupa lo pendiente en WriteBatch y lo confirma por
+# tamaño o por tiempo. Tras cada commit se avanza un checkpoint; al arrancar se
+# reproduce lo que quedó sin confirmar, incluidos journals de procesos muertos.
+# Los `content` grandes se guardan comprimidos y deduplicados por hash.
+# Los documentos se validan antes de anotarse; si Firestore rechaza un lote se
+# parte en mitades hasta aislar el registro culpable, que va a un dead-letter.
+# ----------------------------------------------------
+
+JOURNAL_DIR = os.getenv("WRITE_BEHIND_DIR", "write_behind")
+# WriteBatch admite 500 escrituras y cada resultado puede sumar la de su contenido
+FLUSH_BATCH = min(int(os.getenv("WRITE_BEHIND_BATCH", "250")), 250)
+FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1.0"))
+INLINE_CONTENT_BYTES = int(os.getenv("WRITE_BEHIND_INLINE_BYTES", "4096"))
+CONTENT_COLLECTION = "exam_contents"
+
+
+class InvalidDocument(ValueError):
+    pass
+
+
+def _check_value(value, path: str, in_array: bool = False):
+    # Reglas de Firestore: claves de mapa no vacías ni reservadas, sin arrays dentro de arrays
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, str) or not key:
+                raise InvalidDocument(f"Clave vacía o no textual en '{path or '/'}'")
+            if key.startswith("__") and key.endswith("__"):
+                raise InvalidDocument(f"Clave reservada '{key}' en '{path or '/'}'")
+            _check_value(item, f"{path}.{key}" if path else key)
+    elif isinstance(value, (list, tuple)):
+        if in_array:
+            raise InvalidDocument(f"Arrays anidados no admitidos en '{path}'")
+        for i, item in enumerate(value):
+            _check_value(item, f"{path}[{i}]", in_array=True)
+
+
+def validate_document(data: dict):
+    """Lanza InvalidDocument si Firestore rechazaría el documento tal como se escribirá."""
+    content = data.get("content")
+    if content is not None and len(_content_bytes(content)) > INLINE_CONTENT_BYTES:
+        data = {k: v for k, v in data.items() if k != "content"}  # Se guarda comprimido como bytes
+    _check_value(data, "")
+
+
+def _content_bytes(content) -> bytes:
+    return json.dumps(content, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def _permanent(error: Exception) -> bool:
+    # Errores del propio documento (no de red/cuota): reintentar el mismo lote no sirve
+    return isinstance(error, (ValueError, TypeError)) or getattr(error, "code", None) == 400
+
+
+class WriteBehindBuffer:
+
+    def __init__(self, get_db, collection: str, name: str = "exam_results", directory: str = JOURNAL_DIR,
+                 batch_size: int = FLUSH_BATCH, interval: float = FLUSH_INTERVAL, after_commit=None):
+        # after_commit(db, datos): trabajo derivado tras confirmar un lote; si falla no bloquea los resultados.
+        # Puede repetirse para los mismos datos si el lote se vuelve a confirmar: no debe asumir exactamente una vez
+        self._get_db = get_db
+        self.after_commit = after_commit
+        self.collection = collection
+        self.name = name
+        self.directory = directory
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._journal = None
+        self._path = None
+        self._pending = []       # [(offset_fin, registro)]
+        self._checkpoint = 0
+        self._known_contents = OrderedDict()  # hashes ya escritos (evita reescribirlos)
+        self._flushed = 0
+        self._errors = 0
+        self._dead = 0
+
+    # ---------------- API pública ----------------
+
+    def submit(self, data: dict) -> str:
+        """Anota el documento en el journal y devuelve su id; Firestore se escribe después."""
+        validate_document(data)
+        doc_id = uuid.uuid4().hex[:20]
+        line = (json.dumps({"id": doc_id, "data": data}, default=str, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            if self._journal is None:
+                self._open_journal()
+            os.write(self._journal, line)
+            os.fsync(self._journal)
+            end = os.lseek(self._journal, 0, os.SEEK_CUR)
+            self._pending.append((end, {"id": doc_id, "data": data}))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return doc_id
+
+    def start(self):
+        with self._lock:
+            if self._journal is None:
+                self._open_journal()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        while self.flush():
+            pass
+        with self._lock:
+            if self._journal is not None and not self._pending:
+                # Parada limpia: no queda nada que reproducir
+                os.close(self._journal)
+                for leftover in (self._path, self._path + ".ckpt"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                self._journal = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "flushed": self._flushed, "errors": self._errors,
+                    "dead_lettered": self._dead}
+
+    # ---------------- Journal ----------------
+
+    def _open_journal(self):
+        # Un journal por proceso, bloqueado con flock mientras el proceso vive
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{self.name}-{os.getpid()}-{uuid.uuid4().hex[:8]}.log")
+        self._journal = os.open(self._path, os.O_CREAT | os.O_RDWR | os.O_APPEND, 0o600)
+        fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._checkpoint = 0
+        self._adopt_orphans()
+
+    def _adopt_orphans(self):
+        # Journals de procesos caídos: se copian sus registros sin confirmar al nuestro
+        for entry in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, entry)
+            if not entry.startswith(f"{self.name}-") or not entry.endswith(".log") or path == self._path:
+                continue
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue  # Sigue vivo
+            try:
+                records = self._read_unflushed(path)
+                for record in records:
+                    line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode()
+                    os.write(self._journal, line)
+                    self._pending.append((os.lseek(self._journal, 0, os.SEEK_CUR), record))
+                os.fsync(self._journal)
+                for leftover in (path, path + ".ckpt"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                if records:
+                    print(f"📨 {len(records)} resultados recuperados del journal {entry}")
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _read_unflushed(path: str) -> list:
+        offset = 0
+        if os.path.exists(path + ".ckpt"):
+            with open(path + ".ckpt") as f:
+                offset = int(f.read() or 0)
+        records = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Escritura cortada por la caída: nunca se confirmó al cliente
+                records.append(json.loads(line))
+        return records
+
+    def _advance_checkpoint(self, offset: int):
+        with self._lock:
+            if not self._pending and offset == os.lseek(self._journal, 0, os.SEEK_END):
+                # Todo confirmado: se compacta el journal en lugar de dejarlo crecer
+                os.ftruncate(self._journal, 0)
+                offset = 0
+            self._checkpoint = offset
+            tmp = self._path + ".ckpt.tmp"
+            with open(tmp, "w") as f:
+                f.write(str(offset))
+            os.replace(tmp, self._path + ".ckpt")
+
+    # ---------------- Worker ----------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.interval)
+            self._wake.clear()
+            while self.flush() >= self.batch_size:
+                pass  # Había cola acumulada: se vacía sin esperar al siguiente intervalo
+
+    def flush(self) -> int:
+        """Confirma un lote de pendientes; devuelve cuántos documentos se escribieron."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending[:self.batch_size]
+            if not batch:
+                return 0
+            try:
+                dead = self._commit_isolating([record for _, record in batch])
+            except Exception as e:
+                self._errors += 1
+                print(f"❌ Error confirmando {len(batch)} resultados en Firestore (se reintentará): {e}")
+                return 0
+            if dead:
+                self._dead_letter(dead)
+            with self._lock:
+                del self._pending[:len(batch)]
+                self._flushed += len(batch) - len(dead)
+                self._dead += len(dead)
+            self._advance_checkpoint(batch[-1][0])
+            return len(batch)
+
+    def _commit_isolating(self, records: list) -> list:
+        """Confirma records; ante un rechazo permanente bisecta y devuelve [(registro, error)] descartados.
+        Los errores transitorios se propagan para reintentar el lote (los ids fijos lo hacen idempotente)."""
+        try:
+            self._commit(records)
+            return []
+        except Exception as e:
+            if not _permanent(e):
+                raise
+            if len(records) == 1:
+                print(f"❌ Firestore rechaza el resultado {records[0]['id']}; pasa al dead-letter: {e}")
+                return [(records[0], e)]
+        middle = len(records) // 2
+        return self._commit_isolating(records[:middle]) + self._commit_isolating(records[middle:])
+
+    def _dead_letter(self, dead: list):
+        path = os.path.join(self.directory, f"{self.name}.deadletter.jsonl")
+        with open(path, "a") as f:
+            for record, error in dead:
+                f.write(json.dumps({**record, "error": str(error), "at": datetime.now().isoformat()},
+                                   default=str, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _commit(self, records: list):
+        db = self._get_db()
+        writes = db.batch()
+        new_hashes = []
+        rows = []
+        for record in records:
+            data = dict(record["data"])
+            if isinstance(data.get("timestamp"), str):
+                data["timestamp"] = datetime.fromisoformat(data["timestamp"])
+            rows.append(data)
+            content = data.pop("content", None)
+            if content is not None:
+                raw = _content_bytes(content)
+                if len(raw) <= INLINE_CONTENT_BYTES:
+                    data["content"] = content
+                else:
+                    digest = hashlib.sha256(raw).hexdigest()
+                    data["content_ref"] = digest
+                    if digest not in self._known_contents and digest not in new_hashes:
+                        writes.set(db.collection(CONTENT_COLLECTION).document(digest),
+                                   {"encoding": "zlib+json", "data": zlib.compress(raw, 6), "size": len(raw)})
+                        new_hashes.append(digest)
+            # Mismo id en cada reintento: reproducir el journal es idempotente
+            writes.set(db.collection(self.collection).document(record["id"]), data)
+        writes.commit()
+        for digest in new_hashes:
+            self._known_contents[digest] = True
+            if len(self._known_contents) > 10000:
+                self._known_contents.popitem(last=False)
+        if self.after_commit is not None:
+            try:
+                self.after_commit(db, rows)
+            except Exception as e:
+                print(f"❌ Error en el post-proceso de {len(rows)} resultados (ya guardados): {e}")
+
+
+def load_content(db, doc: dict):
+    """Devuelve el `content` de un resultado, esté en línea o referenciado por hash."""
+    if "content" in doc:
+        return doc["content"]
+    ref = doc.get("content_ref")
+    if not ref:
+        return None
+    blob = db.collection(CONTENT_COLLECTION).document(ref).get().to_dict()
+    return json.loads(zlib.decompress(blob["data"]))
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import random
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ----------------------------------------------------
+# SERVIDOR FALSO DE OPENAI PARA BENCHMARKS
+# Implementa chat (normal y streaming), transcripciones y TTS con latencia y
+# tamaño de salida configurables, para medir el servidor sin coste ni red.
+# Inyección de fallos (env o POST /faults en caliente): errores 500 aleatorios,
+# respuestas lentas (cola larga) y modelos caídos (503), para probar
+# reintentos, hedging, circuit breaker y fallback de modelo.
+#   uvicorn bench.fake_openai:app --port 9100
+# y arrancar main:app con OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+# ----------------------------------------------------
+
+LATENCY_MS = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "800"))
+JITTER_MS = float(os.getenv("FAKE_OPENAI_JITTER_MS", "200"))
+COMPLETION_TOKENS = int(os.getenv("FAKE_OPENAI_COMPLETION_TOKENS", "300"))
+TOKENS_PER_SECOND = float(os.getenv("FAKE_OPENAI_TOKENS_PER_SECOND", "0"))  # 0 = sin goteo en streaming
+SPEECH_BYTES = int(os.getenv("FAKE_OPENAI_SPEECH_BYTES", str(200 * 1024)))
+
+faults = {
+    "error_rate": float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0")),
+    "slow_rate": float(os.getenv("FAKE_OPENAI_SLOW_RATE", "0")),
+    "slow_ms": float(os.getenv("FAKE_OPENAI_SLOW_MS", "10000")),
+    "down_models": [m for m in os.getenv("FAKE_OPENAI_DOWN_MODELS", "").split(",") if m],
+}
+
+app = FastAPI(title="Fake OpenAI")
+stats = {"chat": 0, "transcriptions": 0, "speech": 0, "errors": 0, "slow": 0, "by_model": {}}
+
+
+async def _latency():
+    delay = max(LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS), 0)
+    if random.random() < faults["slow_rate"]:
+        stats["slow"] += 1
+        delay += faults["slow_ms"]
+    await asyncio.sleep(delay / 1000)
+
+
+def _injected_fault(model: str):
+    stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+    if model in faults["down_models"]:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": f"{model} unavailable", "type": "server_error"}}, status_code=503)
+    if random.random() < faults["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+    return None
+
+
+def _completion_payload() -> dict:
+    # Unión de los campos que espera cada ruta: cualquier prompt recibe un JSON válido
+    filler = " ".join(["lorem"] * max(COMPLETION_TOKENS - 120, 10))
+    question = {"question": "The ___ is near the station.", "options": ["centre", "park", "bank", "shop"],
+                "correctAnswer": "centre"}
+    return {
+        "title": "Urban gardens",
+        "passage": filler,
+        "questions": [question] * 5,
+        "prompt": "Some people think cities should have more parks. Discuss.",
+        "prompts": ["I live in the city centre."] * 5,
+        "score": 72,
+        "feedback": "Good structure; work on cohesion.",
+        "ai_advice": "Focus on your weakest skill daily.",
+        "steps": ["Practice", "Review", "Simulate the exam"],
+        "overall_score": 80,
+        "general_feedback": "Clear pronunciation.",
+        "estimated_band": "7.0",
+        "pronunciation_tips": "Stress the final consonants.",
+    }
+
+
+def _usage(prompt: str) -> dict:
+    prompt_tokens = max(len(prompt) // 4, 1)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": COMPLETION_TOKENS,
+            "total_tokens": prompt_tokens + COMPLETION_TOKENS}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["chat"] += 1
+    model = body.get("model", "gpt-4o")
+    fault = _injected_fault(model)
+    if fault is not None:
+        await _latency()
+        return fault
+    prompt = json.dumps(body.get("messages", []))
+    content = json.dumps(_completion_payload())
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await _latency()
+        return {
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": _usage(prompt),
+        }
+
+    async def events():
+        await _latency()  # Tiempo hasta el primer token
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        delay = 4 / TOKENS_PER_SECOND if TOKENS_PER_SECOND else 0  # ~4 tokens por pieza
+        for piece in pieces:
+            chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if delay:
+                await asyncio.sleep(delay)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [], "usage": _usage(prompt)}
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    form = await request.form()
+    stats["transcriptions"] += 1
+    await _latency()
+    size = getattr(form.get("file"), "size", 0) or 0
+    duration = round(size / 32000, 2)  # ~PCM 16 kHz mono
+    text = "I live in the city centre."
+    return JSONResponse({
+        "task": "transcribe", "language": "english", "duration": duration, "text": text,
+        "segments": [{"id": 0, "start": 0.0, "end": duration, "text": text}],
+    })
+
+
+@app.post("/v1/audio/speech")
+async def speech(request: Request):
+    await request.json()
+    stats["speech"] += 1
+
+    async def audio():
+        await _latency()
+        chunk = b"\xff\xfb" + b"\x00" * 16382
+        sent = 0
+        while sent < SPEECH_BYTES:
+            yield chunk[:SPEECH_BYTES - sent]
+            sent += len(chunk)
+
+    return StreamingResponse(audio(), media_type="audio/mpeg")
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/faults")
+async def set_faults(request: Request):
+    # p. ej. {"down_models": ["gpt-4o"]} para simular la caída del modelo principal
+    faults.update(await request.json())
+    return faults
@@ -0,0 +1,269 @@
+"""Benchmark de carga de main:app contra un OpenAI falso (y, opcionalmente, los emuladores de Firebase).
+
+    python -m bench.run --workers 1 2 4 --concurrency 100 --duration 30
+    python -m bench.run --firestore-emulator 127.0.0.1:8080 --auth-emulator 127.0.0.1:9099   # + rutas de Firestore
+    python -m bench.run --workers 2 --save-baseline      # guarda bench/baselines/baseline.json
+    python -m bench.run --workers 2 --compare            # compara con la baseline guardada
+    python -m bench.run --error-rate 0.2 --slow-rate 0.05 --down-models gpt-4o   # con fallos inyectados
+
+Por cada número de workers arranca uvicorn, lanza alumnos virtuales que
+repiten los escenarios de bench/scenarios.py y reporta throughput,
+percentiles de latencia por ruta, lag del event loop y RSS del servidor.
+Sin emuladores solo se miden las rutas que no tocan Firestore; con ellos se
+añade progress_check (alta de alumno, notas y dashboard).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import platform
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+from bench.scenarios import SCENARIOS, FIRESTORE_SCENARIOS
+
+ALL_SCENARIOS = {**SCENARIOS, **FIRESTORE_SCENARIOS}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "bench", "baselines", "baseline.json")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} no respondió en {timeout}s")
+
+
+def _spawn(args: list, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _stop(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def _rss_bytes(root_pid: int) -> int:
+    # RSS del proceso de uvicorn y sus workers (Linux /proc)
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    total, pending = 0, [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def _loop_lag(metrics_text: str) -> dict:
+    total = count = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith("event_loop_lag_seconds_sum"):
+            total += float(line.split()[-1])
+        elif line.startswith("event_loop_lag_seconds_count"):
+            count += float(line.split()[-1])
+    return {"mean_ms": round(1000 * total / count, 2) if count else 0.0}
+
+
+async def _drive(base_url: str, concurrency: int, duration: float, scenarios: list) -> tuple:
+    samples = {}
+    errors = {}
+
+    def record(name: str, seconds: float, status: int):
+        samples.setdefault(name, []).append(seconds)
+        if status >= 400 or status == 0:
+            errors[name] = errors.get(name, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+        completed = 0
+
+        async def student():
+            nonlocal completed
+            while time.perf_counter() < deadline:
+                try:
+                    await ALL_SCENARIOS[random.choice(scenarios)](client, record)
+                    completed += 1
+                except httpx.HTTPError:
+                    pass  # El paso ya quedó anotado con status 0
+
+        started = time.perf_counter()
+        await asyncio.gather(*(student() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        lag = _loop_lag((await client.get("/metrics")).text)
+    return samples, errors, completed, elapsed, lag
+
+
+def run_once(workers: int, args, fake_url: str) -> dict:
+    port = _free_port()
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "MAIL_QUEUE_PATH": os.path.join(tmp, "mail.db"),
+        "TTS_CACHE_DIR": os.path.join(tmp, "tts"),
+        "WRITE_BEHIND_DIR": os.path.join(tmp, "write_behind"),
+    }
+    if args.firestore_emulator:
+        env["FIRESTORE_EMULATOR_HOST"] = args.firestore_emulator
+        env["FIREBASE_AUTH_EMULATOR_HOST"] = args.auth_emulator
+    server = _spawn([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                     "--workers", str(workers), "--log-level", "warning"], env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(f"{base_url}/metrics")
+        rss_idle = _rss_bytes(server.pid)
+        samples, errors, completed, elapsed, lag = asyncio.run(
+            _drive(base_url, args.concurrency, args.duration, args.scenarios))
+        rss_peak = _rss_bytes(server.pid)
+    finally:
+        _stop(server)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    routes = {}
+    for name, values in sorted(samples.items()):
+        routes[name] = {
+            "requests": len(values),
+            "errors": errors.get(name, 0),
+            "p50_ms": round(1000 * _percentile(values, 50), 1),
+            "p95_ms": round(1000 * _percentile(values, 95), 1),
+            "p99_ms": round(1000 * _percentile(values, 99), 1),
+        }
+    total_requests = sum(len(v) for v in samples.values())
+    return {
+        "workers": workers,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 1),
+        "scenarios_completed": completed,
+        "throughput_rps": round(total_requests / elapsed, 1),
+        "event_loop_lag": lag,
+        "rss_mb": {"idle": round(rss_idle / 2**20, 1), "after_load": round(rss_peak / 2**20, 1),
+                   "per_worker_after_load": round(rss_peak / 2**20 / workers, 1)},
+        "routes": routes,
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    regressions = []
+    by_workers = {r["workers"]: r for r in baseline}
+    for result in results:
+        base = by_workers.get(result["workers"])
+        if base is None:
+            continue
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"workers={result['workers']} throughput {base['throughput_rps']} → {result['throughput_rps']} rps")
+        for route, stats in result["routes"].items():
+            before = base["routes"].get(route)
+            if before and stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"workers={result['workers']} {route} p95 {before['p95_ms']} → {stats['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--concurrency", type=int, default=50, help="Alumnos virtuales simultáneos")
+    parser.add_argument("--duration", type=float, default=20, help="Segundos de carga por configuración")
+    parser.add_argument("--scenarios", nargs="+", choices=list(ALL_SCENARIOS),
+                        help="Por defecto todos; los de Firestore solo con --firestore-emulator")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Latencia simulada de OpenAI")
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0, help="Fracción de respuestas 500 del OpenAI falso")
+    parser.add_argument("--slow-rate", type=float, default=0, help="Fracción de respuestas con cola lenta")
+    parser.add_argument("--slow-ms", type=float, default=10000)
+    parser.add_argument("--down-models", default="", help="Modelos que responden 503 (p. ej. gpt-4o)")
+    parser.add_argument("--firestore-emulator", default=os.environ.get("FIRESTORE_EMULATOR_HOST"),
+                        help="host:puerto del emulador de Firestore; activa los escenarios de Firestore")
+    parser.add_argument("--auth-emulator", default=os.environ.get("FIREBASE_AUTH_EMULATOR_HOST", "127.0.0.1:9099"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Regresión permitida (0.2 = 20%%)")
+    parser.add_argument("--output", help="Ruta del JSON de resultados")
+    args = parser.parse_args()
+    if args.scenarios is None:
+        args.scenarios = list(ALL_SCENARIOS if args.firestore_emulator else SCENARIOS)
+    elif not args.firestore_emulator and set(args.scenarios) & set(FIRESTORE_SCENARIOS):
+        parser.error("los escenarios de Firestore necesitan --firestore-emulator")
+
+    fake_port = _free_port()
+    fake_env = {**os.environ, "FAKE_OPENAI_LATENCY_MS": str(args.latency_ms),
+                "FAKE_OPENAI_COMPLETION_TOKENS": str(args.completion_tokens),
+                "FAKE_OPENAI_ERROR_RATE": str(args.error_rate), "FAKE_OPENAI_SLOW_RATE": str(args.slow_rate),
+                "FAKE_OPENAI_SLOW_MS": str(args.slow_ms), "FAKE_OPENAI_DOWN_MODELS": args.down_models}
+    fake = _spawn([sys.executable, "-m", "uvicorn", "bench.fake_openai:app", "--port", str(fake_port),
+                   "--log-level", "warning"], fake_env)
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    try:
+        _wait_ready(f"{fake_url}/stats")
+        results = [run_once(workers, args, fake_url) for workers in args.workers]
+    finally:
+        _stop(fake)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            meta = {"latency_ms": args.latency_ms, "concurrency": args.concurrency, "duration_s": args.duration,
+                    "scenarios": args.scenarios, "firestore_emulator": bool(args.firestore_emulator),
+                    "cpus": os.cpu_count(), "python": platform.python_version(),
+                    "recorded_at": time.strftime("%Y-%m-%d")}
+            json.dump({**meta, "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"Baseline guardada en {BASELINE_PATH}")
+    if args.compare:
+        with open(BASELINE_PATH) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESIÓN: {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import io
+import time
+import math
+import wave
+import random
+import struct
+import uuid
+
+# ----------------------------------------------------
+# ESCENARIOS DE ALUMNO PARA EL BENCHMARK
+# Cada escenario recorre las rutas en el mismo orden que el front y anota
+# (ruta, segundos, status) de cada paso en el recorder.
+# ----------------------------------------------------
+
+LEVELS = ("A1", "A2", "B1", "B2", "C1", "C2")
+
+
+def _sample_wav(seconds: float = 3.0, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(struct.pack("<h", int(6000 * math.sin(i / 6))) for i in range(int(seconds * rate))))
+    return buf.getvalue()
+
+
+SAMPLE_WAV = _sample_wav()
+
+
+async def _step(client, recorder, name: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    status = 0
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        recorder(name, time.perf_counter() - started, status)
+
+
+async def reading_exam(client, recorder):
+    """generate → answer → grade-skill → generate-report"""
+    user_id = uuid.uuid4().hex
+    level = random.choice(LEVELS)
+    module_type = random.choice(("reading", "listening", "grammar"))
+    r = await _step(client, recorder, "generate-questions", "POST", "/api/v1/generate-questions",
+                    json={"type": module_type, "level": level, "user_id": user_id})
+    module = r.json() if r.status_code == 200 else {}
+    answers = [random.choice(q.get("options") or [""]) for q in module.get("questions", [])]
+    # Solo session_id + respuestas: la clave de respuestas se quedó en el servidor
+    r = await _step(client, recorder, "grade-skill", "POST", "/api/v1/grade-skill",
+                    json={"session_id": module.get("session_id"), "answers": answers})
+    score = r.json().get("score", 0) if r.status_code == 200 else 0
+    await _step(client, recorder, "generate-report", "POST", "/api/v1/generate-report",
+                json={"reading": score, "listening": random.randint(0, 100), "writing": random.randint(0, 100),
+                      "speaking": random.randint(0, 100), "level": level})
+
+
+async def writing_exam(client, recorder):
+    """generate (writing) → grade-writing"""
+    level = random.choice(LEVELS)
+    r = await _step(client, recorder, "generate-questions", "POST", "/api/v1/generate-questions",
+                    json={"type": "writing", "level": level, "user_id": uuid.uuid4().hex})
+    prompt = r.json().get("prompt", "Discuss.") if r.status_code == 200 else "Discuss."
+    essay = " ".join(random.choice(("cities", "parks", "people", "because", "however", "green")) for _ in range(250))
+    await _step(client, recorder, "grade-writing", "POST", "/api/v1/grade-writing",
+                json={"content": essay, "level": level, "prompt": prompt})
+
+
+async def speaking_exam(client, recorder):
+    """speak → transcribe → evaluate-speaking"""
+    target = random.choice(("I live in the city centre.", "The train leaves at seven.", "My favourite colour is grey."))
+    await _step(client, recorder, "speak", "POST", "/api/v1/voice/speak", params={"text": target})
+    # Unos bytes aleatorios al final cambian el hash sin afectar al WAV: evita la caché de transcripciones
+    audio = SAMPLE_WAV + random.randbytes(2)
+    r = await _step(client, recorder, "transcribe", "POST", "/api/v1/voice/transcribe",
+                    files={"audio": ("answer.wav", audio, "audio/wav")})
+    transcript = r.json().get("text", "") if r.status_code == 200 else ""
+    await _step(client, recorder, "evaluate-speaking", "POST", "/api/v1/evaluate-speaking",
+                json={"attempts": [{"target": target, "transcript": transcript}]})
+
+
+async def progress_check(client, recorder):
+    """create-user → progress/scores ×4 → dashboard (necesita los emuladores de Firestore y Auth)"""
+    suffix = uuid.uuid4().hex[:12]
+    r = await _step(client, recorder, "create-user", "POST", "/api/v1/admin/create-user",
+                    json={"email": f"bench-{suffix}@example.com", "password": f"Bench-{suffix}",
+                          "full_name": f"Bench {suffix}", "role": "student"})
+    user_id = r.json().get("uid") if r.status_code == 200 else None
+    if user_id is None:
+        return
+    level = random.choice(LEVELS)
+    for skill in ("reading", "listening", "writing", "speaking"):
+        await _step(client, recorder, "progress-scores", "POST", f"/api/v1/progress/{user_id}/scores",
+                    json={"level": level, "skill": skill, "score": random.randint(0, 100)})
+    await _step(client, recorder, "progress-dashboard", "GET", f"/api/v1/progress/{user_id}/dashboard")
+
+
+SCENARIOS = {
+    "reading_exam": reading_exam,
+    "writing_exam": writing_exam,
+    "speaking_exam": speaking_exam,
+}
+
+# Solo entran en la mezcla cuando se pasan los emuladores de Firebase (--firestore-emulator)
+FIRESTORE_SCENARIOS = {
+    "progress_check": progress_check,
+}
@@ -0,0 +1,114 @@
+"""Mide el arranque en frío: coste de `import main` y tiempo hasta que uvicorn responde.
+
+    python -m bench.startup                                   # informe
+    python -m bench.startup --max-import-s 1.0 --max-ready-s 3.0   # falla si se supera el presupuesto
+
+Además comprueba que importar main no cargue los SDK pesados (firebase_admin,
+openai, google.cloud.firestore, tiktoken): deben crearse en el primer uso o en el prewarm.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from bench.run import ROOT, _free_port, _spawn, _stop, _wait_ready
+
+HEAVY_MODULES = ("firebase_admin", "openai", "google.cloud.firestore", "tiktoken")
+
+_IMPORT_PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+TMP_DIR = tempfile.mkdtemp(prefix="startup_")
+
+
+def _env(tmp_tag: str) -> dict:
+    return {**os.environ, "MAIL_QUEUE_PATH": os.path.join(TMP_DIR, f"{tmp_tag}.db"),
+            "WRITE_BEHIND_DIR": os.path.join(TMP_DIR, "write_behind"),
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench")}
+
+
+def measure_import(runs: int) -> dict:
+    samples, loaded = [], set()
+    for i in range(runs):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=ROOT, env=_env(f"import{i}"),
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return {"median_s": round(statistics.median(samples), 3), "max_s": round(max(samples), 3),
+            "heavy_modules_loaded": sorted(loaded)}
+
+
+def slowest_imports(limit: int = 10) -> list:
+    # -X importtime escribe en stderr: "import time: self | acumulado | módulo"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                         env=_env("importtime"), capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    # Solo los imports directos de main (un nivel de sangría por debajo)
+    indent = {name: len(name) - len(name.lstrip()) for _, name in rows}
+    main_level = min((indent[n] for _, n in rows if n.strip() == "main"), default=1)
+    direct = [(us, name.strip()) for us, name in rows if indent[name] == main_level + 2]
+    return [{"module": name, "ms": round(us / 1000, 1)} for us, name in sorted(direct, reverse=True)[:limit]]
+
+
+def measure_ready(runs: int) -> dict:
+    samples = []
+    for i in range(runs):
+        port = _free_port()
+        started = time.perf_counter()
+        server = _spawn([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                         "--log-level", "warning"], _env(f"ready{i}"))
+        try:
+            _wait_ready(f"http://127.0.0.1:{port}/metrics")
+            samples.append(time.perf_counter() - started)
+        finally:
+            _stop(server)
+    return {"median_s": round(statistics.median(samples), 3), "max_s": round(max(samples), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-s", type=float, help="Presupuesto para la mediana de `import main`")
+    parser.add_argument("--max-ready-s", type=float, help="Presupuesto para la mediana hasta el primer 200")
+    args = parser.parse_args()
+
+    try:
+        report = {
+            "import": measure_import(args.runs),
+            "ready": measure_ready(args.runs),
+            "slowest_imports": slowest_imports(),
+        }
+    finally:
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    failures = []
+    if report["import"]["heavy_modules_loaded"]:
+        failures.append(f"import main carga SDK pesados: {report['import']['heavy_modules_loaded']}")
+    if args.max_import_s and report["import"]["median_s"] > args.max_import_s:
+        failures.append(f"import main {report['import']['median_s']}s > {args.max_import_s}s")
+    if args.max_ready_s and report["ready"]["median_s"] > args.max_ready_s:
+        failures.append(f"arranque {report['ready']['median_s']}s > {args.max_ready_s}s")
+    for line in failures:
+        print(f"REGRESIÓN: {line}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
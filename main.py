@@ -1,27 +1,67 @@
 import os
 
-import json
-import smtplib
-import io
-import firebase_admin
+import time
+import asyncio
+from contextlib import asynccontextmanager
 # -----------------------------------------------------------
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 # -----------------------------------------------------------
-from firebase_admin import auth as admin_auth, credentials
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from openai import OpenAI
-from dotenv import load_dotenv
-from firebase_admin import auth as admin_auth, credentials, firestore
-load_dotenv()
-
-# Inicialización de OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-app = FastAPI(title="CertificaAI Engine - Full Stack Pro")
+from fastapi.responses import StreamingResponse, FileResponse, Response, JSONResponse
+from pydantic import BaseModel, Field
+# Firebase y OpenAI se crean perezosamente (una vez por proceso); también carga el .env
+from app.core import clients
+
+# Todas las llamadas a OpenAI pasan por el gateway asíncrono (pool compartido)
+from app.services import llm_gateway
+from app.services import scoring
+from app.services import bulk_provisioning
+from app.services import audio_upload
+from app.services import alignment
+from app.services import metrics
+from app.services import progress
+from app.services import analytics
+from app.services import prompts
+from app.services.exam_sessions import exam_sessions, SessionNotFound, SESSION_TYPES, public_event
+from app.services.kv_store import require_shared
+from app.services.otp import otp_service
+from app.services.question_bank import QuestionBank, LEVELS, create_store as create_question_store
+from app.services.result_cache import ResultCache, canonical_key, cache_stats
+from app.services.streaming import wants_stream, sse_event, sse_response, single_event, stream_json_events
+from app.services.tts_cache import TTSCache, cache_key as tts_cache_key
+from app.services.mail_queue import mail_queue
+from app.services.jobs import JobQueue, QueueFull, InvalidWebhook, check_webhook_url, create_store as create_job_store, public_view
+from app.routes import auth as auth_routes
+from app.routes import exam as exam_routes
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sesiones y OTP se corrigen/verifican en cualquier worker: sin KV compartido no se arranca
+    require_shared(exam_sessions.store, "Las sesiones de examen")
+    require_shared(otp_service.store, "Los códigos OTP")
+    if audio_upload.FFPROBE is None:
+        print("❌ ffprobe no está instalado: el audio que no sea WAV se transcribirá entero, sin límite de duración ni cortes")
+    mail_queue.start()
+    exam_routes.results_buffer.start()
+    loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+    # Con PREWARM_CLIENTS=init|connect los clientes se crean en segundo plano; el worker ya acepta peticiones
+    prewarm = asyncio.create_task(clients.prewarm())
+    # El tokenizer puede tener que descargar su vocabulario: en un hilo, fuera del import
+    tokenizer = asyncio.create_task(asyncio.to_thread(prompts.prewarm))
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    prewarm.cancel()
+    tokenizer.cancel()
+    loop_monitor.cancel()
+    mail_queue.stop()
+    # Vacía el buffer de resultados antes de salir; lo que falle queda en el journal
+    exam_routes.results_buffer.stop()
+    await llm_gateway.close()
+
+app = FastAPI(title="CertificaAI Engine - Full Stack Pro", lifespan=lifespan)
 
 # Configuración de CORS - Blindado
 app.add_middleware(
@@ -32,19 +72,24 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+# Latencia, tokens y coste por ruta; se exponen en /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+# OTP: códigos en el KV store compartido entre workers (KV_BACKEND)
+app.include_router(auth_routes.router)
+# Entrega de exámenes con escritura diferida a exam_results
+app.include_router(exam_routes.router, prefix="/api/v1/exam", tags=["exam"])
 # Función para enviar credenciales por correo
 def send_credentials_email(user_email, password, name):
     try:
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_pass = os.getenv("SMTP_PASS")
-        
+        sender = os.getenv("MAIL_FROM") or os.getenv("SMTP_USER")
+
         # Validación de seguridad
-        if not smtp_user or not smtp_pass:
-            print("❌ Error: SMTP_USER o SMTP_PASS no configurados en .env")
+        if not sender:
+            print("❌ Error: SMTP_USER (o MAIL_FROM) no configurado en .env")
             return
 
         msg = MIMEMultipart()
-        msg['From'] = f"CertificaAI Support <{smtp_user}>"
+        msg['From'] = f"CertificaAI Support <{sender}>"
         msg['To'] = user_email
         msg['Subject'] = "🚀 Tus credenciales de acceso - CertificaAI"
 
@@ -62,18 +107,12 @@ def send_credentials_email(user_email, password, name):
         """
         msg.attach(MIMEText(html, 'html'))
 
-        # --- BLOQUE DE ENVÍO REFORZADO ---
-        # Usamos el puerto 587 con TLS que es el estándar de Gmail
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.set_debuglevel(1) # Esto te servirá para ver el error en la terminal del VPS si falla
-        server.starttls() 
-        server.login(smtp_user, smtp_pass)
-        server.send_message(msg)
-        server.quit()
-        print(f"✅ Correo enviado exitosamente a: {user_email}")
-        
+        # El envío real lo hace el worker de la cola (conexión SMTP reutilizada + reintentos)
+        mail_queue.enqueue(msg)
+        print(f"📨 Correo encolado para: {user_email}")
+
     except Exception as e:
-        print(f"❌ Error crítico enviando correo: {e}")
+        print(f"❌ Error crítico encolando correo: {e}")
 # ----------------------------------------------------
 # 1. MODELOS DE DATOS (ESTRUCTURA COMPLETA)
 # ----------------------------------------------------
@@ -81,6 +120,7 @@ def send_credentials_email(user_email, password, name):
 class ModuleRequest(BaseModel):
     type: str
     level: str
+    user_id: str | None = None  # Para no repetir items del banco al mismo alumno
 
 class WritingRequest(BaseModel):
     content: str
@@ -88,17 +128,20 @@ class WritingRequest(BaseModel):
     prompt: str
 
 class SkillEvaluationRequest(BaseModel):
-    level: str
     answers: list
-    questions: list
-    type: str
+    # Con session_id basta con las respuestas; questions/type/level salen de la sesión
+    session_id: str | None = None
+    level: str = ""
+    questions: list = []
+    type: str = ""
 
 class SpeakingAttempt(BaseModel):
-    target: str
-    transcript: str
+    # La alineación cuesta palabras_objetivo × palabras_transcritas: se acota el tamaño
+    target: str = Field(max_length=alignment.MAX_TEXT_CHARS)
+    transcript: str = Field(max_length=alignment.MAX_TEXT_CHARS)
 
 class BatchSpeakingEvaluation(BaseModel):
-    attempts: list[SpeakingAttempt]
+    attempts: list[SpeakingAttempt] = Field(max_length=alignment.MAX_ATTEMPTS)
 
 class FinalReportRequest(BaseModel):
     reading: int = 0
@@ -113,40 +156,63 @@ class UserCreateRequest(BaseModel):
     full_name: str
     role: str
 
+class ProgressUpdate(BaseModel):
+    level: str
+    skill: str
+    score: float
+
+class AnalyticsBackfillRequest(BaseModel):
+    page_size: int = analytics.BACKFILL_PAGE_SIZE
+
 
 # ----------------------------------------------------
 # 2. GENERACIÓN DE CONTENIDO (MÓDULOS)
 # ----------------------------------------------------
 
-@app.post("/api/v1/generate-questions")
-async def generate_questions(req: ModuleRequest):
-    grammar_prompt = (
-        f"Act as a senior IELTS Examiner. Generate 5 grammar MCQs for level {req.level}. "
-        "Each question MUST include a '___' (three underscores) where the answer goes. "
-        "Return EXACT JSON: {'questions': [{'question': '...', 'options': ['A', 'B', 'C', 'D'], 'correctAnswer': '...'}]}"
-    )
+def module_messages(module_type: str, level: str) -> list:
+    # Instrucciones fijas por tipo (prefijo estable); el nivel va en el mensaje del usuario
+    return prompts.generation_messages(module_type, level)
 
-    prompts = {
-        "reading": f"Act as an IELTS Examiner. Generate an IELTS academic reading passage and 5 questions for level {req.level}. JSON: {{'title': '...', 'passage': '...', 'questions': [{{'question': '...', 'options': [], 'correctAnswer': '...'}}]}}",
-        "listening": f"Act as an IELTS Examiner. Generate a transcript of an IELTS listening section and 5 questions for level {req.level}. JSON: {{'passage': '...', 'questions': [{{'question': '...', 'options': [], 'correctAnswer': '...'}}]}}",
-        "writing": f"Act as an IELTS Examiner. Generate an IELTS Task 2 prompt for level {req.level}. JSON: {{'title': 'Writing Task 2', 'prompt': '...'}}",
-        "speaking": f"Act as an IELTS Examiner. Generate 5 short pronunciation sentences for level {req.level}. JSON: {{'prompts': ['...', '...', '...', '...', '...']}}",
-        "grammar": f"Act as a senior IELTS Examiner. Generate 5 grammar MCQs for level {req.level}. "
-    "Each question MUST include a '___' (three underscores) where the answer goes. "
-    "IMPORTANT: In the 'options' array, provide ONLY the words, NO letters like 'A)' or 'B)'. "
-    "Return EXACT JSON: {'questions': [{'question': '...', 'options': ['word1', 'word2', 'word3', 'word4'], 'correctAnswer': 'word1'}]}"
-    }
+# Campos que debe traer cada módulo para darlo por válido al cerrar un stream
+MODULE_REQUIRED_KEYS = {
+    "reading": ("title", "passage", "questions"),
+    "listening": ("passage", "questions"),
+    "writing": ("prompt",),
+    "speaking": ("prompts",),
+    "grammar": ("questions",),
+}
+
+async def generate_module(module_type: str, level: str) -> dict:
+    return await llm_gateway.chat_json(messages=module_messages(module_type, level), task=f"generate_{module_type}")
+
+# Pool de contenido pre-generado; se rellena en segundo plano
+question_bank = QuestionBank(create_question_store(), generate_module)
+
+async def open_session(req: ModuleRequest, item: dict) -> dict:
+    # La clave de respuestas se queda en el servidor; el alumno recibe session_id
+    return await exam_sessions.open(req.type, req.level, item, req.user_id)
+
+@app.post("/api/v1/generate-questions")
+async def generate_questions(req: ModuleRequest, request: Request, stream: bool = Query(False)):
+    if req.level not in LEVELS:
+        raise HTTPException(status_code=422, detail=f"Nivel no válido; usa uno de {', '.join(LEVELS)}")
+    metrics.label_request(req.type, req.level)
+    if wants_stream(request, stream):
+        cached = question_bank.take(req.type, req.level, req.user_id)
+        if cached is not None:
+            return sse_response(single_event("done", await open_session(req, cached)))
+        # Con sesión no se reenvían tokens crudos ni correctAnswer en los eventos parciales
+        with_session = req.type in SESSION_TYPES
+        return sse_response(stream_json_events(
+            llm_gateway.chat_json_stream(messages=module_messages(req.type, req.level), task=f"generate_{req.type}"),
+            required=MODULE_REQUIRED_KEYS.get(req.type, ()),
+            on_complete=lambda item: open_session(req, question_bank.remember(req.type, req.level, item, req.user_id)),
+            tokens=not with_session,
+            redact=public_event if with_session else None,
+        ))
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": "You are a senior IELTS Certified Examiner. You only output valid JSON."},
-                {"role": "user", "content": prompts.get(req.type, "Generate general English exercises.")}
-            ]
-        )
-        return json.loads(response.choices[0].message.content)
+        return await open_session(req, await question_bank.get(req.type, req.level, req.user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -154,85 +220,91 @@ async def generate_questions(req: ModuleRequest):
 # 3. CALIFICACIÓN (WRITING, READING, LISTENING)
 # ----------------------------------------------------
 
+# Peticiones idénticas comparten llamada y resultado (doble envío / reintentos)
+writing_cache = ResultCache("grade_writing")
+speaking_cache = ResultCache("evaluate_speaking")
+report_cache = ResultCache("generate_report")
+
+def writing_messages(req: WritingRequest) -> list:
+    return prompts.GRADE_WRITING.messages(level=req.level, task_prompt=req.prompt, content=req.content)
+
+async def _grade_writing(req: WritingRequest) -> dict:
+    return await writing_cache.get_or_compute(req, lambda: llm_gateway.chat_json(messages=writing_messages(req), task="grade_writing"))
+
 @app.post("/api/v1/grade-writing")
-async def grade_writing(req: WritingRequest):
-    prompt_eval = f"""
-    Act as an IELTS Writing Examiner. Grade this response for level {req.level}.
-    Task Prompt: {req.prompt}
-    Student Content: {req.content}
-    Return ONLY JSON:
-    {{
-        "score": int,
-        "feedback": "Professional feedback including band score and tips"
-    }}
-    """
+async def grade_writing(req: WritingRequest, request: Request, stream: bool = Query(False)):
+    metrics.label_request("writing", req.level)
+    if wants_stream(request, stream):
+        cached = writing_cache.get(canonical_key(req))
+        if cached is not None:
+            return sse_response(single_event("done", cached))
+        return sse_response(stream_json_events(
+            llm_gateway.chat_json_stream(messages=writing_messages(req), task="grade_writing"),
+            required=("score", "feedback"),
+            on_complete=lambda result: writing_cache.set(canonical_key(req), result),
+        ))
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": "You are a professional IELTS Writing Examiner."},
-                {"role": "user", "content": prompt_eval}
-            ]
-        )
-        return json.loads(response.choices[0].message.content)
+        return await _grade_writing(req)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/grade-skill")
-async def grade_skill(req: SkillEvaluationRequest):
-    prompt_eval = f"""
-    Act as an IELTS Examiner. Grade this {req.type} test for level {req.level}.
-    Questions and Correct Answers: {req.questions}
-    User Answers: {req.answers}
-    Compare them and calculate a score from 0 to 100.
-    Return JSON: {{"score": int, "feedback": "Detailed feedback"}}
-    """
+async def grade_skill(req: SkillEvaluationRequest, feedback: bool = Query(False)):
+    if req.session_id:
+        try:
+            session = await exam_sessions.take(req.session_id)
+        except SessionNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        req = req.model_copy(update={k: session[k] for k in ("questions", "type", "level")})
+    elif not req.questions or not req.type:
+        raise HTTPException(status_code=422, detail="Se requiere session_id o questions + type")
+    metrics.label_request(req.type, req.level)
+    # MCQ con correctAnswer: se corrige en local, sin llamar a GPT-4o
+    if scoring.is_gradable(req.questions):
+        result = scoring.score_mcq(req.questions, req.answers)
+        if feedback and result["correct"] < result["total"]:
+            result["feedback"] = await _skill_feedback(req, result)
+        return result
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            messages=[{"role": "system", "content": "IELTS Examiner."}, {"role": "user", "content": prompt_eval}]
-        )
-        return json.loads(response.choices[0].message.content)
+        return await llm_gateway.chat_json(messages=prompts.skill_grading_messages(req), task="grade_skill")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _skill_feedback(req: SkillEvaluationRequest, result: dict) -> str:
+    # Feedback narrativo opcional: solo se envían las preguntas falladas
+    missed = scoring.missed_questions(req.questions, req.answers, result["results"])
+    try:
+        data = await llm_gateway.chat_json(messages=prompts.skill_feedback_messages(req, result, missed), task="skill_feedback")
+        return data.get("feedback", result["feedback"])
+    except Exception as e:
+        print(f"❌ Error generando feedback de {req.type}: {e}")
+        return result["feedback"]
+
 # ----------------------------------------------------
 # 4. REPORTE FINAL (ESTRATEGIA IA)
 # ----------------------------------------------------
 
-@app.post("/api/v1/generate-report")
-async def generate_report(req: FinalReportRequest):
+def report_messages(req: FinalReportRequest) -> list:
     # Lógica mejorada: Identificamos la debilidad principal para guiar a la IA
     scores = {"Reading": req.reading, "Writing": req.writing, "Listening": req.listening, "Speaking": req.speaking}
     weakest_skill = min(scores, key=scores.get)
+    return prompts.REPORT.messages(level=req.level, scores=scores, weakest_skill=weakest_skill)
 
-    prompt = f"""
-    Act as a senior IELTS Career Coach. Analyze these scores for a student at {req.level} level:
-    Scores: {scores}
-    The weakest area is {weakest_skill}.
-
-    Return EXACTLY this JSON:
-    {{
-        "ai_advice": "A powerful, personalized one-sentence strategic advice focusing on their profile.",
-        "steps": [
-            "Actionable step to improve {weakest_skill} specifically",
-            "A habit-based step to maintain their strongest skills",
-            "A technical tip for the {req.level} exam"
-        ]
-    }}
-    """
+@app.post("/api/v1/generate-report")
+async def generate_report(req: FinalReportRequest, request: Request, stream: bool = Query(False)):
+    metrics.label_request(level=req.level)
+    if wants_stream(request, stream):
+        cached = report_cache.get(canonical_key(req))
+        if cached is not None:
+            return sse_response(single_event("done", cached))
+        return sse_response(stream_json_events(
+            llm_gateway.chat_json_stream(messages=report_messages(req), task="generate_report"),
+            required=("ai_advice", "steps"),
+            on_complete=lambda result: report_cache.set(canonical_key(req), result),
+        ))
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": "You are a professional IELTS Career Coach and Psychometrician."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return json.loads(response.choices[0].message.content)
+        return await report_cache.get_or_compute(req, lambda: llm_gateway.chat_json(messages=report_messages(req), task="generate_report"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -240,90 +312,223 @@ async def generate_report(req: FinalReportRequest):
 # 5. MULTIMEDIA (WHISPER & TTS)
 # ----------------------------------------------------
 
+# El mismo audio (por hash) reutiliza la transcripción
+transcript_cache = ResultCache("transcribe")
+
 @app.post("/api/v1/voice/transcribe")
 async def transcribe(audio: UploadFile = File(...)):
+    spooled = None
+    owned_by_task = False
+
+    async def run_transcription():
+        # La tarea compartida borra el temporal al terminar (sobrevive a desconexiones)
+        nonlocal owned_by_task
+        owned_by_task = True
+        try:
+            return await audio_upload.transcribe_spooled(spooled, duration, llm_gateway.transcribe)
+        finally:
+            spooled.cleanup()
+
     try:
-        audio_bytes = await audio.read()
-        buffer = io.BytesIO(audio_bytes)
-        buffer.name = "audio.webm"
-        transcript = client.audio.transcriptions.create(model="whisper-1", file=buffer, language="en")
-        return {"text": transcript.text}
+        # Se vuelca a disco por chunks; nunca se carga la grabación entera en RAM
+        spooled = await audio_upload.spool_upload(audio)
+        duration = await audio_upload.check_duration(spooled)
+        return await transcript_cache.get_or_compute_key(spooled.sha256, run_transcription)
+    except audio_upload.AudioRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Transcription error")
+    finally:
+        if spooled is not None and not owned_by_task:
+            spooled.cleanup()
+
+# Caché de audio en disco: un mismo pasaje no vuelve a costar una llamada a TTS
+tts_cache = TTSCache()
+TTS_VOICE, TTS_MODEL, TTS_SPEED = "nova", "tts-1-hd", 1.02
 
+@app.get("/api/v1/voice/speak")
 @app.post("/api/v1/voice/speak")
-async def speak(text: str = Query(...)):
+async def speak(request: Request, text: str = Query(...)):
+    key = tts_cache_key(text, TTS_VOICE, TTS_MODEL, TTS_SPEED)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    path = tts_cache.lookup(key)
+    if path:
+        # FileResponse usa sendfile y resuelve las peticiones Range
+        return FileResponse(path, media_type="audio/mpeg", headers=headers)
+
     try:
-        response = client.audio.speech.create(model="tts-1-hd", voice="nova", input=text, speed=1.02)
-        return StreamingResponse(io.BytesIO(response.content), media_type="audio/mpeg")
+        chunks = tts_cache.fill(key, llm_gateway.speech_stream(text, voice=TTS_VOICE, model=TTS_MODEL, speed=TTS_SPEED))
+        # Pedimos el primer chunk aquí para poder responder 500 si el proveedor falla
+        first = await anext(chunks)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="audio/mpeg", headers=headers)
+
 # ----------------------------------------------------
 # 6. SPEAKING EVALUATION (BATCH ANALYSIS)
 # ----------------------------------------------------
 
 @app.post("/api/v1/evaluate-speaking")
 async def evaluate_batch(data: BatchSpeakingEvaluation):
-    attempts_summary = "\n".join([f"Target: {a.target} | Student: {a.transcript}" for a in data.attempts])
-    prompt = f"""
-    Act as an IELTS Speaking Examiner. Evaluate:
-    {attempts_summary}
-    Return JSON: {{'overall_score': int, 'general_feedback': '...', 'estimated_band': '...', 'pronunciation_tips': '...'}}
-    """
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            messages=[{"role": "system", "content": "Expert IELTS Speaking Examiner."}, {"role": "user", "content": prompt}]
-        )
-        return json.loads(response.choices[0].message.content)
+        return await speaking_cache.get_or_compute(data, lambda: _evaluate_speaking(data))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+async def _evaluate_speaking(data: BatchSpeakingEvaluation) -> dict:
+    # Puntuación local inmediata (WER + diff); el modelo solo aporta los consejos
+    # CPU pura: en un hilo para no parar el event loop
+    results = await asyncio.to_thread(alignment.score_batch, [(a.target, a.transcript) for a in data.attempts])
+    tips = await asyncio.gather(*(_pronunciation_tip(r) for r in results))
+    for result, tip in zip(results, tips):
+        result["pronunciation_tip"] = tip
+    return {
+        **alignment.summarize(results),
+        "pronunciation_tips": " ".join(tip for tip in tips if tip),
+        "attempts": results,
+    }
+
+async def _pronunciation_tip(result: dict) -> str:
+    if result["wer"] == 0:
+        return ""
+    errors = [op for op in result["diff"] if op["op"] != "match"]
+    messages = prompts.PRONUNCIATION_TIP.messages(target=result["target"], transcript=result["transcript"], errors=errors)
+    try:
+        data = await llm_gateway.chat_json(messages=messages, task="pronunciation_tip")
+        return data.get("pronunciation_tips", "")
+    except Exception as e:
+        print(f"❌ Error generando consejos de pronunciación: {e}")
+        return ""
 
 # ----------------------------------------------------
-# 7. ADMIN OPS (FIREBASE SDK) - ACTUALIZADO PARA USER_PROGRESS
+# 6.1 TRABAJOS ASÍNCRONOS (GRADE-WRITING / EVALUATE-SPEAKING)
+# Responden 202 con un job_id; el resultado se consulta por polling, SSE o webhook
 # ----------------------------------------------------
 
-# Inicializar Firebase Admin (Solo si no está inicializado)
-if not firebase_admin._apps:
-    cred = credentials.Certificate("serviceAccountKey.json")
-    firebase_admin.initialize_app(cred)
+job_queue = JobQueue(create_job_store())
+job_queue.register("grade_writing", WritingRequest, _grade_writing)
+job_queue.register("evaluate_speaking", BatchSpeakingEvaluation,
+                   lambda data: speaking_cache.get_or_compute(data, lambda: _evaluate_speaking(data)))
+
+async def submit_job(job_type: str, req: BaseModel, priority: int, webhook_url: str | None) -> JSONResponse:
+    if webhook_url:
+        try:
+            await check_webhook_url(webhook_url)
+        except InvalidWebhook as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job = await job_queue.submit(job_type, req, canonical_key(req), priority, webhook_url)
+    except QueueFull:
+        return JSONResponse({"detail": "Cola de calificación llena, reintenta en unos segundos"},
+                            status_code=503, headers={"Retry-After": "5"})
+    body = {**public_view(job), "poll_url": f"/api/v1/jobs/{job['id']}", "events_url": f"/api/v1/jobs/{job['id']}/events"}
+    return JSONResponse(body, status_code=202, headers={"Location": body["poll_url"]})
+
+@app.post("/api/v1/jobs/grade-writing")
+async def submit_grade_writing(req: WritingRequest, priority: int = Query(5, ge=0, le=9),
+                               webhook_url: str | None = Query(None)):
+    metrics.label_request("writing", req.level)
+    return await submit_job("grade_writing", req, priority, webhook_url)
+
+@app.post("/api/v1/jobs/evaluate-speaking")
+async def submit_evaluate_speaking(data: BatchSpeakingEvaluation, priority: int = Query(5, ge=0, le=9),
+                                   webhook_url: str | None = Query(None)):
+    return await submit_job("evaluate_speaking", data, priority, webhook_url)
+
+@app.get("/api/v1/jobs/stats")
+async def get_job_stats():
+    return job_queue.stats()
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=30)):
+    # wait > 0: long polling hasta que termine o se agote el tiempo
+    job = await job_queue.wait(job_id, wait) if wait else await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return public_view(job)
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    async def events():
+        current = job
+        yield sse_event("status", public_view(current))
+        while current["status"] not in ("succeeded", "failed"):
+            # Latido cada 15 s para que el proxy no corte la conexión
+            current = await job_queue.wait(job_id, 15)
+            if current is None:
+                # Purgado (TTL) mientras el stream seguía abierto
+                yield sse_event("error", {"job_id": job_id, "detail": "Trabajo no encontrado"})
+                return
+            yield sse_event("status", public_view(current))
+        yield sse_event("done" if current["status"] == "succeeded" else "error", public_view(current))
+
+    return sse_response(events())
+
+def all_cache_stats() -> dict:
+    return {**cache_stats(), "tts_audio": tts_cache.stats()}
+
+metrics.register_collector(all_cache_stats)
+
+@app.get("/api/v1/cache/stats")
+async def get_cache_stats():
+    return all_cache_stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ----------------------------------------------------
+# 7. ADMIN OPS (FIREBASE SDK) - ACTUALIZADO PARA USER_PROGRESS
+# ----------------------------------------------------
 
-db = firestore.client()
+# Firebase Admin se inicializa en el primer uso (clients.firestore_db / clients.admin_auth)
+
+def initial_progress(req: UserCreateRequest) -> dict:
+    from firebase_admin import firestore
+    # ESTRUCTURA UNIFICADA EN USER_PROGRESS
+    # Inicializamos los módulos en 0 para que el Dashboard del alumno no de error
+    return {
+        "fullName": req.full_name,
+        "email": req.email,
+        "role": req.role,
+        "currentLevel": "A1",
+        "access_blocked": False,
+        "needs_password_change": True,
+        "created_at": firestore.SERVER_TIMESTAMP,
+        # Estructura de módulos para que el front tenga qué leer desde el día 1
+        "modules_A1": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
+        "modules_A2": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
+        "modules_B1": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
+        "modules_B2": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
+        "modules_C1": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
+        "modules_C2": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0}
+    }
 
 @app.post("/api/v1/admin/create-user")
 async def create_user_as_admin(req: UserCreateRequest):
     try:
         # 1. Crea el usuario en Firebase Auth
-        user = admin_auth.create_user(
+        user = clients.admin_auth().create_user(
             email=req.email,
             password=req.password,
             display_name=req.full_name
         )
 
-        # 2. ESTRUCTURA UNIFICADA EN USER_PROGRESS
-        # Inicializamos los módulos en 0 para que el Dashboard del alumno no de error
-        user_progress_data = {
-            "fullName": req.full_name,
-            "email": req.email,
-            "role": req.role,
-            "currentLevel": "A1",
-            "access_blocked": False,
-            "needs_password_change": True,
-            "created_at": firestore.SERVER_TIMESTAMP,
-            # Estructura de módulos para que el front tenga qué leer desde el día 1
-            "modules_A1": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
-            "modules_A2": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
-            "modules_B1": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
-            "modules_B2": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
-            "modules_C1": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0},
-            "modules_C2": {"reading": 0, "listening": 0, "writing": 0, "speaking": 0}
-        }
-        
-        # Guardamos en la colección user_progress
-        db.collection("user_progress").document(user.uid).set(user_progress_data)
+        # 2. Guardamos en la colección user_progress
+        clients.firestore_db().collection("user_progress").document(user.uid).set(initial_progress(req))
 
         # 3. Envía el correo con las credenciales
         send_credentials_email(req.email, req.password, req.full_name)
@@ -334,6 +539,85 @@ async def create_user_as_admin(req: UserCreateRequest):
         print(f"Error en creación: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/api/v1/admin/create-users:bulk")
+async def create_users_bulk(request: Request):
+    # Acepta CSV (text/csv) o JSON; responde NDJSON con el resultado de cada fila
+    try:
+        rows = bulk_provisioning.parse_rows(await request.body(), request.headers.get("content-type", ""))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {e}")
+
+    return StreamingResponse(
+        bulk_provisioning.provision_users(
+            rows, clients.firestore_db(), UserCreateRequest, initial_progress,
+            on_created=lambda req: send_credentials_email(req.email, req.password, req.full_name),
+        ),
+        media_type="application/x-ndjson",
+    )
+
+# ----------------------------------------------------
+# 8. PROGRESO DEL ALUMNO (AGREGADOS PRECALCULADOS)
+# ----------------------------------------------------
+
+@app.post("/api/v1/progress/{user_id}/scores")
+async def record_progress(user_id: str, req: ProgressUpdate):
+    if req.level not in progress.LEVELS or req.skill not in progress.SKILLS:
+        raise HTTPException(status_code=400, detail="Nivel o habilidad no válidos")
+    if not 0 <= req.score <= 100:
+        raise HTTPException(status_code=400, detail="La nota debe estar entre 0 y 100")
+    try:
+        await asyncio.to_thread(progress.record_score, clients.firestore_db(), user_id, req.level, req.skill, req.score)
+    except progress.ProgressNotFound:
+        raise HTTPException(status_code=404, detail="Alumno no encontrado")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        # Rollups de cohorte; si fallan la nota ya está guardada y el backfill los corrige
+        await asyncio.to_thread(analytics.record_progress, clients.firestore_db(), user_id, req.level, req.skill, req.score)
+    except Exception as e:
+        print(f"❌ Error actualizando la analítica de {user_id}: {e}")
+    return {"status": "success"}
+
+@app.get("/api/v1/progress/{user_id}/dashboard")
+async def get_dashboard(user_id: str, level: str | None = Query(None)):
+    if level is not None and level not in progress.LEVELS:
+        raise HTTPException(status_code=400, detail="Nivel no válido")
+    try:
+        return await asyncio.to_thread(progress.dashboard, clients.firestore_db(), user_id, level)
+    except progress.ProgressNotFound:
+        raise HTTPException(status_code=404, detail="Alumno no encontrado")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ----------------------------------------------------
+# 9. ANALÍTICA DE COHORTE (ROLLUPS)
+# ----------------------------------------------------
+
+_analytics_cache = {}  # days -> (caduca, resumen)
+
+@app.get("/api/v1/admin/analytics")
+async def get_analytics(days: int = Query(30, ge=1, le=analytics.MAX_TREND_DAYS)):
+    cached = _analytics_cache.get(days)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    try:
+        result = await asyncio.to_thread(analytics.summary, clients.firestore_db(), days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    _analytics_cache[days] = (time.monotonic() + analytics.CACHE_SECONDS, result)
+    return result
+
+job_queue.register("analytics_backfill", AnalyticsBackfillRequest,
+                   lambda req: asyncio.to_thread(analytics.backfill, clients.firestore_db(), req.page_size),
+                   timeout=analytics.BACKFILL_TIMEOUT)
+
+@app.post("/api/v1/admin/analytics/backfill")
+async def submit_analytics_backfill(req: AnalyticsBackfillRequest, webhook_url: str | None = Query(None)):
+    if not 1 <= req.page_size <= 1000:
+        raise HTTPException(status_code=400, detail="page_size debe estar entre 1 y 1000")
+    _analytics_cache.clear()
+    return await submit_job("analytics_backfill", req, 9, webhook_url)
+
 if __name__ == "__main__":
     import uvicorn
     import os
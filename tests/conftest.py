@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+# ----------------------------------------------------
+# CONFIGURACIÓN COMÚN DE LOS TESTS
+# El estado local (outbox de correo, journal, trabajos, KV) va a un directorio
+# temporal antes de importar la app: los tests no tocan los ficheros del repo.
+# Dependencias: pip install -r requirements-dev.txt; se lanza con python -m pytest -q
+# ----------------------------------------------------
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP_DIR = tempfile.mkdtemp(prefix="tests_")
+os.environ.update({
+    "MAIL_QUEUE_PATH": os.path.join(TMP_DIR, "mail_outbox.db"),
+    "WRITE_BEHIND_DIR": os.path.join(TMP_DIR, "write_behind"),
+    "JOB_STORE_BACKEND": "memory",
+    "KV_BACKEND": "memory",
+    "QUESTION_BANK_BACKEND": "memory",
+    "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "test"),
+})
@@ -0,0 +1,46 @@
+import pytest
+from pydantic import ValidationError
+
+from app.services import alignment
+from app.services.alignment import align, score_attempt, score_batch, summarize
+
+
+def _ops(target: str, spoken: str) -> list:
+    return [op["op"] for op in align(target.split(), spoken.split())]
+
+
+def test_align_classifies_each_word():
+    assert _ops("i live in the city", "i live in the city") == ["match"] * 5
+    assert _ops("i live in the city", "i lived in city") == ["match", "substitution", "match", "deletion", "match"]
+    assert _ops("i live", "i really live") == ["match", "insertion", "match"]
+    assert _ops("", "hello") == ["insertion"]
+
+
+def test_score_attempt_normalizes_like_mcq_grading():
+    result = score_attempt("I live in the city centre.", "i live in the city center")
+    assert (result["wer"], result["accuracy"]) == (0, 100)
+
+
+def test_score_attempt_wer_and_empty_target():
+    result = score_attempt("one two three four", "one two four")
+    assert result["wer"] == 0.25 and result["accuracy"] == 75
+    assert score_attempt("", "")["wer"] == 0
+    assert score_attempt("", "noise")["accuracy"] == 0
+
+
+def test_summarize_lists_missed_words():
+    summary = summarize(score_batch([("the cat sat", "the bat sat"), ("the cat ran", "the ran")]))
+    assert summary["overall_score"] == 67
+    assert "cat" in summary["general_feedback"]
+    assert summarize([])["overall_score"] == 0
+
+
+def test_speaking_request_limits_text_and_attempts():
+    from main import SpeakingAttempt, BatchSpeakingEvaluation
+
+    with pytest.raises(ValidationError):
+        SpeakingAttempt(target="word " * alignment.MAX_TEXT_CHARS, transcript="word")
+    attempt = {"target": "hello", "transcript": "hello"}
+    with pytest.raises(ValidationError):
+        BatchSpeakingEvaluation(attempts=[attempt] * (alignment.MAX_ATTEMPTS + 1))
+    assert len(BatchSpeakingEvaluation(attempts=[attempt] * alignment.MAX_ATTEMPTS).attempts) == alignment.MAX_ATTEMPTS
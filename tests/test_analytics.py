@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+from app.services import analytics
+from app.services.analytics import _exam_totals, weakest_skill
+
+DAY = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+
+
+def test_exam_totals_group_unknown_modules_as_other():
+    records = [{"module": "reading", "analysis": {"score": 80, "passed": True}, "timestamp": DAY}]
+    records += [{"module": f"hack{i}", "analysis": {"score": 10}, "timestamp": DAY} for i in range(50)]
+    exams = _exam_totals(records)["day-2026-10-18"]["exams"]
+    assert set(exams) == {"reading", "other"}
+    assert exams["reading"] == {"count": 1, "score_sum": 80.0, "passed": 1}
+    assert exams["other"]["count"] == 50
+
+
+def test_exam_totals_tolerate_bad_scores_and_timestamps():
+    totals = _exam_totals([
+        {"module": "grammar", "analysis": {"score": "n/a"}, "timestamp": "not a date"},
+        {"module": "grammar", "analysis": {"score": float("inf"), "passed": True}},
+        {"module": "grammar", "analysis": "broken"},
+    ])
+    (exams,) = [day["exams"]["grammar"] for day in totals.values()]
+    assert exams == {"count": 3, "score_sum": 0.0, "passed": 1}
+
+
+def test_weakest_skill_ignores_skills_without_attempts():
+    stats = {"reading": {"sum": 160, "attempts": 2}, "writing": {"sum": 50, "attempts": 1}, "speaking": {}}
+    assert weakest_skill(stats) == "writing"
+    assert weakest_skill({}) is None
+    assert weakest_skill(None) is None
+
+
+def test_day_bucket_is_utc():
+    assert analytics.day_bucket(datetime(2026, 10, 18, 23, 30, tzinfo=timezone.utc)) == "day-2026-10-18"
@@ -0,0 +1,83 @@
+import os
+import wave
+import asyncio
+from array import array
+
+import pytest
+
+from app.services import audio_upload
+from app.services.audio_upload import SpooledAudio, AudioRejected, check_duration, transcribe_spooled
+
+
+def _spooled(tmp_path, name: str, data: bytes) -> SpooledAudio:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return SpooledAudio(str(path), len(data), "sha", os.path.splitext(name)[1])
+
+
+def _wav(tmp_path, seconds: float, rate: int = 8000) -> SpooledAudio:
+    path = tmp_path / "speech.wav"
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        # Tono con un silencio de 1 s cada 10 s para que haya dónde cortar
+        samples = array("h", [0 if (i // rate) % 10 == 9 else 8000 * (1 if i % 16 < 8 else -1)
+                              for i in range(int(seconds * rate))])
+        w.writeframes(samples.tobytes())
+    return SpooledAudio(str(path), path.stat().st_size, "sha", ".wav")
+
+
+def test_webm_without_ffprobe_is_accepted_under_the_byte_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_upload, "FFPROBE", None)
+    monkeypatch.setattr(audio_upload, "MAX_UNPROBED_BYTES", 1024)
+    assert asyncio.run(check_duration(_spooled(tmp_path, "audio.webm", b"\x1aE\xdf\xa3" * 100))) is None
+
+    with pytest.raises(AudioRejected) as rejected:
+        asyncio.run(check_duration(_spooled(tmp_path, "long.webm", b"\x00" * 2048)))
+    assert rejected.value.status_code == 413
+
+
+def test_wav_duration_is_limited(tmp_path):
+    audio = _wav(tmp_path, 3)
+    assert asyncio.run(check_duration(audio)) == pytest.approx(3)
+    with pytest.raises(AudioRejected) as rejected:
+        asyncio.run(check_duration(audio, max_seconds=2))
+    assert rejected.value.status_code == 413
+
+
+def test_unreadable_wav_is_rejected(tmp_path):
+    with pytest.raises(AudioRejected) as rejected:
+        asyncio.run(check_duration(_spooled(tmp_path, "broken.wav", b"not a wav")))
+    assert rejected.value.status_code == 400
+
+
+def test_long_wav_is_split_and_timestamps_are_absolute(tmp_path):
+    audio = _wav(tmp_path, 2.5 * audio_upload.CHUNK_SECONDS, rate=4000)
+    pieces = []
+
+    async def transcribe(file):
+        with wave.open(file.name, "rb") as w:
+            length = w.getnframes() / w.getframerate()
+        pieces.append(length)
+        return {"text": f" part{len(pieces)} ", "segments": [{"start": 0.0, "end": length, "text": "x"}]}
+
+    async def run():
+        return await transcribe_spooled(audio, 2.5 * audio_upload.CHUNK_SECONDS, transcribe)
+
+    result = asyncio.run(run())
+    assert len(pieces) > 1
+    assert result["segments"][-1]["end"] == pytest.approx(2.5 * audio_upload.CHUNK_SECONDS, abs=0.1)
+    assert result["text"].split() == [f"part{i}" for i in range(1, len(pieces) + 1)]
+
+
+def test_unprobed_audio_is_transcribed_whole(tmp_path):
+    audio = _spooled(tmp_path, "audio.webm", b"\x00" * 64)
+    sent = []
+
+    async def transcribe(file):
+        sent.append(file.name)
+        return {"text": "hello", "segments": []}
+
+    assert asyncio.run(transcribe_spooled(audio, None, transcribe))["text"] == "hello"
+    assert sent == [audio.path]
@@ -0,0 +1,63 @@
+import json
+import asyncio
+
+import pytest
+
+from app.services.exam_sessions import ExamSessionService, SessionNotFound, public_event, public_item
+from app.services.kv_store import MemoryKVStore, SQLiteKVStore, require_shared
+from app.services import kv_store
+from app.services.streaming import stream_json_events
+
+QUESTIONS = [{"question": f"q{i}", "options": ["a", "b", "c"], "correctAnswer": "b"} for i in range(3)]
+ITEM = {"title": "t", "passage": "p", "questions": QUESTIONS}
+
+
+def test_public_item_strips_answers():
+    assert all("correctAnswer" not in q for q in public_item(ITEM)["questions"])
+    assert ITEM["questions"][0]["correctAnswer"] == "b"  # No modifica el original
+
+
+def test_public_event_redacts_question_events_only():
+    assert public_event("item", {"key": "questions", "index": 0, "value": QUESTIONS[0]})["value"] == \
+        {"question": "q0", "options": ["a", "b", "c"]}
+    field = public_event("field", {"key": "questions", "value": QUESTIONS})
+    assert all("correctAnswer" not in q for q in field["value"])
+    assert public_event("field", {"key": "passage", "value": "p"}) == {"key": "passage", "value": "p"}
+
+
+def test_redacted_stream_never_sends_the_key():
+    async def deltas():
+        raw = json.dumps(ITEM)
+        for i in range(0, len(raw), 7):
+            yield raw[i:i + 7]
+
+    async def collect():
+        return "".join([e async for e in stream_json_events(deltas(), tokens=False, redact=public_event,
+                                                           on_complete=public_item)])
+
+    body = asyncio.run(collect())
+    assert "correctAnswer" not in body
+    assert "event: token" not in body
+    assert "event: item" in body and "event: done" in body
+
+
+def test_session_is_graded_once_from_any_worker(tmp_path):
+    path = str(tmp_path / "kv.db")
+
+    async def scenario():
+        opened = await ExamSessionService(SQLiteKVStore(path)).open("reading", "B1", ITEM, "u1")
+        assert "correctAnswer" not in json.dumps(opened)
+        other_worker = ExamSessionService(SQLiteKVStore(path))
+        session = await other_worker.take(opened["session_id"])
+        assert [q["correctAnswer"] for q in session["questions"]] == ["b"] * 3
+        with pytest.raises(SessionNotFound):
+            await other_worker.take(opened["session_id"])
+
+    asyncio.run(scenario())
+
+
+def test_memory_store_is_refused_with_several_workers(monkeypatch):
+    monkeypatch.setattr(kv_store, "WEB_CONCURRENCY", 2)
+    with pytest.raises(RuntimeError):
+        require_shared(MemoryKVStore(), "Las sesiones de examen")
+    require_shared(SQLiteKVStore(":memory:"), "Las sesiones de examen")
@@ -0,0 +1,118 @@
+import time
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from pydantic import BaseModel
+
+from app.services.jobs import JobQueue, MemoryJobStore, SQLiteJobStore
+
+
+# ---------------- Trabajos ----------------
+
+@pytest.fixture(params=["memory", "sqlite"])
+def job_store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobStore(str(tmp_path / "jobs.db"))
+    return MemoryJobStore()
+
+
+def _job(job_id: str, key: str = "k", updated_at: float | None = None) -> dict:
+    now = time.time() if updated_at is None else updated_at
+    return {"id": job_id, "key": key, "type": "grade_writing", "payload": {"text": "hi"}, "status": "queued",
+            "priority": 5, "result": None, "error": None, "webhook_url": None, "created_at": now, "updated_at": now}
+
+
+def test_job_store_claims_once(job_store):
+    job_store.create(_job("j1"))
+    assert job_store.claim("j1") is True
+    assert job_store.claim("j1") is False
+    assert job_store.find_active("k")["status"] == "running"
+    job_store.update("j1", status="succeeded", result={"score": 7})
+    assert job_store.find_active("k") is None
+    assert job_store.get("j1")["result"] == {"score": 7}
+
+
+def test_job_store_stale_and_purge(job_store):
+    old = time.time() - 3600
+    job_store.create(_job("stale", "a", old))
+    job_store.create(_job("fresh", "b"))
+    assert [j["id"] for j in job_store.stale(time.time() - 600)] == ["stale"]
+
+    job_store.update("stale")  # Heartbeat: ya no parece abandonado
+    assert job_store.stale(time.time() - 600) == []
+
+    job_store.update("fresh", status="failed", error="x")
+    assert job_store.purge(time.time() + 1) == 1
+    assert job_store.get("fresh") is None
+
+
+# ---------------- Cola ----------------
+
+class Payload(BaseModel):
+    text: str
+
+
+def test_queue_runs_dedupes_and_fails_unknown_types():
+    async def scenario():
+        queue = JobQueue(MemoryJobStore(), workers=2)
+
+        async def handler(req):
+            await asyncio.sleep(0.05)
+            return {"echo": req.text}
+
+        queue.register("echo", Payload, handler)
+        queue.start()
+        try:
+            first = await queue.submit("echo", Payload(text="hi"), "k1")
+            again = await queue.submit("echo", Payload(text="hi"), "k1")
+            assert again["id"] == first["id"]
+            done = await queue.wait(first["id"], 5)
+            assert (done["status"], done["result"]) == ("succeeded", {"echo": "hi"})
+
+            orphan = await queue.submit("gone", Payload(text="x"), "k2")
+            failed = await queue.wait(orphan["id"], 5)
+            assert failed["status"] == "failed" and "desconocido" in failed["error"]
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_wait_returns_none_for_purged_jobs():
+    async def scenario():
+        queue = JobQueue(MemoryJobStore())
+        assert await queue.wait("missing", 0.1) is None
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_lock_does_not_stall_the_event_loop(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    queue = JobQueue(SQLiteJobStore(path), workers=1)
+    queue.register("echo", Payload, lambda req: asyncio.sleep(0, {"echo": req.text}))
+
+    async def scenario():
+        queue.start()
+        # Otro worker mantiene el lock de escritura durante 0.5 s
+        blocker = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.5, blocker.execute, ("COMMIT",)).start()
+
+        ticks = []
+
+        async def ticker():
+            for _ in range(12):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        timer = asyncio.create_task(ticker())
+        await asyncio.sleep(0.01)  # El ticker ya está corriendo cuando llega la escritura
+        job = await queue.submit("echo", Payload(text="hi"), "k")
+        await timer
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.25
+        assert (await queue.wait(job["id"], 5))["status"] == "succeeded"
+        await queue.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.services import otp
+from app.services.otp import OTPService
+from app.services.kv_store import MemoryKVStore, SQLiteKVStore
+
+
+# ---------------- KV con TTL ----------------
+
+@pytest.fixture(params=["memory", "sqlite"])
+def kv(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteKVStore(str(tmp_path / "kv.db"))
+    return MemoryKVStore()
+
+
+def test_kv_values_expire(kv):
+    async def scenario():
+        await kv.set("otp:a", "123456", 0.2)
+        assert await kv.get("otp:a") == "123456"
+        await asyncio.sleep(0.3)
+        assert await kv.get("otp:a") is None
+
+    asyncio.run(scenario())
+
+
+def test_kv_pop_returns_value_once(kv):
+    async def scenario():
+        await kv.set("exam:session:s1", "key", 60)
+        results = await asyncio.gather(*(kv.pop("exam:session:s1") for _ in range(5)))
+        assert results.count("key") == 1 and results.count(None) == 4
+        assert await kv.get("exam:session:s1") is None
+
+    asyncio.run(scenario())
+
+
+def test_kv_incr_keeps_the_first_ttl(kv):
+    async def scenario():
+        assert [await kv.incr("rl:a", 0.3) for _ in range(3)] == [1, 2, 3]
+        await asyncio.sleep(0.4)
+        assert await kv.incr("rl:a", 0.3) == 1
+
+    asyncio.run(scenario())
+
+
+def test_kv_token_bucket_waits_when_empty(kv):
+    async def scenario():
+        assert [await kv.take_token("tb:a", 2, 1.0) for _ in range(2)] == [0, 0]
+        assert await kv.take_token("tb:a", 2, 1.0) > 0
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_kv_is_shared_between_instances(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "kv.db")
+        await SQLiteKVStore(path).set("otp:a", "1", 60)
+        assert await SQLiteKVStore(path).pop("otp:a") == "1"
+
+    asyncio.run(scenario())
+
+
+# ---------------- OTP ----------------
+
+def test_otp_code_is_single_use_under_concurrency(tmp_path):
+    async def scenario():
+        service = OTPService(SQLiteKVStore(str(tmp_path / "kv.db")))
+        code = await service.issue("Alumno@Example.com")
+        results = await asyncio.gather(*(service.verify("alumno@example.com", code) for _ in range(5)))
+        assert results.count(True) == 1
+        assert await service.verify("alumno@example.com", code) is False
+
+    asyncio.run(scenario())
+
+
+def test_otp_wrong_code_keeps_the_valid_one_until_attempts_run_out(monkeypatch):
+    monkeypatch.setattr(otp, "OTP_MAX_ATTEMPTS", 2)
+
+    async def scenario():
+        service = OTPService(MemoryKVStore())
+        code = await service.issue("alumno@example.com")
+        assert await service.verify("alumno@example.com", "00000000") is False
+        assert await service.verify("alumno@example.com", code) is True
+
+        code = await service.issue("alumno@example.com")
+        for _ in range(2):
+            assert await service.verify("alumno@example.com", "00000000") is False
+        assert await service.verify("alumno@example.com", code) is False  # Agotados los intentos
+
+    asyncio.run(scenario())
@@ -0,0 +1,135 @@
+import time
+import socket
+from email.mime.text import MIMEText
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from app.services import mail_queue as mail_queue_module
+from app.services.mail_queue import MailQueue
+
+
+class Inbox:
+    """Handler de aiosmtpd que guarda lo recibido y el puerto de cada conexión."""
+
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode()))
+        self.peers.add(session.peer)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _mail(to: str, body: str = "hola") -> MIMEText:
+    msg = MIMEText(body)
+    msg["From"] = "support@certifica.ai"
+    msg["To"] = to
+    msg["Subject"] = "test"
+    return msg
+
+
+@pytest.fixture
+def smtp_server():
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller, inbox
+    controller.stop()
+
+
+def _queue(tmp_path, port: int) -> MailQueue:
+    return MailQueue(path=str(tmp_path / "outbox.db"), host="127.0.0.1", port=port, user="", password="",
+                     starttls=False)
+
+
+def test_sends_batch_over_one_connection(tmp_path, smtp_server):
+    controller, inbox = smtp_server
+    queue = _queue(tmp_path, controller.port)
+    for i in range(3):
+        queue.enqueue(_mail(f"alumno{i}@example.com"))
+
+    assert queue.process_due() == 3
+    assert sorted(to for (to,), _ in inbox.messages) == [f"alumno{i}@example.com" for i in range(3)]
+    assert len(inbox.peers) == 1
+    assert queue.stats() == {}  # Los enviados se borran del outbox
+    queue.stop()
+
+
+def test_worker_delivers_in_background(tmp_path, smtp_server):
+    controller, inbox = smtp_server
+    queue = _queue(tmp_path, controller.port)
+    queue.start()
+    try:
+        queue.enqueue(_mail("alumno@example.com"))
+        deadline = time.monotonic() + 5
+        while not inbox.messages and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+    assert len(inbox.messages) == 1
+
+
+def test_claimed_mail_is_not_sent_twice(tmp_path, smtp_server):
+    controller, inbox = smtp_server
+    first, second = _queue(tmp_path, controller.port), _queue(tmp_path, controller.port)
+    first.enqueue(_mail("alumno@example.com"))
+
+    # Mientras el primer worker envía, otro worker sobre el mismo outbox no ve la fila reclamada
+    connection = first._connection
+    seen_by_second = []
+
+    def racing_connection():
+        seen_by_second.append(second.process_due())
+        return connection()
+
+    first._connection = racing_connection
+    assert first.process_due() == 1
+    assert seen_by_second == [0]
+    assert len(inbox.messages) == 1
+    first.stop()
+    second.stop()
+
+
+def test_failed_mail_backs_off_then_drops_body(tmp_path, monkeypatch):
+    monkeypatch.setattr(mail_queue_module, "MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(mail_queue_module, "BACKOFF_BASE", 0)
+    queue = _queue(tmp_path, _free_port())  # Nadie escucha en el puerto
+    queue.enqueue(_mail("alumno@example.com", "contraseña temporal"))
+
+    assert queue.process_due() == 1
+    assert queue.stats() == {"pending": 1}
+    assert queue.process_due() == 1
+    assert queue.stats() == {"failed": 1}
+    attempts, message, error = queue._conn.execute("SELECT attempts, message, last_error FROM mail_outbox").fetchone()
+    assert (attempts, message) == (2, "")
+    assert error
+    queue.stop()
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path, smtp_server):
+    controller, inbox = smtp_server
+    crashed, survivor = _queue(tmp_path, controller.port), _queue(tmp_path, controller.port)
+    crashed.enqueue(_mail("alumno@example.com"))
+    # Un worker reclama la fila y muere antes de enviarla: nadie la ve hasta que caduca el lease
+    with crashed._lock:
+        crashed._conn.execute("UPDATE mail_outbox SET status = 'sending', next_attempt_at = ?",
+                              (time.time() + mail_queue_module.SENDING_LEASE,))
+    assert survivor.process_due() == 0
+
+    with crashed._lock:
+        crashed._conn.execute("UPDATE mail_outbox SET next_attempt_at = ?", (time.time() - 1,))
+    assert survivor.process_due() == 1
+    assert len(inbox.messages) == 1
+    assert survivor.stats() == {}
+    crashed.stop()
+    survivor.stop()
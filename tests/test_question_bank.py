@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.services import question_bank
+from app.services.question_bank import MemoryQuestionStore, SQLiteQuestionStore, QuestionBank
+
+ITEM = {"title": "t", "questions": [{"question": "q", "options": ["a", "b"], "correctAnswer": "a"}]}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def question_store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteQuestionStore(str(tmp_path / "qb.db"))
+    return MemoryQuestionStore()
+
+
+def test_question_store_does_not_repeat_items_for_a_student(question_store):
+    first = question_store.add("reading", "B1", ITEM)
+    second = question_store.add("reading", "B1", {**ITEM, "title": "u"})
+
+    taken = {question_store.take("reading", "B1", "u1")[0], question_store.take("reading", "B1", "u1")[0]}
+    assert taken == {first, second}
+    assert question_store.take("reading", "B1", "u1") is None
+    assert question_store.take("reading", "B1", "u2") is not None
+    assert question_store.take("reading", "B2", "u1") is None
+
+
+def test_question_store_retires_items_after_max_serves(question_store, monkeypatch):
+    monkeypatch.setattr(question_bank, "MAX_SERVES", 2)
+    question_store.add("grammar", "A2", ITEM)
+    assert question_store.available("grammar", "A2") == 1
+    question_store.take("grammar", "A2", None)
+    question_store.take("grammar", "A2", None)
+    assert question_store.available("grammar", "A2") == 0
+    assert question_store.take("grammar", "A2", None) is None
+
+
+def test_sqlite_question_store_survives_restart(tmp_path):
+    path = str(tmp_path / "qb.db")
+    item_id = SQLiteQuestionStore(path).add("listening", "C1", ITEM)
+    reopened = SQLiteQuestionStore(path)
+    assert reopened.available("listening", "C1") == 1
+    assert reopened.take("listening", "C1", "u1") == (item_id, ITEM)
+
+
+def test_question_bank_only_pools_known_pairs():
+    async def generator(type_, level):
+        return ITEM
+
+    async def scenario():
+        bank = QuestionBank(MemoryQuestionStore(), generator)
+        assert "item_id" not in await bank.get("reading", "Z9")
+        assert bank.store.available("reading", "Z9") == 0
+        assert "item_id" in await bank.get("reading", "B1", "u1")
+        await asyncio.gather(*bank._tasks)
+        assert bank.store.available("reading", "B1") == question_bank.HIGH_WATERMARK
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_takes_schedule_a_single_refill():
+    calls = []
+
+    async def generator(type_, level):
+        calls.append((type_, level))
+        await asyncio.sleep(0)
+        return ITEM
+
+    async def scenario():
+        bank = QuestionBank(MemoryQuestionStore(), generator)
+        await asyncio.gather(*(bank.get("grammar", "A2") for _ in range(5)))
+        await asyncio.gather(*bank._tasks)
+        return bank
+
+    bank = asyncio.run(scenario())
+    # 5 generaciones en línea + un único relleno hasta HIGH_WATERMARK, no uno por petición
+    assert len(calls) <= 5 + question_bank.HIGH_WATERMARK
+    assert bank.store.available("grammar", "A2") >= question_bank.HIGH_WATERMARK
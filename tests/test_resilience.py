@@ -0,0 +1,122 @@
+import json
+import asyncio
+
+import httpx
+import pytest
+
+from bench import fake_openai
+from app.core import clients
+from app.services import llm_gateway, resilience
+
+PRIMARY, FALLBACK = llm_gateway.DEFAULT_MODEL, llm_gateway.FALLBACK_MODEL
+MESSAGES = [{"role": "user", "content": "Genera un módulo de grammar B1 en JSON"}]
+
+
+@pytest.fixture(autouse=True)
+def fake_provider(monkeypatch):
+    """OpenAI falso de bench/ servido en proceso, sin latencia y con el estado de resiliencia limpio."""
+    from openai import AsyncOpenAI
+
+    monkeypatch.setattr(fake_openai, "LATENCY_MS", 0)
+    monkeypatch.setattr(fake_openai, "JITTER_MS", 0)
+    monkeypatch.setitem(fake_openai.faults, "down_models", [])
+    monkeypatch.setitem(fake_openai.stats, "by_model", {})
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_openai.app))
+    monkeypatch.setattr(clients, "_openai", AsyncOpenAI(api_key="test", base_url="http://fake-openai/v1",
+                                                         http_client=http_client))
+    monkeypatch.setattr(llm_gateway, "_semaphore", None)  # Cada test corre en su propio event loop
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "_latency", {})
+    monkeypatch.setattr(resilience, "_hedge_budget", resilience.HedgeBudget())
+    monkeypatch.setattr(resilience, "BACKOFF_BASE", 0)
+    return fake_openai
+
+
+def _calls(model: str) -> int:
+    return fake_openai.stats["by_model"].get(model, 0)
+
+
+def test_falls_back_and_opens_circuit_when_primary_is_down(fake_provider):
+    fake_provider.faults["down_models"] = [PRIMARY]
+
+    async def scenario():
+        for _ in range(3):
+            result = await llm_gateway.chat_json(MESSAGES, task="generate_grammar")
+            assert len(result["questions"]) == 5
+
+    asyncio.run(scenario())
+    assert resilience.circuit_states()[PRIMARY] == "open"
+    # Dos llamadas agotan los reintentos del modelo caído; con el circuito abierto la tercera va directa al fallback
+    assert _calls(PRIMARY) == resilience.BREAKER_FAILURES
+    assert _calls(FALLBACK) == 3
+
+
+def test_tasks_without_fallback_surface_the_error(fake_provider):
+    fake_provider.faults["down_models"] = [PRIMARY]
+
+    with pytest.raises(Exception) as error:
+        asyncio.run(llm_gateway.chat_json(MESSAGES, task="grade_writing"))
+    assert getattr(error.value, "status_code", None) == 503
+    assert _calls(PRIMARY) == resilience.RETRIES + 1
+    assert _calls(FALLBACK) == 0
+
+
+def test_half_open_probe_closes_circuit_after_recovery(fake_provider):
+    resilience._breakers[PRIMARY] = resilience.CircuitBreaker(PRIMARY, failures=1, reset_after=0.1)
+    fake_provider.faults["down_models"] = [PRIMARY]
+
+    async def scenario():
+        with pytest.raises(Exception):
+            await llm_gateway.chat_json(MESSAGES, task="grade_writing")
+        assert resilience.circuit_states()[PRIMARY] == "open"
+        with pytest.raises(resilience.CircuitOpen):
+            await llm_gateway.chat_json(MESSAGES, task="grade_writing")
+
+        fake_provider.faults["down_models"] = []
+        await asyncio.sleep(0.15)
+        assert "score" in await llm_gateway.chat_json(MESSAGES, task="grade_writing")
+
+    asyncio.run(scenario())
+    assert resilience.circuit_states()[PRIMARY] == "closed"
+    assert _calls(PRIMARY) == 2  # Un fallo abre el circuito; mientras está abierto no se llama
+
+
+def test_stream_falls_back_before_first_token(fake_provider):
+    fake_provider.faults["down_models"] = [PRIMARY]
+
+    async def scenario():
+        return "".join([delta async for delta in llm_gateway.chat_json_stream(MESSAGES, task="generate_grammar")])
+
+    assert len(json.loads(asyncio.run(scenario()))["questions"]) == 5
+    assert _calls(PRIMARY) == resilience.RETRIES + 1
+    assert _calls(FALLBACK) == 1
+
+
+def test_slow_call_is_hedged_within_budget(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_DEFAULT_DELAY", 0.01)
+    monkeypatch.setattr(resilience, "_hedge_budget", resilience.HedgeBudget(ratio=1))
+    started = []
+
+    async def attempt(model):
+        started.append(model)
+        await asyncio.sleep(5 if len(started) == 1 else 0)  # La primera llamada se queda colgada
+        return len(started)
+
+    assert asyncio.run(asyncio.wait_for(resilience.call(attempt, [PRIMARY]), 1)) == 2
+    assert started == [PRIMARY, PRIMARY]
+
+
+def test_hedge_budget_does_not_bank_credit(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    budget = resilience.HedgeBudget(ratio=0.1, window=60)
+    for _ in range(100):
+        budget.record_call()
+    clock[0] = 120  # Racha sana ya fuera de la ventana: no deja crédito para una ráfaga de copias
+    budget.record_call()
+    assert not budget.try_hedge()
+
+    for _ in range(19):
+        budget.record_call()
+    assert budget.try_hedge() and budget.try_hedge()
+    assert not budget.try_hedge()
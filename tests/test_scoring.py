@@ -0,0 +1,47 @@
+from app.services.scoring import _resolve, is_gradable, missed_questions, normalize_answer, score_mcq
+
+OPTIONS = ["a", "an", "the", "no article"]
+QUESTIONS = [
+    {"question": "I live in the city ___.", "options": ["centre", "park", "river"], "correctAnswer": "centre"},
+    {"question": "She is ___ engineer.", "options": OPTIONS, "correctAnswer": "an"},
+    {"question": "He bought ___ car.", "options": OPTIONS, "correctAnswer": "a"},
+]
+
+
+def test_normalize_answer_ignores_case_punctuation_prefix_and_spelling():
+    assert normalize_answer("B) The City Centre!") == normalize_answer("the city center")
+    assert normalize_answer("  My favourite colour ") == "my favorite color"
+    assert normalize_answer("Seven o'clock") == normalize_answer("7 o clock")
+
+
+def test_resolve_accepts_text_index_letter_and_dict():
+    assert _resolve("an", OPTIONS) == "an"
+    assert _resolve(1, OPTIONS) == "an"
+    assert _resolve("B", OPTIONS) == "an"
+    assert _resolve("c)", OPTIONS) == "the"
+    assert _resolve({"answer": "D"}, OPTIONS) == "no article"
+    assert _resolve(9, OPTIONS) == "9"
+    assert _resolve(None, OPTIONS) == "" and _resolve(True, OPTIONS) == ""
+
+
+def test_resolve_keeps_one_letter_answers_that_are_options():
+    # 'a' es una opción (el artículo), no la letra de la primera opción
+    assert _resolve("a", OPTIONS) == "a"
+    assert _resolve("A", OPTIONS) == "A"
+    assert _resolve("E", OPTIONS) == "E"  # Fuera del rango de letras
+
+
+def test_score_mcq_mixes_answer_formats_and_pads_missing_answers():
+    result = score_mcq(QUESTIONS, ["center", "B"])
+    assert result["results"] == [True, True, False]
+    assert (result["score"], result["correct"], result["total"]) == (67, 2, 3)
+    assert score_mcq(QUESTIONS, [0, "an", "a", "extra"])["score"] == 100
+    assert score_mcq([], [])["score"] == 0
+
+
+def test_missed_questions_and_gradability():
+    result = score_mcq(QUESTIONS, ["park", "an"])
+    missed = missed_questions(QUESTIONS, ["park", "an"], result["results"])
+    assert [m["userAnswer"] for m in missed] == ["park", None]
+    assert is_gradable(QUESTIONS)
+    assert not is_gradable([{"question": "q"}]) and not is_gradable([])
@@ -0,0 +1,25 @@
+import os
+import shutil
+
+import pytest
+
+from bench import startup
+
+# Presupuesto holgado para CI; bench/startup.py da el detalle de los imports más lentos
+IMPORT_BUDGET_S = float(os.getenv("STARTUP_IMPORT_BUDGET_S", "2.0"))
+
+
+@pytest.fixture(scope="module")
+def import_report():
+    try:
+        yield startup.measure_import(runs=3)
+    finally:
+        shutil.rmtree(startup.TMP_DIR, ignore_errors=True)
+
+
+def test_import_main_does_not_load_heavy_sdks(import_report):
+    assert import_report["heavy_modules_loaded"] == []
+
+
+def test_import_main_within_budget(import_report):
+    assert import_report["median_s"] <= IMPORT_BUDGET_S, import_report
@@ -0,0 +1,68 @@
+import json
+import asyncio
+
+from app.services.streaming import PartialJSONParser, stream_json_events
+
+MODULE = {
+    "title": "Reading \"B1\" {test}",
+    "passage": "Line one,\nline two: [not an array]",
+    "questions": [
+        {"question": "Why?", "options": ["a", "b"], "correctAnswer": "a"},
+        {"question": "When?", "options": ["c", "d"], "correctAnswer": "d"},
+    ],
+    "timeLimit": 15,
+    "adaptive": False,
+}
+
+
+def _parse(raw: str, step: int) -> list:
+    parser = PartialJSONParser()
+    events = []
+    for i in range(0, len(raw), step):
+        events += parser.feed(raw[i:i + step])
+    return events
+
+
+def test_events_do_not_depend_on_chunk_boundaries():
+    raw = json.dumps(MODULE, indent=2)
+    expected = _parse(raw, len(raw))
+    assert all(_parse(raw, step) == expected for step in (1, 2, 3, 7, 64))
+
+
+def test_fields_and_array_items_are_emitted_in_order():
+    events = _parse(json.dumps(MODULE), 5)
+    assert [(e, d["key"]) for e, d in events] == [
+        ("field", "title"), ("field", "passage"),
+        ("item", "questions"), ("item", "questions"), ("field", "questions"),
+        ("field", "timeLimit"), ("field", "adaptive"),
+    ]
+    assert events[0][1]["value"] == MODULE["title"]  # Comillas y llaves escapadas dentro del string
+    assert [d["index"] for e, d in events if e == "item"] == [0, 1]
+    assert events[3][1]["value"] == MODULE["questions"][1]
+
+
+def test_item_is_emitted_as_soon_as_it_closes():
+    parser = PartialJSONParser()
+    assert parser.feed('{"questions": [{"question": "q0"}, {"quest') == [
+        ("item", {"key": "questions", "index": 0, "value": {"question": "q0"}})]
+    assert parser.feed('ion": "q1"}') == []
+    assert parser.feed("]}")[0][1]["index"] == 1
+
+
+def _collect(deltas, **kwargs) -> list:
+    async def source():
+        for delta in deltas:
+            yield delta
+
+    async def run():
+        return [e async for e in stream_json_events(source(), **kwargs)]
+
+    return [chunk.split("\n")[0].removeprefix("event: ") for chunk in asyncio.run(run())]
+
+
+def test_stream_ends_with_done_or_error():
+    raw = json.dumps(MODULE)
+    events = _collect([raw[:10], raw[10:]], required=("questions",))
+    assert events[0] == "token" and events[-1] == "done"
+    assert _collect([raw], required=("missing",))[-1] == "error"
+    assert _collect([raw[:20]])[-1] == "error"  # JSON truncado
@@ -0,0 +1,69 @@
+import os
+import time
+import asyncio
+
+from app.services import tts_cache
+from app.services.tts_cache import TTSCache
+
+
+async def _audio(size: int):
+    for _ in range(size // 100):
+        yield b"\x00" * 100
+
+
+def _fill(cache: TTSCache, key: str, size: int = 1000) -> bytes:
+    async def consume():
+        return b"".join([chunk async for chunk in cache.fill(key, _audio(size))])
+    return asyncio.run(consume())
+
+
+def test_only_stale_part_files_are_removed_on_start(tmp_path):
+    live = tmp_path / "live.part"
+    stale = tmp_path / "stale.part"
+    live.write_bytes(b"x")
+    stale.write_bytes(b"x")
+    old = time.time() - tts_cache.STALE_PART_SECONDS - 60
+    os.utime(stale, (old, old))
+
+    TTSCache(str(tmp_path))
+    assert live.exists()  # Lo está escribiendo otro worker
+    assert not stale.exists()
+
+
+def test_entry_written_by_another_worker_is_a_hit(tmp_path):
+    first, second = TTSCache(str(tmp_path)), TTSCache(str(tmp_path))
+    assert len(_fill(first, "k1")) == 1000
+    assert second.lookup("k1") == first._path("k1")
+    assert second.stats()["hits"] == 1
+    assert second.lookup("missing") is None
+
+
+def test_size_limit_covers_files_from_every_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_cache, "RESCAN_SECONDS", 0)
+    first, second = TTSCache(str(tmp_path), max_bytes=2500), TTSCache(str(tmp_path), max_bytes=2500)
+    _fill(first, "a")
+    _fill(first, "b")
+    _fill(second, "c")
+    _fill(second, "d")
+    on_disk = sorted(name for name in os.listdir(tmp_path) if name.endswith(".mp3"))
+    assert sum(os.path.getsize(tmp_path / name) for name in on_disk) <= 2500
+    assert "d.mp3" in on_disk
+
+
+def test_incomplete_stream_is_not_published(tmp_path):
+    cache = TTSCache(str(tmp_path))
+
+    async def broken():
+        yield b"\x00" * 100
+        raise ConnectionError("provider dropped")
+
+    async def consume():
+        async for _ in cache.fill("k", broken()):
+            pass
+
+    try:
+        asyncio.run(consume())
+    except ConnectionError:
+        pass
+    assert os.listdir(tmp_path) == []
+    assert cache.lookup("k") is None